@@ -24,6 +24,15 @@ else
     ./manage.py get_paddle_products
     ./manage.py get_paddle_prices
 
+    # Warm the contact form's Zendesk ticket field cache
+    ./manage.py warm_contact_fields
+
+    # Rebuild the current legal documents cache with this image's HTML
+    ./manage.py warm_legal_docs
+
+    # Rebuild the sign-up and subscription pages' plan info cache
+    ./manage.py warm_plan_info
+
     CMD="uv run uvicorn thunderbird_accounts.asgi:application"
     ARGS="--lifespan off --host 0.0.0.0 --port 8087"
     if [[ "$TBA_DEV" == "yes" ]]; then
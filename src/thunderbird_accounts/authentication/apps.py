@@ -5,3 +5,9 @@ class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'thunderbird_accounts.authentication'
     verbose_name = 'Authentication'
+
+    def ready(self):
+        # Import here so Django finishes app loading before signal registration.
+        from thunderbird_accounts.authentication.signals import register_allow_list_cache_handlers
+
+        register_allow_list_cache_handlers()
@@ -32,6 +32,7 @@ from thunderbird_accounts.authentication.models import User
 from thunderbird_accounts.authentication.utils import KeycloakRequiredAction
 from thunderbird_accounts.mail.utils import is_allowed_domain
 from thunderbird_accounts.core.utils import get_absolute_url
+from thunderbird_accounts.infra.http import get_pooled_session
 
 
 class RequestMethods(enum.StrEnum):
@@ -66,9 +67,12 @@ class KeycloakClient:
         self.client_id = settings.KEYCLOAK_ADMIN_CLIENT_ID
         self.client_secret = settings.KEYCLOAK_ADMIN_CLIENT_SECRET
         self.access_token = None
+        # Snapshot of each user's credentials for the lifetime of this client (usually a single request),
+        # so the totp and recovery code getters share one fetch. Keyed by oidc_id.
+        self._credentials: dict[str, list[dict]] = {}
 
     def _get_access_token(self):
-        response = requests.post(
+        response = get_pooled_session('keycloak').post(
             settings.KEYCLOAK_ADMIN_TOKEN_ENDPOINT,
             data={
                 'client_id': self.client_id,
@@ -101,7 +105,7 @@ class KeycloakClient:
 
         url = urljoin(settings.KEYCLOAK_API_ENDPOINT, endpoint)
 
-        response = requests.request(
+        response = get_pooled_session('keycloak').request(
             method=method.value,
             url=url,
             params=params,
@@ -118,9 +122,16 @@ class KeycloakClient:
         return response
 
     def get_security_credentials(self, oidc_id):
-        endpoint = f'users/{oidc_id}/credentials'
-        response = self.request(endpoint, RequestMethods.GET)
-        return response.json()
+        """Returns all of a user's credentials, fetched once per client until they're invalidated."""
+        if oidc_id not in self._credentials:
+            endpoint = f'users/{oidc_id}/credentials'
+            response = self.request(endpoint, RequestMethods.GET)
+            self._credentials[oidc_id] = response.json()
+        return self._credentials[oidc_id]
+
+    def invalidate_credentials(self, oidc_id: str):
+        """Drop the credential snapshot for a user, call this after changing their credentials outside this client."""
+        self._credentials.pop(oidc_id, None)
 
     def get_totp_credentials(self, oidc_id: str) -> list[dict]:
         return [
@@ -131,6 +142,10 @@ class KeycloakClient:
 
     def delete_credential(self, oidc_id: str, credential_id: str) -> bool:
         self.request(f'users/{oidc_id}/credentials/{credential_id}', RequestMethods.DELETE)
+        if oidc_id in self._credentials:
+            self._credentials[oidc_id] = [
+                credential for credential in self._credentials[oidc_id] if credential.get('id') != credential_id
+            ]
         return True
 
     def get_recovery_codes_credentials(self, oidc_id: str) -> list[dict]:
@@ -6,11 +6,16 @@ writes ``generated-words.json`` (two disjoint sections, ``"exact"`` and
 additions live in ``exact-words.json`` / ``affix-words.json``; license notices
 in ``THIRD_PARTY_LICENSES``.
 
+Afterwards it rebuilds ``compiled-words.pickle``, the pre-normalized artifact
+the checker loads at startup. Pass ``--compile-only`` to just rebuild that
+artifact (e.g. after editing the hand-maintained lists) without fetching.
+
 Usage:
 
 .. code-block:: shell
 
     python manage.py update_reserved_words
+    python manage.py update_reserved_words --compile-only
 """
 
 import json
@@ -21,6 +26,8 @@ from pathlib import Path
 from django.apps import apps
 from django.core.management.base import BaseCommand
 
+from thunderbird_accounts.authentication.reserved.checker import COMPILED_WORDS_FILE, write_compiled_words
+
 GENERATED_WORDS_FILE = 'generated-words.json'
 GENERATED_WARNING = (
     'GENERATED FILE -- do not edit by hand. Regenerate with '
@@ -126,7 +133,24 @@ class Command(BaseCommand):
     help = 'Regenerate generated-words.json for the reserved-word checker from upstream sources.'
     requires_system_checks = []
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--compile-only',
+            action='store_true',
+            help=f'Only rebuild {COMPILED_WORDS_FILE} from the existing JSON word lists.',
+        )
+
     def handle(self, *args, **options):
+        reserved_dir = Path(apps.get_app_config('authentication').path) / 'reserved'
+        if not options['compile_only']:
+            self._update_generated_words(reserved_dir)
+
+        exact_count, affix_count = write_compiled_words(reserved_dir)
+        self.stdout.write(
+            self.style.SUCCESS(f'{COMPILED_WORDS_FILE}: {exact_count} exact + {affix_count} affix entries')
+        )
+
+    def _update_generated_words(self, reserved_dir: Path):
         exact: set[str] = set()
         for filename in FORWARD_EMAIL_EXACT_FILES:
             exact.update(_fetch_json(f'{FORWARD_EMAIL_RAW}/{filename}'))
@@ -149,7 +173,7 @@ class Command(BaseCommand):
         # An affix entry already matches its own exact form, so keep the sections disjoint.
         exact -= affix
 
-        path = Path(apps.get_app_config('authentication').path) / 'reserved' / GENERATED_WORDS_FILE
+        path = reserved_dir / GENERATED_WORDS_FILE
         payload = {'_warning': GENERATED_WARNING, 'exact': sorted(exact), 'affix': sorted(affix)}
         with open(path, 'w', encoding='utf-8') as fh:
             json.dump(payload, fh, indent='\t', ensure_ascii=False)
@@ -320,6 +320,8 @@ class MfaManagementService:
         self.request.session[MFA_MANAGEMENT_AUTH_SESSION_KEY] = int(time.time())
         cache.delete(make_pending_totp_cache_key(self.request.user.pk))
 
+        # The provider added a credential behind the admin client's back
+        self.keycloak.invalidate_credentials(oidc_id)
         totp_credentials = self._safe_read_credentials(self.keycloak.get_totp_credentials, oidc_id)
         return {'credentials': serialize_totp_credentials(totp_credentials)}
 
@@ -369,6 +371,7 @@ class MfaManagementService:
             sentry_sdk.capture_exception(exc)
             raise MfaSaveRecoveryCodesUnavailableError() from exc
 
+        self.keycloak.invalidate_credentials(oidc_id)
         recovery_codes_credentials = self._safe_read_credentials(self.keycloak.get_recovery_codes_credentials, oidc_id)
 
         return {
@@ -1,18 +1,23 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from requests.auth import HTTPBasicAuth
 from json import JSONDecodeError
 from urllib.parse import urlencode, quote
 from django.utils.crypto import get_random_string
 import requests
-from time import time
+from time import monotonic, sleep, time
 from mozilla_django_oidc.middleware import SessionRefresh
 from django.urls import reverse
 from mozilla_django_oidc.utils import absolutify, import_from_settings, generate_code_challenge
+import hashlib
 import logging
-from socket import gethostbyname, gethostname
+import signal
+import threading
+from socket import AF_INET6, IPPROTO_TCP, getaddrinfo, gethostname
 from typing import Optional
 
 from django.conf import settings
 from django.contrib import messages
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied, SuspiciousOperation
 from django.http import HttpRequest, JsonResponse, HttpResponseRedirect
 from django.utils.translation import gettext_lazy as _
@@ -26,6 +31,7 @@ from thunderbird_accounts.authentication.mfa import (
 )
 
 from .models import User
+from .token_cache import cache_token, get_cached_token, verify_access_token_locally
 from .utils import is_email_in_allow_list
 
 from mozilla_django_oidc.utils import add_state_and_verifier_and_nonce_to_session
@@ -80,6 +86,58 @@ def _request_refreshed_tokens(refresh_token):
     return response.json()
 
 
+def _refresh_lock_key(refresh_token: str) -> str:
+    token_hash = hashlib.sha256(refresh_token.encode()).hexdigest()
+    return f'{settings.OIDC_REFRESH_CACHE_KEY}:lock:{token_hash}'
+
+
+def _refresh_result_key(refresh_token: str) -> str:
+    token_hash = hashlib.sha256(refresh_token.encode()).hexdigest()
+    return f'{settings.OIDC_REFRESH_CACHE_KEY}:result:{token_hash}'
+
+
+def _request_refreshed_tokens_once(refresh_token):
+    """Refresh tokens with at most one request per refresh token in flight across every worker.
+
+    A SPA firing several requests right after expiry would otherwise refresh the same token concurrently, and
+    Keycloak's refresh token rotation fails all but the first. Here the first request takes a lock and publishes the
+    new token set for OIDC_REFRESH_RESULT_TTL_IN_SECONDS, while the others wait up to OIDC_REFRESH_WAIT_IN_SECONDS
+    for it and store the same tokens in their session. Raises like ``_request_refreshed_tokens``."""
+    if not settings.OIDC_REFRESH_SINGLE_FLIGHT_ENABLED:
+        return _request_refreshed_tokens(refresh_token)
+
+    result_key = _refresh_result_key(refresh_token)
+    token_info = cache.get(result_key)
+    if token_info:
+        return token_info
+
+    lock_key = _refresh_lock_key(refresh_token)
+    if not cache.add(lock_key, True, settings.OIDC_REFRESH_LOCK_TIMEOUT_IN_SECONDS):
+        deadline = monotonic() + settings.OIDC_REFRESH_WAIT_IN_SECONDS
+        while monotonic() < deadline:
+            sleep(0.05)
+            token_info = cache.get(result_key)
+            if token_info:
+                return token_info
+            if not cache.get(lock_key):
+                # The refresh in flight may have published its result and released the lock since we last looked,
+                # in which case the old refresh token has already been spent
+                token_info = cache.get(result_key)
+                if token_info:
+                    return token_info
+                # The refresh in flight failed, so make our own to get (and handle) its error
+                return _request_refreshed_tokens(refresh_token)
+
+        raise requests.exceptions.Timeout('Timed out waiting for a concurrent token refresh')
+
+    try:
+        token_info = _request_refreshed_tokens(refresh_token)
+        cache.set(result_key, token_info, settings.OIDC_REFRESH_RESULT_TTL_IN_SECONDS)
+        return token_info
+    finally:
+        cache.delete(lock_key)
+
+
 def refresh_user_access_token(request) -> Optional[str]:
     """Refresh the session's OIDC access token from its stored refresh token, persisting the
     rotated tokens. Returns the fresh access token, or None when no refresh token is stored or
@@ -89,7 +147,7 @@ def refresh_user_access_token(request) -> Optional[str]:
         return None
 
     try:
-        token_info = _request_refreshed_tokens(refresh_token)
+        token_info = _request_refreshed_tokens_once(refresh_token)
     except (requests.exceptions.RequestException, JSONDecodeError):
         return None
 
@@ -263,14 +321,47 @@ class AccountsOIDCBackend(OIDCAuthenticationBackend):
 
     def get_userinfo(self, access_token, id_token, payload):
         """Return user details dictionary. The id_token and payload are not used in
-        the default implementation, but may be used when overriding this method"""
+        the default implementation, but may be used when overriding this method
 
-        try:
-            return super().get_userinfo(access_token, id_token, payload)
-        except requests.exceptions.RequestException as ex:
-            # Capture the exception
-            capture_exception(ex)
-            raise AuthenticationUnavailable()
+        Served from the token cache when possible, see ``thunderbird_accounts.authentication.token_cache``."""
+        cached = get_cached_token(access_token)
+        if cached:
+            return cached['claims']
+
+        user_info = None
+        if settings.OIDC_VERIFY_ACCESS_TOKEN_LOCALLY:
+            user_info = verify_access_token_locally(access_token)
+
+        if user_info is None:
+            try:
+                user_info = super().get_userinfo(access_token, id_token, payload)
+            except requests.exceptions.RequestException as ex:
+                # Capture the exception
+                capture_exception(ex)
+                raise AuthenticationUnavailable()
+
+        cache_token(access_token, user_info)
+        return user_info
+
+    def _get_cached_token_user(self, access_token) -> Optional[User]:
+        """Return the active user an access token was already resolved to, if it's cached."""
+        cached = get_cached_token(access_token)
+        if not cached or not cached['user_id']:
+            return None
+
+        return self.get_user(cached['user_id'])
+
+    def get_or_create_user(self, access_token, id_token, payload):
+        """Skips the userinfo lookup and user update for an access token that's already been resolved to a user."""
+        user = self._get_cached_token_user(access_token)
+        if user:
+            return user
+
+        user = super().get_or_create_user(access_token, id_token, payload)
+        cached = get_cached_token(access_token)
+        if user and cached:
+            cache_token(access_token, cached['claims'], user.pk)
+        return user
 
     def get_user_from_access_token(self, access_token, verify=True):
         """Retrieve a user from an access_token, and optionally verify the claims"""
@@ -281,6 +372,10 @@ class AccountsOIDCBackend(OIDCAuthenticationBackend):
             msg = 'Claims verification failed'
             raise SuspiciousOperation(msg)
 
+        user = self._get_cached_token_user(access_token)
+        if user:
+            return user
+
         # email based filtering
         users = self.filter_users_by_claims(user_info)
 
@@ -290,7 +385,9 @@ class AccountsOIDCBackend(OIDCAuthenticationBackend):
         elif len(users) == 0:
             return None
 
-        return users.first()
+        user = users.first()
+        cache_token(access_token, user_info, user.pk)
+        return user
 
 
 class OIDCRefreshSession(SessionRefresh):
@@ -311,42 +408,51 @@ class OIDCRefreshSession(SessionRefresh):
         now = time()
         return expiration > 0 and now >= expiration
 
+    def is_expiring(self, request):
+        """Is the token expired or about to, within OIDC_REFRESH_LEEWAY_IN_SECONDS?"""
+        expiration = request.session.get('oidc_id_token_expiration', 0)
+        return expiration > 0 and time() >= expiration - settings.OIDC_REFRESH_LEEWAY_IN_SECONDS
+
     def process_request(self, request):
         """Handle a refresh session request. If it's not refreshable or the token is not expired then we skip this
-        and deal with the consequences elsewhere"""
+        and deal with the consequences elsewhere
+
+        Tokens are refreshed shortly before they expire, a failed early refresh is ignored since the current token
+        still works, and the next request tries again."""
         if not self.is_refreshable_url(request):
             logging.debug('request is not refreshable')
             return
 
-        if not self.is_expired(request):
+        if not self.is_expiring(request):
             return
 
         refresh_token = request.session.get(OIDC_REFRESH_TOKEN_KEY)
+        is_expired = self.is_expired(request)
 
         if not refresh_token:
             logging.debug('no refresh token stored')
-            return self.finish(request, prompt_reauth=True)
+            return self.finish(request, prompt_reauth=True) if is_expired else None
 
         try:
-            token_info = _request_refreshed_tokens(refresh_token)
+            token_info = _request_refreshed_tokens_once(refresh_token)
         except requests.exceptions.Timeout:
             logging.debug('timed out refreshing access token')
             # Don't prompt for reauth as this could be a temporary problem
-            return self.finish(request, prompt_reauth=False)
+            return self.finish(request, prompt_reauth=False) if is_expired else None
         except requests.exceptions.HTTPError as exc:
             status_code = exc.response.status_code
             logging.debug('http error %s when refreshing access token', status_code)
             # OAuth error response will be a 400 for various situations, including
             # an expired token. https://datatracker.ietf.org/doc/html/rfc6749#section-5.2
-            return self.finish(request, prompt_reauth=(status_code == 400))
+            return self.finish(request, prompt_reauth=(status_code == 400)) if is_expired else None
         except JSONDecodeError:
             logging.debug('malformed response when refreshing access token')
             # Don't prompt for reauth as this could be a temporary problem
-            return self.finish(request, prompt_reauth=False)
+            return self.finish(request, prompt_reauth=False) if is_expired else None
         except Exception as exc:
             logging.debug('unknown error occurred when refreshing access token: %s', exc)
             # Don't prompt for reauth as this could be a temporary problem
-            return self.finish(request, prompt_reauth=False)
+            return self.finish(request, prompt_reauth=False) if is_expired else None
 
         # Until we can properly validate an ID token on the refresh response
         # per the spec[1], we intentionally drop the id_token.
@@ -444,21 +550,103 @@ class OIDCRefreshSession(SessionRefresh):
         return f'{auth_url}?{query}'
 
 
-class SetHostIPInAllowedHostsMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
+# This machine's own addresses, as they appear in ALLOWED_HOSTS
+_host_addresses: frozenset[str] = frozenset()
+_host_addresses_lock = threading.Lock()
+_host_addresses_refresh_started = False
 
-    def __call__(self, request: HttpRequest):
-        allowed_hosts = settings.ALLOWED_HOSTS
 
-        # Get the IP of whatever machine is running this code and allow it as a hostname
-        hostname = gethostbyname(gethostname())
-        if hostname not in allowed_hosts:
-            allowed_hosts.append(hostname)
+def resolve_host_addresses() -> frozenset[str]:
+    """Resolve every IPv4 and IPv6 address of this machine's hostname, formatted as Django expects them in a Host
+    header (IPv6 in brackets). Returns an empty set if the hostname can't be resolved."""
+    try:
+        address_info = getaddrinfo(gethostname(), None, proto=IPPROTO_TCP)
+    except OSError as ex:
+        logging.warning(f'Could not resolve host addresses: {ex}')
+        return frozenset()
+
+    addresses = set()
+    for family, *_info, sockaddr in address_info:
+        address = sockaddr[0]
+        if family == AF_INET6:
+            # Scoped (link-local) addresses can't appear in a Host header
+            if '%' in address:
+                continue
+            address = f'[{address}]'
+        addresses.add(address)
+    return frozenset(addresses)
+
+
+def refresh_host_addresses():
+    """Re-resolve this machine's addresses and swap them into ALLOWED_HOSTS if they changed.
+
+    A failed lookup keeps the previous addresses."""
+    global _host_addresses
+
+    addresses = resolve_host_addresses()
+    with _host_addresses_lock:
+        if not addresses or addresses == _host_addresses:
+            return
+
+        # Drop the old addresses without touching any configured host
+        configured_hosts = [host for host in settings.ALLOWED_HOSTS if host not in _host_addresses]
+        settings.ALLOWED_HOSTS = configured_hosts + sorted(addresses.difference(configured_hosts))
+        _host_addresses = addresses
+
+
+def _refresh_host_addresses_periodically(interval: float):
+    while True:
+        sleep(interval)
+        refresh_host_addresses()
+
+
+def _start_host_address_refresh():
+    """Resolve the host addresses now and keep them current, on a timer and on SIGHUP. Only runs once per process."""
+    global _host_addresses_refresh_started
+
+    refresh_host_addresses()
 
-        # Set both django allowed hosts and cors allowed origins
-        settings.ALLOWED_HOSTS = allowed_hosts
+    with _host_addresses_lock:
+        if _host_addresses_refresh_started:
+            return
+        _host_addresses_refresh_started = True
+
+    interval = settings.HOST_ADDRESSES_REFRESH_INTERVAL_IN_SECONDS
+    if interval:
+        threading.Thread(
+            target=_refresh_host_addresses_periodically,
+            args=(interval,),
+            name='host-addresses-refresh',
+            daemon=True,
+        ).start()
+
+    # Signal handlers can only be installed from the main thread
+    if threading.current_thread() is threading.main_thread():
+        previous_handler = signal.getsignal(signal.SIGHUP)
+
+        def _on_sighup(signum, frame):
+            refresh_host_addresses()
+            if callable(previous_handler):
+                previous_handler(signum, frame)
 
-        response = self.get_response(request)
+        signal.signal(signal.SIGHUP, _on_sighup)
+
+
+class SetHostIPInAllowedHostsMiddleware:
+    """Allow this machine's own IPs as hostnames, so requests addressed to the container directly (e.g. load balancer
+    health probes) aren't rejected.
 
-        return response
+    The addresses are resolved once when the middleware is loaded and kept current in the background, so requests
+    only pay for Django's usual ALLOWED_HOSTS check."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        _start_host_address_refresh()
+
+    def __call__(self, request: HttpRequest):
+        return self.get_response(request)
@@ -1,8 +1,10 @@
+import hashlib
 import json
 import logging
+import pickle
 import re
 import unicodedata
-from functools import cache
+from functools import lru_cache
 from pathlib import Path
 
 # ---------------------------------------------------------------------------
@@ -65,6 +67,10 @@ regexes = [re.compile('^' + n) for n in reserved_names]
 #     `update_reserved_words` management command, with two disjoint sections,
 #     "exact" and "affix".
 #   * exact-words.json / affix-words.json -- hand-maintained thundermail additions.
+#   * compiled-words.pickle -- the three lists above merged, normalized, sorted
+#     and de-duplicated, also written by `update_reserved_words`. It carries a
+#     checksum of the JSON files it was built from and is only used while that
+#     checksum still matches; otherwise we fall back to parsing the JSON.
 #
 # "exact" entries match only when the local-part equals an entry; "affix" entries
 # also match as a prefix or suffix (e.g. "admin-billing", "company-postmaster").
@@ -75,6 +81,10 @@ _DATA_DIR = Path(__file__).resolve().parent
 _GENERATED_WORDS_FILE = 'generated-words.json'
 _EXACT_WORDS_FILE = 'exact-words.json'
 _AFFIX_WORDS_FILE = 'affix-words.json'
+COMPILED_WORDS_FILE = 'compiled-words.pickle'
+
+# Bump when the layout of the compiled artifact changes.
+_COMPILED_WORDS_FORMAT = 1
 
 
 def _normalize_local_part(value: str) -> str:
@@ -87,8 +97,8 @@ def _normalize_local_part(value: str) -> str:
     return unicodedata.normalize('NFKC', value).strip().lower()
 
 
-def _read_json(filename: str):
-    with open(_DATA_DIR / filename, encoding='utf-8') as fh:
+def _read_json(filename: str, data_dir: Path = _DATA_DIR):
+    with open(data_dir / filename, encoding='utf-8') as fh:
         return json.load(fh)
 
 
@@ -98,16 +108,58 @@ def _normalized(words) -> set[str]:
     return names
 
 
+def _source_checksum(data_dir: Path = _DATA_DIR) -> str:
+    """Checksum of the JSON word lists, used to tell whether the compiled artifact is stale."""
+    digest = hashlib.sha256(f'format:{_COMPILED_WORDS_FORMAT}'.encode())
+    for filename in (_GENERATED_WORDS_FILE, _EXACT_WORDS_FILE, _AFFIX_WORDS_FILE):
+        digest.update((data_dir / filename).read_bytes())
+    return digest.hexdigest()
+
+
+def _load_json_words(data_dir: Path = _DATA_DIR) -> tuple[frozenset[str], frozenset[str]]:
+    generated = _read_json(_GENERATED_WORDS_FILE, data_dir)
+    exact = _normalized(generated['exact']) | _normalized(_read_json(_EXACT_WORDS_FILE, data_dir))
+    affix = _normalized(generated['affix']) | _normalized(_read_json(_AFFIX_WORDS_FILE, data_dir))
+    return frozenset(exact), frozenset(affix)
+
+
+def _load_compiled_words(checksum: str) -> tuple[frozenset[str], frozenset[str]] | None:
+    """Load the compiled artifact, or return None if it is missing, unreadable or stale."""
+    try:
+        with open(_DATA_DIR / COMPILED_WORDS_FILE, 'rb') as fh:
+            compiled = pickle.load(fh)
+        if compiled['checksum'] != checksum:
+            logging.warning(f'{COMPILED_WORDS_FILE} is stale, falling back to the JSON word lists.')
+            return None
+        return frozenset(compiled['exact']), frozenset(compiled['affix'])
+    except (OSError, EOFError, pickle.UnpicklingError, KeyError, TypeError) as exc:
+        logging.warning(f'Failed to load {COMPILED_WORDS_FILE}, falling back to the JSON word lists: {exc}')
+        return None
+
+
+def write_compiled_words(data_dir: Path = _DATA_DIR) -> tuple[int, int]:
+    """Build the compiled artifact from the JSON word lists in data_dir.
+
+    Returns the number of exact and affix entries written.
+    """
+    exact, affix = _load_json_words(data_dir)
+    compiled = {
+        'checksum': _source_checksum(data_dir),
+        'exact': tuple(sorted(exact)),
+        'affix': tuple(sorted(affix)),
+    }
+    with open(data_dir / COMPILED_WORDS_FILE, 'wb') as fh:
+        pickle.dump(compiled, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    return len(exact), len(affix)
+
+
 def _load_words() -> tuple[frozenset[str], frozenset[str]]:
     # Don't break the app if we fail to load these files.
     try:
-        generated = _read_json(_GENERATED_WORDS_FILE)
-        exact = _normalized(generated['exact']) | _normalized(_read_json(_EXACT_WORDS_FILE))
-        affix = _normalized(generated['affix']) | _normalized(_read_json(_AFFIX_WORDS_FILE))
+        return _load_compiled_words(_source_checksum()) or _load_json_words()
     except (OSError, ValueError, KeyError) as exc:
         logging.error(f'Failed to load reserved word lists: {exc}')
         return frozenset(), frozenset()
-    return frozenset(exact), frozenset(affix)
 
 
 # RESERVED_LOCAL_PARTS is matched by exact comparison only;
@@ -124,18 +176,57 @@ RESERVED_LOCAL_PARTS, AFFIX_RESERVED_LOCAL_PARTS = _load_words()
 # "mailer-daemon") still match by prefix/suffix.
 _AFFIX_SEPARATORS = re.compile(r'[^a-z0-9]+')
 
+# Marks the end of a term inside a trie node. Terms never contain the empty
+# string as a character, so it can't collide with a real edge.
+_TERM_END = ''
+
+# Upper bound on memoized is_reserved() results. The input is user-controlled
+# (sign-up and alias forms), so an unbounded cache would grow with every random
+# string thrown at it.
+_IS_RESERVED_CACHE_SIZE = 4096
+
+
+def _build_trie(words) -> dict:
+    """Build a character trie (nested dicts) from the given words."""
+    root: dict = {}
+    for word in words:
+        node = root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[_TERM_END] = True
+    return root
+
+
+def _trie_has_prefix_of(trie: dict, value) -> bool:
+    """Returns True if any word in the trie is a prefix of (or equal to) value."""
+    node = trie
+    for char in value:
+        node = node.get(char)
+        if node is None:
+            return False
+        if _TERM_END in node:
+            return True
+    return False
+
+
+# Compiled once at import so each affix check is linear in the length of the
+# local-part rather than in the size of the word list. Suffixes are matched by
+# walking a trie of the reversed terms over the reversed candidate.
+_AFFIX_PREFIX_TRIE = _build_trie(AFFIX_RESERVED_LOCAL_PARTS)
+_AFFIX_SUFFIX_TRIE = _build_trie(term[::-1] for term in AFFIX_RESERVED_LOCAL_PARTS)
+
 
 def _affix_match(local_part: str) -> bool:
     candidates = [token for token in _AFFIX_SEPARATORS.split(local_part) if token]
     candidates.append(local_part)
     return any(
-        candidate == term or candidate.startswith(term) or candidate.endswith(term)
+        _trie_has_prefix_of(_AFFIX_PREFIX_TRIE, candidate)
+        or _trie_has_prefix_of(_AFFIX_SUFFIX_TRIE, reversed(candidate))
         for candidate in candidates
-        for term in AFFIX_RESERVED_LOCAL_PARTS
     )
 
 
-@cache
+@lru_cache(maxsize=_IS_RESERVED_CACHE_SIZE)
 def is_reserved(test_string: str) -> bool:
     """Checks the address or random string is a reserved name which should fail user or alias creation if so."""
     local_part = _normalize_local_part(test_string)
@@ -0,0 +1,58 @@
+from django.db.models.signals import post_delete, post_init, post_save
+
+from thunderbird_accounts.authentication.utils import (
+    invalidate_allow_list_cache,
+    invalidate_allow_list_cache_for_emails,
+)
+
+# User fields that is_email_in_allow_list looks at.
+_ALLOW_LIST_USER_FIELDS = ('email', 'recovery_email', 'is_active')
+
+
+def allow_list_entry_changed(sender, instance, **kwargs):
+    invalidate_allow_list_cache()
+
+
+def remember_user_allow_list_emails(sender, instance, **kwargs):
+    # Read from __dict__ so deferred fields don't trigger a query.
+    instance._allow_list_emails = (instance.__dict__.get('email'), instance.__dict__.get('recovery_email'))
+
+
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(_ALLOW_LIST_USER_FIELDS):
+        return
+
+    # Cover both the emails the user was loaded with and the ones they have now.
+    old_emails = getattr(instance, '_allow_list_emails', ())
+    invalidate_allow_list_cache_for_emails(*old_emails, instance.email, instance.recovery_email)
+    remember_user_allow_list_emails(sender, instance)
+
+
+def register_allow_list_cache_handlers():
+    from thunderbird_accounts.authentication.models import AllowListEntry, User
+
+    post_save.connect(
+        allow_list_entry_changed,
+        sender=AllowListEntry,
+        dispatch_uid='thunderbird_accounts.authentication.allow_list_entry_saved',
+    )
+    post_delete.connect(
+        allow_list_entry_changed,
+        sender=AllowListEntry,
+        dispatch_uid='thunderbird_accounts.authentication.allow_list_entry_deleted',
+    )
+    post_init.connect(
+        remember_user_allow_list_emails,
+        sender=User,
+        dispatch_uid='thunderbird_accounts.authentication.remember_user_allow_list_emails',
+    )
+    post_save.connect(
+        user_changed,
+        sender=User,
+        dispatch_uid='thunderbird_accounts.authentication.user_saved',
+    )
+    post_delete.connect(
+        user_changed,
+        sender=User,
+        dispatch_uid='thunderbird_accounts.authentication.user_deleted',
+    )
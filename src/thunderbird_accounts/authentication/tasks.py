@@ -1,43 +1,48 @@
 from django.contrib.auth.models import Group
+import functools
+import itertools
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta, datetime, UTC
+from typing import Callable
 
 import sentry_sdk
 import waffle
 from celery import shared_task
 from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
-from django.db.models import Exists, OuterRef, QuerySet
+from django.db.models import Exists, OuterRef, Q, QuerySet
 from django.utils import timezone
 
+from thunderbird_accounts.authentication.clients import KeycloakClient
 from thunderbird_accounts.authentication.models import User, AllowListEntry
-from thunderbird_accounts.authentication.utils import delete_user_data
+from thunderbird_accounts.authentication.utils import (
+    delete_user_data,
+    delete_user_external_data,
+    discard_stashed_allow_list_import,
+    import_allow_list_entries,
+    read_stashed_allow_list_import,
+)
 from thunderbird_accounts.celery.exceptions import TaskFailed
-from thunderbird_accounts.subscription.mailchimp import MailchimpClient
+from thunderbird_accounts.subscription.mailchimp import (
+    MAILCHIMP_CONTACT_EXISTS_ERROR_CODE,
+    MAILCHIMP_MAX_BATCH_MEMBERS,
+    MailchimpClient,
+    get_mirrored_members,
+    hash_email,
+    mirror_members,
+)
 from thunderbird_accounts.subscription.models import Subscription
 
 logger = logging.getLogger(__name__)
 
-# While a 400 could indicate other kinds of "bad input", it's our clearest
-# signal when Mailchimp rejects an email.
-PERMANENT_RECOVERY_EMAIL_REJECTION_STATUS_CODE = 400
-
-# When active, purge_incomplete_signups actually deletes stale users (via delete_user_data).
+# When active, purge_incomplete_signups actually deletes stale users (from Keycloak, Stalwart and the local DB).
 # When inactive (the default), it just parks them in the "Users to Purge" group so we can
 # confirm the selection criteria are correct before nuking anyone.
 # See https://github.com/thunderbird/thunderbird-accounts/issues/964 for more info.
 PURGE_INCOMPLETE_SIGNUPS_SWITCH = 'purge-incomplete-signups'
-
-
-def is_permanent_recovery_email_rejection(ex: TaskFailed) -> bool:
-    """Return True when Mailchimp rejects the member create request."""
-    return ex.other.get('error_status_code') == PERMANENT_RECOVERY_EMAIL_REJECTION_STATUS_CODE
-
-
-def get_recovery_email_rejection_reason(ex: TaskFailed) -> str:
-    reason = ex.other.get('error_msg_detail') or ex.other.get('error_msg_title') or ex.reason
-    max_length = User._meta.get_field('recovery_email_rejection_reason').max_length
-    return str(reason)[:max_length]
+PURGE_INCOMPLETE_SIGNUPS_GROUP = 'Users to Purge'
 
 
 def get_stale_incomplete_signup_users(cutoff_hours: int) -> QuerySet[User]:
@@ -58,9 +63,130 @@ def get_stale_incomplete_signup_users(cutoff_hours: int) -> QuerySet[User]:
     )
 
 
+def _tag_abandoned_cart_chunk(
+    client: MailchimpClient, tag: str, get_tag_id: Callable[[], int], users: tuple[User, ...]
+) -> dict:
+    """Subscribe and tag one chunk of abandoned sign-ups with at most two Mailchimp requests.
+
+    Members the local mirror already knows to have the tag are left alone. Members that aren't known to be on
+    the list are created through batch subscribe, then everyone left is added to the tag in a single static
+    segment request. Members that batch subscribe rejects for any reason other than already existing get their
+    recovery email marked as rejected."""
+    language_fallback = settings.DEFAULT_LANGUAGE
+    mailchimp_language_map = settings.ACCOUNTS_TO_MAILCHIMP_LANGUAGES
+
+    users_by_email: dict[str, list[User]] = {}
+    for user in users:
+        users_by_email.setdefault(user.recovery_email.lower(), []).append(user)
+
+    email_hashes = {email: hash_email(email) for email in users_by_email}
+    mirrored = get_mirrored_members(list(email_hashes.values()))
+
+    unchanged_users = 0
+    for email, email_hash in email_hashes.items():
+        if email_hash in mirrored and tag in mirrored[email_hash].tags:
+            unchanged_users += len(users_by_email.pop(email))
+
+    if not users_by_email:
+        return {'tagged': 0, 'errors': 0, 'rejected': 0, 'unchanged': unchanged_users}
+
+    members = [
+        {
+            'email_address': email_users[0].recovery_email,
+            'status': 'subscribed',
+            'email_type': 'html',
+            'language': mailchimp_language_map.get(email_users[0].language) or language_fallback,
+        }
+        for email, email_users in users_by_email.items()
+        if email_hashes[email] not in mirrored
+    ]
+
+    to_tag = set(users_by_email)
+    created = set()
+    rejected_users = []
+    if members:
+        try:
+            response = client.batch_subscribe(members, error_context={'member_count': len(members)})
+        except TaskFailed as ex:
+            logger.warning(
+                f'tag_abandoned_cart_in_mailchimp: batch subscribe failed for {len(users)} users: {ex.other}'
+            )
+            return {'tagged': 0, 'errors': len(users) - unchanged_users, 'rejected': 0, 'unchanged': unchanged_users}
+
+        created = {member['email_address'].lower() for member in members}
+        rejected_at = timezone.now()
+        max_reason_length = User._meta.get_field('recovery_email_rejection_reason').max_length
+        for error in response.get('errors') or []:
+            email = (error.get('email_address') or '').lower()
+            created.discard(email)
+            if error.get('error_code') == MAILCHIMP_CONTACT_EXISTS_ERROR_CODE:
+                continue
+
+            to_tag.discard(email)
+            for user in users_by_email.get(email, []):
+                user.recovery_email_rejected_at = rejected_at
+                user.recovery_email_rejection_reason = str(error.get('error') or 'mailchimp error')[:max_reason_length]
+                user.updated_at = rejected_at
+                rejected_users.append(user)
+                logger.warning(
+                    'tag_abandoned_cart_in_mailchimp: marked recovery_email rejected for %s: %s',
+                    user.uuid,
+                    user.recovery_email_rejection_reason,
+                )
+
+        if rejected_users:
+            User.objects.bulk_update(
+                rejected_users,
+                ['recovery_email_rejected_at', 'recovery_email_rejection_reason', 'updated_at'],
+            )
+
+    tagged_users = sum(len(users_by_email[email]) for email in to_tag)
+    untagged_users = 0
+    if to_tag:
+        try:
+            response = client.add_members_to_tag(
+                get_tag_id(), sorted(to_tag), error_context={'member_count': len(to_tag)}
+            )
+        except TaskFailed as ex:
+            logger.warning(f'tag_abandoned_cart_in_mailchimp: tagging failed for {tagged_users} users: {ex.other}')
+            untagged_users = tagged_users
+            to_tag.clear()
+        else:
+            for error in response.get('errors') or []:
+                for email in error.get('email_addresses') or []:
+                    to_tag.discard(email.lower())
+                    email_users = users_by_email.get(email.lower(), [])
+                    untagged_users += len(email_users)
+                    for user in email_users:
+                        logger.warning(
+                            f'tag_abandoned_cart_in_mailchimp: mailchimp error for {user.uuid}: {error.get("error")}',
+                        )
+
+    mirror_updates = {}
+    for email in to_tag:
+        known = mirrored.get(email_hashes[email])
+        if known:
+            mirror_updates[known.email_hash] = {'status': known.status, 'tags': [*known.tags, tag]}
+        else:
+            status = 'subscribed' if email in created else None
+            mirror_updates[email_hashes[email]] = {'status': status, 'tags': [tag]}
+    mirror_members(mirror_updates)
+
+    return {
+        'tagged': tagged_users - untagged_users,
+        'errors': untagged_users + len(rejected_users),
+        'rejected': len(rejected_users),
+        'unchanged': unchanged_users,
+    }
+
+
 @shared_task(bind=True)
 def tag_abandoned_cart_in_mailchimp(self):
-    """Tag abandoned sign-up users with abandoned_cart in Mailchimp."""
+    """Tag abandoned sign-up users with abandoned_cart in Mailchimp.
+
+    Candidates are sent to Mailchimp in chunks of ABANDONED_CART_MAILCHIMP_BATCH_SIZE, so a run costs a couple of
+    requests (and one subscription check) per chunk rather than per user. Members the local mirror already has tagged
+    are counted as unchanged and not sent at all."""
     if not settings.USE_MAILCHIMP:
         return {
             'task_status': 'skipped',
@@ -68,33 +194,27 @@ def tag_abandoned_cart_in_mailchimp(self):
             'errors': 0,
             'rejected': 0,
             'skipped': 0,
+            'unchanged': 0,
         }
 
     tagged = 0
     errors = 0
     rejected = 0
     skipped = 0
-    language_fallback = settings.DEFAULT_LANGUAGE
-    mailchimp_language_map = settings.ACCOUNTS_TO_MAILCHIMP_LANGUAGES
-    mailchimp_tag = settings.ABANDONED_CART_MAILCHIMP_TAG
+    unchanged = 0
+    batch_size = min(settings.ABANDONED_CART_MAILCHIMP_BATCH_SIZE, MAILCHIMP_MAX_BATCH_MEMBERS)
     client = MailchimpClient()
-
-    for user in get_stale_incomplete_signup_users(cutoff_hours=settings.ABANDONED_CART_TAG_HOURS).iterator():
-        try:
-            if user.subscription_set.exists():
-                skipped += 1
-                logger.info(
-                    f'tag_abandoned_cart_in_mailchimp: skipped {user.uuid} because a subscription exists',
-                )
-                continue
-
-            if user.is_awaiting_payment_verification:
-                skipped += 1
-                logger.info(
-                    f'tag_abandoned_cart_in_mailchimp: skipped {user.uuid} because payment verification is pending',
-                )
-                continue
-
+    mailchimp_tag = settings.ABANDONED_CART_MAILCHIMP_TAG
+    # Only looked up once a chunk actually needs tagging
+    get_tag_id = functools.cache(lambda: client.get_or_create_tag_id(mailchimp_tag))
+
+    def eligible_users():
+        # Subscriptions and pending payment verification are already excluded by the queryset.
+        nonlocal skipped
+        users = get_stale_incomplete_signup_users(cutoff_hours=settings.ABANDONED_CART_TAG_HOURS).only(
+            'pk', 'uuid', 'language', 'recovery_email', 'recovery_email_rejected_at'
+        )
+        for user in users.iterator(chunk_size=batch_size):
             if not user.recovery_email:
                 skipped += 1
                 logger.info(
@@ -111,43 +231,26 @@ def tag_abandoned_cart_in_mailchimp(self):
                 )
                 continue
 
-            language = mailchimp_language_map.get(user.language) or language_fallback
-            client.add_or_tag_member(
-                user.recovery_email,
-                mailchimp_tag,
-                language=language,
-                error_context={'user_uuid': str(user.uuid)},
-            )
-        except TaskFailed as ex:
-            errors += 1
-            if is_permanent_recovery_email_rejection(ex):
-                rejected += 1
-                user.recovery_email_rejected_at = timezone.now()
-                user.recovery_email_rejection_reason = get_recovery_email_rejection_reason(ex)
-                user.save(
-                    update_fields=[
-                        'recovery_email_rejected_at',
-                        'recovery_email_rejection_reason',
-                        'updated_at',
-                    ],
-                )
-                logger.warning(
-                    'tag_abandoned_cart_in_mailchimp: marked recovery_email rejected for %s: %s',
-                    user.uuid,
-                    user.recovery_email_rejection_reason,
-                )
-                continue
+            yield user
 
-            logger.warning(
-                f'tag_abandoned_cart_in_mailchimp: mailchimp error for {user.uuid}: {ex.reason}',
-            )
-            continue
-        except Exception as ex:
-            errors += 1
-            logger.exception(f'tag_abandoned_cart_in_mailchimp: failed to tag {user.uuid}: {ex}')
+    for users in itertools.batched(eligible_users(), batch_size):
+        # A user may have subscribed since the candidates were selected, check again right before tagging
+        subscribed = set(
+            Subscription.objects.filter(user_id__in=[user.pk for user in users]).values_list('user_id', flat=True)
+        )
+        for user in users:
+            if user.pk in subscribed:
+                skipped += 1
+                logger.info(f'tag_abandoned_cart_in_mailchimp: skipped {user.uuid} because a subscription exists')
+        users = tuple(user for user in users if user.pk not in subscribed)
+        if not users:
             continue
-        else:
-            tagged += 1
+
+        chunk_result = _tag_abandoned_cart_chunk(client, mailchimp_tag, get_tag_id, users)
+        tagged += chunk_result['tagged']
+        errors += chunk_result['errors']
+        rejected += chunk_result['rejected']
+        unchanged += chunk_result['unchanged']
 
     result = {
         'task_status': 'completed',
@@ -155,24 +258,135 @@ def tag_abandoned_cart_in_mailchimp(self):
         'errors': errors,
         'rejected': rejected,
         'skipped': skipped,
+        'unchanged': unchanged,
     }
     logger.info('tag_abandoned_cart_in_mailchimp: %s', result)
     return result
 
 
+def _stale_incomplete_signup_id_chunks(after=None):
+    """Yield the ids of stale incomplete sign-ups in chunks of PURGE_INCOMPLETE_SIGNUPS_CHUNK_SIZE.
+
+    Uses keyset pagination on the primary key (starting after ``after`` if given), so each page is an indexed range
+    scan no matter how far into the candidates we are."""
+    chunk_size = settings.PURGE_INCOMPLETE_SIGNUPS_CHUNK_SIZE
+    queryset = get_stale_incomplete_signup_users(cutoff_hours=settings.INCOMPLETE_SIGNUP_PURGE_HOURS).order_by('pk')
+
+    while True:
+        page = queryset.filter(pk__gt=after) if after else queryset
+        user_ids = list(page.values_list('pk', flat=True)[:chunk_size])
+        if not user_ids:
+            return
+        yield user_ids
+        after = user_ids[-1]
+
+
+def _delete_external_data(oidc_id, stalwart_primary_email, keycloak_client) -> tuple[list[str], Exception | None]:
+    try:
+        return delete_user_external_data(oidc_id, stalwart_primary_email, keycloak_client), None
+    except Exception as ex:
+        return [], ex
+
+
+def _purge_incomplete_signups_chunk(user_ids: list, purge: bool) -> dict:
+    """Park (or with ``purge`` delete) a chunk of stale incomplete sign-ups."""
+    deleted = 0
+    errors = 0
+
+    group, _ = Group.objects.get_or_create(name=PURGE_INCOMPLETE_SIGNUPS_GROUP)
+
+    with transaction.atomic():
+        # Lock the candidates and re-check the criteria, a subscription or a pending payment verification may have
+        # shown up since they were selected.
+        locked_ids = list(User.objects.select_for_update().filter(pk__in=user_ids).values_list('pk', flat=True))
+        users = list(
+            get_stale_incomplete_signup_users(cutoff_hours=settings.INCOMPLETE_SIGNUP_PURGE_HOURS).filter(
+                pk__in=locked_ids
+            )
+        )
+        skipped = len(user_ids) - len(users)
+
+        if not purge:
+            group.user_set.add(*users)
+            return {'deleted': len(users), 'errors': 0, 'skipped': skipped}
+
+        # Resolve everything that needs the DB up front, the worker threads only talk to Keycloak and Stalwart.
+        targets = [(user.oidc_id, user.stalwart_primary_email if user.oidc_id else None) for user in users]
+        keycloak_client = KeycloakClient()
+        with ThreadPoolExecutor(max_workers=settings.PURGE_INCOMPLETE_SIGNUPS_KEYCLOAK_CONCURRENCY) as executor:
+            results = list(
+                executor.map(lambda target: _delete_external_data(*target, keycloak_client=keycloak_client), targets)
+            )
+
+        delete_ids = []
+        for user, (purge_errors, exception) in zip(users, results):
+            if exception:
+                # Leave the local user alone so the next run retries them.
+                errors += 1
+                sentry_sdk.capture_exception(exception)
+                logger.error('purge_incomplete_signups: failed to delete %s: %s', user.uuid, exception)
+                continue
+
+            logger.info('purge_incomplete_signups: purging %s', user.uuid)
+            delete_ids.append(user.pk)
+            if purge_errors:
+                errors += 1
+                logger.warning(
+                    'purge_incomplete_signups: partial deletion for %s: %s',
+                    user.uuid,
+                    purge_errors,
+                )
+            else:
+                deleted += 1
+
+        User.objects.filter(pk__in=delete_ids).delete()
+
+    return {'deleted': deleted, 'errors': errors, 'skipped': skipped}
+
+
+@shared_task(bind=True, acks_late=True)
+def purge_incomplete_signups_chunk(self, user_ids: list, purge: bool):
+    """Process one chunk of :any:`purge_incomplete_signups` on a worker.
+
+    Chunks re-check the selection criteria, so a redelivered chunk is safe to run again."""
+    try:
+        result = {'task_status': 'completed', **_purge_incomplete_signups_chunk(user_ids, purge)}
+    except Exception as ex:
+        sentry_sdk.capture_exception(ex)
+        logger.exception('purge_incomplete_signups_chunk: failed to process chunk')
+        result = {'task_status': 'failed', 'deleted': 0, 'errors': len(user_ids), 'skipped': 0}
+
+    logger.info('purge_incomplete_signups_chunk: %s', result)
+    return result
+
+
+def _remove_ineligible_users_from_purge_group(group: Group):
+    """Remove any users that no longer match the purge criteria from the "Users to Purge" group."""
+    has_subscription = Subscription.objects.filter(user_id=OuterRef('pk'))
+    ineligible = group.user_set.filter(
+        Q(is_superuser=True)
+        | Q(is_staff=True)
+        | Q(is_test_account=True)
+        | Q(is_awaiting_payment_verification=True)
+        | Q(plan__isnull=False)
+        | Q(Exists(has_subscription))
+    )
+    group.user_set.remove(*ineligible)
+
+
 @shared_task(bind=True)
 def purge_incomplete_signups(self):
     """Delete abandoned sign-up users older than INCOMPLETE_SIGNUP_PURGE_HOURS.
 
     Only targets users with no Subscription records (including lapsed/canceled) who are not
     waiting on payment verification after checkout.
-    """
-    deleted = 0
-    errors = 0
-    skipped = 0
 
+    Candidate ids are selected in chunks with keyset pagination. A run that fits in one chunk is processed inline;
+    larger runs fan the chunks out to :any:`purge_incomplete_signups_chunk` tasks so they spread across workers. The
+    last dispatched id is checkpointed in the cache, so a run that gets interrupted picks up where it left off.
+    """
     # Fetch or create the "Users to purge" group
-    group, _ = Group.objects.get_or_create(name='Users to Purge')
+    group, _ = Group.objects.get_or_create(name=PURGE_INCOMPLETE_SIGNUPS_GROUP)
     if not group:
         result = {
             'task_status': 'failed',
@@ -185,73 +399,33 @@ def purge_incomplete_signups(self):
     switch_status = waffle.switch_is_active(PURGE_INCOMPLETE_SIGNUPS_SWITCH)
     logger.info(f'purge_incomplete_signups: Running with {PURGE_INCOMPLETE_SIGNUPS_SWITCH} = {switch_status}')
 
-    for user in get_stale_incomplete_signup_users(cutoff_hours=settings.INCOMPLETE_SIGNUP_PURGE_HOURS).iterator():
-        try:
-            with transaction.atomic():
-                user = User.objects.select_for_update().get(pk=user.pk)
-
-                # Now that we have a locked fresh copy of the user, we can safely check for subscriptions
-                # and payment verification so we avoid race conditions
-                if user.subscription_set.exists():
-                    skipped += 1
-                    logger.info('purge_incomplete_signups: skipped %s because a subscription exists', user.uuid)
-                    continue
-
-                if user.is_awaiting_payment_verification:
-                    skipped += 1
-                    logger.info(
-                        'purge_incomplete_signups: skipped %s because payment verification is pending',
-                        user.uuid,
-                    )
-                    continue
-
-                if switch_status:
-                    logger.info('purge_incomplete_signups: purging %s', user.uuid)
-                    purge_errors = delete_user_data(user)
-                else:
-                    user.groups.add(group)
-                    purge_errors = []
-
-        except User.DoesNotExist:
-            skipped += 1
-            continue
-        except Exception as ex:
-            errors += 1
-            sentry_sdk.capture_exception(ex)
-            logger.exception('purge_incomplete_signups: failed to delete %s', user.uuid)
-            continue
-
-        if purge_errors:
-            errors += 1
-            logger.warning(
-                'purge_incomplete_signups: partial deletion for %s: %s',
-                user.uuid,
-                purge_errors,
-            )
-        else:
-            deleted += 1
+    checkpoint_key = settings.PURGE_INCOMPLETE_SIGNUPS_CHECKPOINT_CACHE_KEY
+    checkpoint = cache.get(checkpoint_key)
+    if checkpoint:
+        logger.info(f'purge_incomplete_signups: resuming after {checkpoint}')
+
+    chunks = _stale_incomplete_signup_id_chunks(after=checkpoint)
+    first_chunk = next(chunks, [])
+    second_chunk = next(chunks, None)
+
+    if second_chunk is None:
+        # Small run, no need to involve other workers.
+        result = {'task_status': 'completed', **_purge_incomplete_signups_chunk(first_chunk, switch_status)}
+    else:
+        dispatched = 0
+        candidates = 0
+        for user_ids in itertools.chain([first_chunk, second_chunk], chunks):
+            purge_incomplete_signups_chunk.delay([str(user_id) for user_id in user_ids], switch_status)
+            dispatched += 1
+            candidates += len(user_ids)
+            cache.set(checkpoint_key, str(user_ids[-1]), settings.PURGE_INCOMPLETE_SIGNUPS_CHECKPOINT_TTL)
+        result = {'task_status': 'dispatched', 'chunks': dispatched, 'candidates': candidates}
+
+    cache.delete(checkpoint_key)
 
     # Keeping this until we fully remove the switch
-    # Remove any users that no longer match criteria
-    for user in group.user_set.iterator():
-        if any(
-            [
-                user.is_superuser,
-                user.is_staff,
-                user.is_test_account,
-                user.is_awaiting_payment_verification,
-                user.plan,
-                user.subscription_set.count() > 0,
-            ]
-        ):
-            user.groups.remove(group)
+    _remove_ineligible_users_from_purge_group(group)
 
-    result = {
-        'task_status': 'completed',
-        'deleted': deleted,
-        'errors': errors,
-        'skipped': skipped,
-    }
     logger.info('purge_incomplete_signups: %s', result)
     return result
 
@@ -288,3 +462,41 @@ def purge_stale_test_allow_list_entries(self):
         f'and {users_deleted} associated users.'
     )
     return result
+
+
+@shared_task(bind=True)
+def bulk_import_allow_list(self, import_id: str, chunk_count: int, total: int):
+    """Background version of the allow list bulk importer for large imports.
+
+    The csv lines are read from the shared cache, where the view stored them with ``stash_allow_list_import``, and
+    dropped from it as they are imported. Reports ``processed``/``total`` rows through the PROGRESS state so the admin
+    status page can follow along. Only the first ``ALLOW_LIST_IMPORT_MAX_MESSAGES`` dupe/error messages are kept in the
+    result.
+    """
+
+    def report_progress(processed: int):
+        self.update_state(state='PROGRESS', meta={'processed': processed, 'total': total})
+
+    try:
+        result = import_allow_list_entries(
+            read_stashed_allow_list_import(import_id, chunk_count), on_progress=report_progress
+        )
+    except ValueError as ex:
+        raise TaskFailed('import expired from the cache', {'import_id': import_id, 'error': str(ex)})
+    finally:
+        discard_stashed_allow_list_import(import_id, chunk_count)
+
+    max_messages = settings.ALLOW_LIST_IMPORT_MAX_MESSAGES
+    result = {
+        'task_status': 'completed',
+        'added': result['added'],
+        'dupe_count': len(result['dupes']),
+        'error_count': len(result['errors']),
+        'dupes': result['dupes'][:max_messages],
+        'errors': result['errors'][:max_messages],
+    }
+    logger.info(
+        f'bulk_import_allow_list: added {result["added"]}, {result["dupe_count"]} dupes, '
+        f'{result["error_count"]} errors.'
+    )
+    return result
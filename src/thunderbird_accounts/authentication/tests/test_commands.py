@@ -1,4 +1,5 @@
 import json
+import pickle
 import tempfile
 from pathlib import Path
 from unittest import mock
@@ -10,7 +11,7 @@ _COMMAND_MODULE = 'thunderbird_accounts.authentication.management.commands.updat
 
 
 class UpdateReservedWordsCommandTests(TestCase):
-    def _run_with_fakes(self) -> dict:
+    def _run_with_fakes(self, *args) -> dict:
         """Run the command with all network fetches mocked; return the written JSON."""
 
         def fake_fetch_json(url):
@@ -27,15 +28,24 @@ class UpdateReservedWordsCommandTests(TestCase):
             raise AssertionError(f'unexpected fetch url: {url}')
 
         with tempfile.TemporaryDirectory() as tmp:
-            (Path(tmp) / 'reserved').mkdir()
+            reserved_dir = Path(tmp) / 'reserved'
+            reserved_dir.mkdir()
+            (reserved_dir / 'exact-words.json').write_text('["birb"]', encoding='utf-8')
+            (reserved_dir / 'affix-words.json').write_text('["mzla-test"]', encoding='utf-8')
+            if args:
+                (reserved_dir / 'generated-words.json').write_text(
+                    '{"exact": ["about"], "affix": ["admin"]}', encoding='utf-8'
+                )
             with (
                 mock.patch(f'{_COMMAND_MODULE}._fetch_json', side_effect=fake_fetch_json) as fetch_json,
                 mock.patch(f'{_COMMAND_MODULE}._fetch_lines', return_value=['about', 'dev']),
                 mock.patch(f'{_COMMAND_MODULE}.apps.get_app_config', return_value=mock.Mock(path=tmp)),
             ):
-                call_command('update_reserved_words')
+                call_command('update_reserved_words', *args)
                 self._fetched_urls = [call.args[0] for call in fetch_json.call_args_list]
-                return json.loads((Path(tmp) / 'reserved' / 'generated-words.json').read_text(encoding='utf-8'))
+                with open(reserved_dir / 'compiled-words.pickle', 'rb') as fh:
+                    self._compiled = pickle.load(fh)
+                return json.loads((reserved_dir / 'generated-words.json').read_text(encoding='utf-8'))
 
     def test_writes_warning_and_two_sections(self):
         data = self._run_with_fakes()
@@ -70,3 +80,15 @@ class UpdateReservedWordsCommandTests(TestCase):
         self._run_with_fakes()
         for excluded in ('country-codes', 'languages', 'profanity'):
             self.assertFalse(any(excluded in url for url in self._fetched_urls), excluded)
+
+    def test_writes_compiled_words(self):
+        data = self._run_with_fakes()
+        self.assertEqual(self._compiled['exact'], tuple(sorted(set(data['exact']) | {'birb'})))
+        self.assertEqual(self._compiled['affix'], tuple(sorted(set(data['affix']) | {'mzla-test'})))
+        self.assertTrue(self._compiled['checksum'])
+
+    def test_compile_only_does_not_fetch(self):
+        self._run_with_fakes('--compile-only')
+        self.assertEqual(self._fetched_urls, [])
+        self.assertEqual(self._compiled['exact'], ('about', 'birb'))
+        self.assertEqual(self._compiled['affix'], ('admin', 'mzla-test'))
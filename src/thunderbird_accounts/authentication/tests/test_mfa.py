@@ -12,7 +12,7 @@ from requests import Response as RequestsResponse
 from requests.exceptions import RequestException
 from rest_framework.test import APIClient
 
-from thunderbird_accounts.authentication.clients import KeycloakMfaClient, RequestMethods
+from thunderbird_accounts.authentication.clients import KeycloakClient, KeycloakMfaClient, RequestMethods
 from thunderbird_accounts.authentication.exceptions import (
     MfaCredentialError,
     MfaSessionExpiredError,
@@ -645,6 +645,63 @@ class KeycloakClientMfaTestCase(TestCase):
         self.assertEqual(result['codes'], ['AAAA', 'BBBB'])
 
 
+class KeycloakClientCredentialSnapshotTestCase(TestCase):
+    """KeycloakClient fetches a user's credentials once and serves the typed getters from that snapshot."""
+
+    OIDC_ID = 'keycloak-user-id'
+    CREDENTIALS = [
+        {'id': 'totp-id', 'type': 'otp'},
+        {'id': 'recovery-id', 'type': 'recovery-authn-codes'},
+        {'id': 'password-id', 'type': 'password'},
+    ]
+
+    def setUp(self):
+        self.client = KeycloakClient()
+        patcher = patch.object(self.client, 'request')
+        self.mock_request = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_request.return_value.json.side_effect = lambda: [dict(c) for c in self.CREDENTIALS]
+
+    def test_typed_getters_share_one_fetch(self):
+        self.assertEqual(self.client.get_totp_credentials(self.OIDC_ID), [{'id': 'totp-id', 'type': 'otp'}])
+        self.assertEqual(
+            self.client.get_recovery_codes_credentials(self.OIDC_ID),
+            [{'id': 'recovery-id', 'type': 'recovery-authn-codes'}],
+        )
+
+        self.mock_request.assert_called_once_with(f'users/{self.OIDC_ID}/credentials', RequestMethods.GET)
+
+    def test_delete_credential_updates_snapshot(self):
+        self.client.get_totp_credentials(self.OIDC_ID)
+
+        self.client.delete_credential(self.OIDC_ID, 'totp-id')
+
+        self.assertEqual(self.client.get_totp_credentials(self.OIDC_ID), [])
+        self.assertEqual(len(self.client.get_recovery_codes_credentials(self.OIDC_ID)), 1)
+        # One fetch plus the delete
+        self.assertEqual(self.mock_request.call_count, 2)
+
+    def test_invalidate_credentials_refetches(self):
+        self.client.get_totp_credentials(self.OIDC_ID)
+
+        self.client.invalidate_credentials(self.OIDC_ID)
+        self.client.get_totp_credentials(self.OIDC_ID)
+
+        self.assertEqual(self.mock_request.call_count, 2)
+
+    def test_get_mfa_methods_fetches_credentials_once(self):
+        user = User.objects.create_user(username='snapshot@example.com', oidc_id=self.OIDC_ID)
+        api_client = APIClient()
+        api_client.force_authenticate(user)
+
+        with patch('thunderbird_accounts.authentication.mfa_management.KeycloakClient', return_value=self.client):
+            response = api_client.get(reverse('api_get_mfa_methods'))
+
+        # Without a recent re-auth, a configured authenticator requires stepping up, which reuses the snapshot too
+        self.assertEqual(response.status_code, 403)
+        self.mock_request.assert_called_once_with(f'users/{self.OIDC_ID}/credentials', RequestMethods.GET)
+
+
 class MfaReauthenticationRequestViewTestCase(TestCase):
     def test_step_up_redirect_requests_acr_only(self):
         params = MfaReauthenticationRequestView().get_extra_params(None)
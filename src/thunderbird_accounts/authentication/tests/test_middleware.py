@@ -1,9 +1,14 @@
+import socket
+import time
 from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
 import freezegun
+import jwt
 import requests
+from cryptography.hazmat.primitives.asymmetric import rsa
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 from django.forms import model_to_dict
 from django.http import HttpRequest
@@ -11,6 +16,7 @@ from django.test import override_settings
 from django.test import TestCase
 
 
+from thunderbird_accounts.authentication import middleware, token_cache
 from thunderbird_accounts.authentication.middleware import AccountsOIDCBackend, refresh_user_access_token
 from thunderbird_accounts.authentication.models import User
 from thunderbird_accounts.authentication.models import AllowListEntry
@@ -50,6 +56,127 @@ class RefreshUserAccessTokenTestCase(TestCase):
         self.assertIsNone(refresh_user_access_token(self._request(oidc_refresh_token='dead-refresh')))
 
 
+@override_settings(
+    OIDC_STORE_ACCESS_TOKEN=True,
+    OIDC_STORE_REFRESH_TOKEN=True,
+    OIDC_OP_TOKEN_ENDPOINT='https://keycloak.example/token',
+    OIDC_RP_CLIENT_ID='client',
+    OIDC_RP_CLIENT_SECRET='secret',
+    OIDC_REFRESH_SINGLE_FLIGHT_ENABLED=True,
+)
+@patch('thunderbird_accounts.authentication.middleware.requests.post')
+class SingleFlightRefreshTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.middleware = middleware.OIDCRefreshSession(MagicMock())
+
+    @staticmethod
+    def _mock_tokens(mock_post: MagicMock):
+        mock_post.return_value = MagicMock(
+            json=MagicMock(return_value={'access_token': 'new-access', 'refresh_token': 'new-refresh'})
+        )
+
+    @staticmethod
+    def _request(expires_in: int):
+        return SimpleNamespace(
+            session={'oidc_refresh_token': 'old-refresh', 'oidc_id_token_expiration': time.time() + expires_in}
+        )
+
+    def test_concurrent_refreshes_reuse_the_first_result(self, mock_post: MagicMock):
+        self._mock_tokens(mock_post)
+        first = SimpleNamespace(session={'oidc_refresh_token': 'old-refresh'})
+        second = SimpleNamespace(session={'oidc_refresh_token': 'old-refresh'})
+
+        self.assertEqual(refresh_user_access_token(first), 'new-access')
+        self.assertEqual(refresh_user_access_token(second), 'new-access')
+
+        # The old refresh token was only spent once, and both sessions hold the rotated one
+        mock_post.assert_called_once()
+        self.assertEqual(second.session['oidc_refresh_token'], 'new-refresh')
+
+    def test_waits_for_refresh_in_flight(self, mock_post: MagicMock):
+        cache.add(middleware._refresh_lock_key('old-refresh'), True)
+
+        def finish_other_refresh(seconds):
+            cache.set(middleware._refresh_result_key('old-refresh'), {'access_token': 'other-access'})
+
+        with patch('thunderbird_accounts.authentication.middleware.sleep', side_effect=finish_other_refresh):
+            token_info = middleware._request_refreshed_tokens_once('old-refresh')
+
+        self.assertEqual(token_info, {'access_token': 'other-access'})
+        mock_post.assert_not_called()
+
+    def test_refreshes_itself_when_refresh_in_flight_fails(self, mock_post: MagicMock):
+        self._mock_tokens(mock_post)
+        cache.add(middleware._refresh_lock_key('old-refresh'), True)
+
+        def fail_other_refresh(seconds):
+            cache.delete(middleware._refresh_lock_key('old-refresh'))
+
+        with patch('thunderbird_accounts.authentication.middleware.sleep', side_effect=fail_other_refresh):
+            token_info = middleware._request_refreshed_tokens_once('old-refresh')
+
+        self.assertEqual(token_info['access_token'], 'new-access')
+        mock_post.assert_called_once()
+
+    def test_uses_result_published_just_before_lock_release(self, mock_post: MagicMock):
+        cache.add(middleware._refresh_lock_key('old-refresh'), True)
+        result_key = middleware._refresh_result_key('old-refresh')
+        cache_get = cache.get
+        waits = []
+        result_reads = []
+
+        def get(key, *args, **kwargs):
+            value = cache_get(key, *args, **kwargs)
+            if key == result_key and waits and not result_reads:
+                # The other refresh finishes right after our first look at its result while waiting
+                result_reads.append(value)
+                cache.set(result_key, {'access_token': 'other-access'})
+                cache.delete(middleware._refresh_lock_key('old-refresh'))
+            return value
+
+        with (
+            patch('thunderbird_accounts.authentication.middleware.sleep', side_effect=waits.append),
+            patch.object(cache, 'get', side_effect=get),
+        ):
+            token_info = middleware._request_refreshed_tokens_once('old-refresh')
+
+        self.assertEqual(result_reads, [None])
+        self.assertEqual(token_info, {'access_token': 'other-access'})
+        mock_post.assert_not_called()
+
+    def test_refreshes_shortly_before_expiry(self, mock_post: MagicMock):
+        self._mock_tokens(mock_post)
+        request = self._request(expires_in=30)
+
+        with patch.object(middleware.OIDCRefreshSession, 'is_refreshable_url', return_value=True):
+            self.assertIsNone(self.middleware.process_request(request))
+
+        self.assertEqual(request.session['oidc_access_token'], 'new-access')
+        self.assertEqual(request.session['oidc_refresh_token'], 'new-refresh')
+
+    def test_does_not_refresh_long_before_expiry(self, mock_post: MagicMock):
+        request = self._request(expires_in=600)
+
+        with patch.object(middleware.OIDCRefreshSession, 'is_refreshable_url', return_value=True):
+            self.assertIsNone(self.middleware.process_request(request))
+
+        mock_post.assert_not_called()
+
+    def test_failed_early_refresh_keeps_the_session(self, mock_post: MagicMock):
+        mock_post.side_effect = requests.exceptions.Timeout()
+        request = self._request(expires_in=30)
+
+        with (
+            patch.object(middleware.OIDCRefreshSession, 'is_refreshable_url', return_value=True),
+            patch.object(middleware.OIDCRefreshSession, 'finish') as mock_finish,
+        ):
+            self.assertIsNone(self.middleware.process_request(request))
+
+        mock_finish.assert_not_called()
+        self.assertEqual(request.session['oidc_refresh_token'], 'old-refresh')
+
+
 @override_settings(USE_ALLOW_LIST=True)
 class AccountsOIDCBackendTestCase(TestCase):
     def setUp(self):
@@ -334,3 +461,189 @@ class AccountsOIDCBackendTestCase(TestCase):
                 user.refresh_from_db()
 
         settings.OIDC_FALLBACK_MATCH_BY_EMAIL = _original_setting
+
+
+class HostAddressesTestCase(TestCase):
+    def setUp(self):
+        patcher = patch.object(middleware, '_host_addresses', frozenset())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('thunderbird_accounts.authentication.middleware.getaddrinfo')
+    def test_resolve_host_addresses(self, mock_getaddrinfo):
+        mock_getaddrinfo.return_value = [
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.5', 0)),
+            (socket.AF_INET6, socket.SOCK_STREAM, 6, '', ('fd00::5', 0, 0, 0)),
+            (socket.AF_INET6, socket.SOCK_STREAM, 6, '', ('fe80::1%eth0', 0, 0, 2)),
+        ]
+
+        self.assertEqual(middleware.resolve_host_addresses(), frozenset({'10.0.0.5', '[fd00::5]'}))
+
+    @override_settings(ALLOWED_HOSTS=['accounts.example.org'])
+    def test_refresh_swaps_changed_addresses_into_allowed_hosts(self):
+        with patch.object(middleware, 'resolve_host_addresses', return_value=frozenset({'10.0.0.5'})):
+            middleware.refresh_host_addresses()
+        self.assertEqual(settings.ALLOWED_HOSTS, ['accounts.example.org', '10.0.0.5'])
+
+        with patch.object(middleware, 'resolve_host_addresses', return_value=frozenset({'10.0.0.6', '[fd00::6]'})):
+            middleware.refresh_host_addresses()
+        self.assertEqual(settings.ALLOWED_HOSTS, ['accounts.example.org', '10.0.0.6', '[fd00::6]'])
+
+        # A failed lookup keeps the last known addresses
+        with patch.object(middleware, 'resolve_host_addresses', return_value=frozenset()):
+            middleware.refresh_host_addresses()
+        self.assertEqual(settings.ALLOWED_HOSTS, ['accounts.example.org', '10.0.0.6', '[fd00::6]'])
+
+    @override_settings(ALLOWED_HOSTS=['accounts.example.org'])
+    def test_middleware_does_not_resolve_per_request(self):
+        with patch.object(middleware, 'resolve_host_addresses', return_value=frozenset({'10.0.0.5'})) as mock_resolve:
+            host_middleware = middleware.SetHostIPInAllowedHostsMiddleware(lambda request: 'response')
+            host_middleware(HttpRequest())
+            host_middleware(HttpRequest())
+
+        mock_resolve.assert_called_once()
+        self.assertIn('10.0.0.5', settings.ALLOWED_HOSTS)
+
+
+@override_settings(OIDC_TOKEN_CACHE_MAX_TTL_IN_SECONDS=300, OIDC_VERIFY_ACCESS_TOKEN_LOCALLY=False)
+@patch('mozilla_django_oidc.auth.OIDCAuthenticationBackend.get_userinfo')
+class AccessTokenCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(oidc_id='abc123', username='test@example.org', email='user@example.org')
+        self.claims = {
+            'sub': 'abc123',
+            'email': 'user@example.org',
+            'email_verified': True,
+            'preferred_username': 'test@example.org',
+        }
+        self.backend = AccountsOIDCBackend()
+
+    def _access_token(self, expires_in=600, key='secret', algorithm='HS256'):
+        return jwt.encode({'sub': 'abc123', 'exp': int(time.time()) + expires_in}, key, algorithm=algorithm)
+
+    def test_repeated_token_is_served_from_cache(self, mock_get_userinfo):
+        mock_get_userinfo.return_value = self.claims
+        access_token = self._access_token()
+
+        self.assertEqual(self.backend.get_user_from_access_token(access_token), self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.backend.get_user_from_access_token(access_token), self.user)
+
+        mock_get_userinfo.assert_called_once()
+        self.assertEqual(token_cache.get_cached_token(access_token)['user_id'], self.user.pk)
+
+    def test_cache_expires_with_the_token(self, mock_get_userinfo):
+        mock_get_userinfo.return_value = self.claims
+        access_token = self._access_token(expires_in=30)
+
+        self.backend.get_userinfo(access_token, None, None)
+
+        expires_at = token_cache.get_cached_token(access_token)['expires_at']
+        self.assertEqual(int(expires_at), jwt.decode(access_token, options={'verify_signature': False})['exp'])
+
+    def test_expired_token_is_not_cached(self, mock_get_userinfo):
+        mock_get_userinfo.return_value = self.claims
+        access_token = self._access_token(expires_in=-30)
+
+        self.backend.get_userinfo(access_token, None, None)
+
+        self.assertIsNone(token_cache.get_cached_token(access_token))
+
+    def test_inactive_cached_user_is_not_returned(self, mock_get_userinfo):
+        mock_get_userinfo.return_value = self.claims
+        access_token = self._access_token()
+        self.backend.get_or_create_user(access_token, None, None)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertIsNone(self.backend._get_cached_token_user(access_token))
+
+    def test_forgotten_token_is_looked_up_again(self, mock_get_userinfo):
+        mock_get_userinfo.return_value = self.claims
+        access_token = self._access_token()
+
+        self.backend.get_userinfo(access_token, None, None)
+        token_cache.forget_token(access_token)
+        self.backend.get_userinfo(access_token, None, None)
+
+        self.assertEqual(mock_get_userinfo.call_count, 2)
+
+    @override_settings(
+        OIDC_VERIFY_ACCESS_TOKEN_LOCALLY=True,
+        OIDC_RP_SIGN_ALGO='RS256',
+        OIDC_OP_ISSUER='https://keycloak.example.org/realms/tbpro',
+        OIDC_ACCESS_TOKEN_ALLOWED_CLIENTS=['tb-accounts'],
+    )
+    def test_local_verification_skips_keycloak(self, mock_get_userinfo):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        access_token = jwt.encode(
+            {
+                'sub': 'abc123',
+                'exp': int(time.time()) + 600,
+                'iss': 'https://keycloak.example.org/realms/tbpro',
+                'typ': 'Bearer',
+                'azp': 'tb-accounts',
+            },
+            private_key,
+            algorithm='RS256',
+        )
+        jwks_client = MagicMock()
+        jwks_client.get_signing_key_from_jwt.return_value = SimpleNamespace(key=private_key.public_key())
+
+        with patch.object(token_cache, '_get_jwks_client', return_value=jwks_client):
+            self.assertEqual(self.backend.get_userinfo(access_token, None, None)['sub'], 'abc123')
+
+            # A token signed by anyone else falls back to Keycloak
+            mock_get_userinfo.return_value = self.claims
+            self.backend.get_userinfo(self._access_token(), None, None)
+
+        mock_get_userinfo.assert_called_once()
+
+
+@override_settings(
+    OIDC_RP_SIGN_ALGO='RS256',
+    OIDC_OP_ISSUER='https://keycloak.example.org/realms/tbpro',
+    OIDC_ACCESS_TOKEN_ALLOWED_CLIENTS=['tb-accounts', 'appointment'],
+)
+class VerifyAccessTokenLocallyTestCase(TestCase):
+    def _verify(self, **claims):
+        """Verify an RS256 token carrying Keycloak's access token claims, overridden by ``claims`` (None drops one)."""
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        payload = {
+            'sub': 'abc123',
+            'exp': int(time.time()) + 600,
+            'iss': 'https://keycloak.example.org/realms/tbpro',
+            'typ': 'Bearer',
+            'azp': 'tb-accounts',
+            **claims,
+        }
+        payload = {claim: value for claim, value in payload.items() if value is not None}
+        jwks_client = MagicMock()
+        jwks_client.get_signing_key_from_jwt.return_value = SimpleNamespace(key=private_key.public_key())
+
+        with patch.object(token_cache, '_get_jwks_client', return_value=jwks_client):
+            return token_cache.verify_access_token_locally(jwt.encode(payload, private_key, algorithm='RS256'))
+
+    def test_accepts_access_token_of_allowed_client(self):
+        self.assertEqual(self._verify()['sub'], 'abc123')
+        self.assertEqual(self._verify(azp='appointment')['sub'], 'abc123')
+
+    def test_rejects_id_token(self):
+        self.assertIsNone(self._verify(typ='ID'))
+
+    def test_rejects_foreign_issuer(self):
+        self.assertIsNone(self._verify(iss='https://keycloak.example.org/realms/other'))
+
+    def test_rejects_other_client(self):
+        self.assertIsNone(self._verify(azp='some-other-client'))
+
+    @override_settings(OIDC_OP_ISSUER=None)
+    def test_rejects_everything_without_issuer_setting(self):
+        self.assertIsNone(self._verify())
+
+    def test_rejects_token_missing_claims(self):
+        for claim in ('iss', 'typ', 'azp'):
+            with self.subTest(claim=claim):
+                self.assertIsNone(self._verify(**{claim: None}))
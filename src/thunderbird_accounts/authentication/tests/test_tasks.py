@@ -1,26 +1,31 @@
 import uuid
 from django.contrib.auth.models import Group
 from datetime import datetime, timedelta
-from unittest.mock import patch
+from unittest.mock import ANY, patch
 from zoneinfo import ZoneInfo
 
 import freezegun
 from waffle.testutils import override_switch
 
 from django.conf import settings
+from django.core.cache import cache
 from django.test import TestCase, override_settings
 from django.utils import timezone
 
 from thunderbird_accounts.authentication.models import User, AllowListEntry
 from thunderbird_accounts.authentication.tasks import (
+    bulk_import_allow_list,
     tag_abandoned_cart_in_mailchimp,
     get_stale_incomplete_signup_users,
     purge_incomplete_signups,
+    purge_incomplete_signups_chunk,
     purge_stale_test_allow_list_entries,
     PURGE_INCOMPLETE_SIGNUPS_SWITCH,
 )
+from thunderbird_accounts.authentication.utils import stash_allow_list_import
 from thunderbird_accounts.celery.exceptions import TaskFailed
-from thunderbird_accounts.subscription.models import Subscription
+from thunderbird_accounts.subscription.mailchimp import hash_email, mirror_members
+from thunderbird_accounts.subscription.models import MailchimpMember, Subscription
 
 
 FROZEN_NOW = datetime(2024, 6, 15, 12, 0, 0, tzinfo=ZoneInfo('UTC'))
@@ -146,41 +151,150 @@ class GetStaleIncompleteSignupUsersTestCase(TestCase):
 class TagAbandonedCartInMailchimpTaskTestCase(TestCase):
     def setUp(self):
         self.subdomain = settings.PRIMARY_EMAIL_DOMAIN
-        eligible_created_at = timezone.now() - timedelta(hours=settings.ABANDONED_CART_TAG_HOURS + 1)
-        self.user = User.objects.create(
-            username=f'abandoned@{self.subdomain}',
-            email='abandoned@example.com',
-            recovery_email='abandoned@example.com',
-            oidc_id='abandoned-oidc-1',
+        self.user = self._create_abandoned_user('abandoned', 'abandoned-oidc-1')
+
+    def _create_abandoned_user(self, name, oidc_id):
+        user = User.objects.create(
+            username=f'{name}@{self.subdomain}',
+            email=f'{name}@example.com',
+            recovery_email=f'{name}@example.com',
+            oidc_id=oidc_id,
+        )
+        User.objects.filter(pk=user.pk).update(
+            created_at=timezone.now() - timedelta(hours=settings.ABANDONED_CART_TAG_HOURS + 1)
         )
-        User.objects.filter(pk=self.user.pk).update(created_at=eligible_created_at)
+        return user
+
+    @staticmethod
+    def _mock_client(mock_client_cls, subscribe_errors=None, tag_errors=None):
+        client = mock_client_cls.return_value
+        client.get_or_create_tag_id.return_value = 42
+        client.batch_subscribe.return_value = {'errors': subscribe_errors or []}
+        client.add_members_to_tag.return_value = {'errors': tag_errors or []}
+        return client
 
     def test_tags_eligible_users(self, mock_client_cls):
+        client = self._mock_client(mock_client_cls)
+
         result = tag_abandoned_cart_in_mailchimp.apply().get()
 
-        mock_client_cls.return_value.add_or_tag_member.assert_called_once_with(
-            'abandoned@example.com',
-            settings.ABANDONED_CART_MAILCHIMP_TAG,
-            language='en',
-            error_context={'user_uuid': str(self.user.uuid)},
+        client.get_or_create_tag_id.assert_called_once_with(settings.ABANDONED_CART_MAILCHIMP_TAG)
+        client.batch_subscribe.assert_called_once_with(
+            [
+                {
+                    'email_address': 'abandoned@example.com',
+                    'status': 'subscribed',
+                    'email_type': 'html',
+                    'language': 'en',
+                }
+            ],
+            error_context={'member_count': 1},
+        )
+        client.add_members_to_tag.assert_called_once_with(
+            42, ['abandoned@example.com'], error_context={'member_count': 1}
         )
         self.assertEqual(result['tagged'], 1)
         self.assertEqual(result['errors'], 0)
         self.assertEqual(result['skipped'], 0)
 
+    def test_tags_existing_members(self, mock_client_cls):
+        client = self._mock_client(
+            mock_client_cls,
+            subscribe_errors=[
+                {
+                    'email_address': 'abandoned@example.com',
+                    'error': 'abandoned@example.com is already a list member.',
+                    'error_code': 'ERROR_CONTACT_EXISTS',
+                }
+            ],
+        )
+
+        result = tag_abandoned_cart_in_mailchimp.apply().get()
+
+        client.add_members_to_tag.assert_called_once_with(
+            42, ['abandoned@example.com'], error_context={'member_count': 1}
+        )
+        self.assertEqual(result['tagged'], 1)
+        self.assertEqual(result['errors'], 0)
+
+    def test_skips_members_already_tagged_in_mirror(self, mock_client_cls):
+        client = self._mock_client(mock_client_cls)
+        mirror_members({hash_email('abandoned@example.com'): {'status': 'subscribed', 'tags': ['abandoned_cart']}})
+
+        result = tag_abandoned_cart_in_mailchimp.apply().get()
+
+        client.batch_subscribe.assert_not_called()
+        client.add_members_to_tag.assert_not_called()
+        client.get_or_create_tag_id.assert_not_called()
+        self.assertEqual(result['unchanged'], 1)
+        self.assertEqual(result['tagged'], 0)
+
+    def test_tags_mirrored_members_without_subscribing(self, mock_client_cls):
+        client = self._mock_client(mock_client_cls)
+        mirror_members({hash_email('abandoned@example.com'): {'status': 'unsubscribed', 'tags': ['welcome']}})
+
+        result = tag_abandoned_cart_in_mailchimp.apply().get()
+
+        client.batch_subscribe.assert_not_called()
+        client.add_members_to_tag.assert_called_once_with(
+            42, ['abandoned@example.com'], error_context={'member_count': 1}
+        )
+        self.assertEqual(result['tagged'], 1)
+        member = MailchimpMember.objects.get(email_hash=hash_email('abandoned@example.com'))
+        self.assertEqual(member.status, 'unsubscribed')
+        self.assertEqual(member.tags, ['abandoned_cart', 'welcome'])
+
+    def test_records_tagged_members_in_mirror(self, mock_client_cls):
+        self._mock_client(mock_client_cls)
+
+        tag_abandoned_cart_in_mailchimp.apply().get()
+
+        member = MailchimpMember.objects.get(email_hash=hash_email('abandoned@example.com'))
+        self.assertEqual(member.status, 'subscribed')
+        self.assertEqual(member.tags, ['abandoned_cart'])
+        self.assertEqual(member.last_synced_at, FROZEN_NOW)
+
+        # The next run has nothing to send
+        result = tag_abandoned_cart_in_mailchimp.apply().get()
+        self.assertEqual(result['unchanged'], 1)
+        self.assertEqual(mock_client_cls.return_value.batch_subscribe.call_count, 1)
+
+    def test_does_not_mirror_failed_tagging(self, mock_client_cls):
+        self._mock_client(
+            mock_client_cls,
+            tag_errors=[{'email_addresses': ['abandoned@example.com'], 'error': 'Something went wrong'}],
+        )
+
+        tag_abandoned_cart_in_mailchimp.apply().get()
+
+        self.assertFalse(MailchimpMember.objects.exists())
+
+    @override_settings(ABANDONED_CART_MAILCHIMP_BATCH_SIZE=2)
+    def test_sends_users_in_batches(self, mock_client_cls):
+        client = self._mock_client(mock_client_cls)
+        for index in range(4):
+            self._create_abandoned_user(f'abandoned-{index}', f'abandoned-oidc-batch-{index}')
+
+        result = tag_abandoned_cart_in_mailchimp.apply().get()
+
+        client.get_or_create_tag_id.assert_called_once()
+        self.assertEqual(client.batch_subscribe.call_count, 3)
+        self.assertEqual(client.add_members_to_tag.call_count, 3)
+        self.assertEqual(result['tagged'], 5)
+
     def test_skips_user_without_recovery_email(self, mock_client_cls):
+        client = self._mock_client(mock_client_cls)
         User.objects.filter(pk=self.user.pk).update(recovery_email=None)
-        self.user.refresh_from_db()
-        with patch('thunderbird_accounts.authentication.tasks.get_stale_incomplete_signup_users') as mock_get_users:
-            mock_get_users.return_value.iterator.return_value = [self.user]
 
-            result = tag_abandoned_cart_in_mailchimp.apply().get()
+        result = tag_abandoned_cart_in_mailchimp.apply().get()
 
-        mock_client_cls.return_value.add_or_tag_member.assert_not_called()
+        client.batch_subscribe.assert_not_called()
+        client.get_or_create_tag_id.assert_not_called()
         self.assertEqual(result['tagged'], 0)
         self.assertEqual(result['skipped'], 1)
 
     def test_skips_user_with_rejected_recovery_email(self, mock_client_cls):
+        client = self._mock_client(mock_client_cls)
         User.objects.filter(pk=self.user.pk).update(
             recovery_email_rejected_at=timezone.now(),
             recovery_email_rejection_reason='looks fake or invalid',
@@ -188,54 +302,69 @@ class TagAbandonedCartInMailchimpTaskTestCase(TestCase):
 
         result = tag_abandoned_cart_in_mailchimp.apply().get()
 
-        mock_client_cls.return_value.add_or_tag_member.assert_not_called()
+        client.batch_subscribe.assert_not_called()
         self.assertEqual(result['skipped'], 1)
 
     def test_counts_mailchimp_errors_and_continues(self, mock_client_cls):
-        second_user = User.objects.create(
-            username=f'abandoned-too@{self.subdomain}',
-            email='abandoned-too@example.com',
-            recovery_email='abandoned-too@example.com',
-            oidc_id='abandoned-oidc-2',
-        )
-        User.objects.filter(pk=second_user.pk).update(
-            created_at=timezone.now() - timedelta(hours=settings.ABANDONED_CART_TAG_HOURS + 1)
+        self._create_abandoned_user('abandoned-too', 'abandoned-oidc-2')
+        self._mock_client(
+            mock_client_cls,
+            tag_errors=[{'email_addresses': ['abandoned@example.com'], 'error': 'Something went wrong'}],
         )
-        mock_client_cls.return_value.add_or_tag_member.side_effect = [
-            TaskFailed('mailchimp error', {'user_uuid': str(self.user.uuid)}),
-            None,
-        ]
 
         result = tag_abandoned_cart_in_mailchimp.apply().get()
 
-        self.assertEqual(mock_client_cls.return_value.add_or_tag_member.call_count, 2)
         self.assertEqual(result['tagged'], 1)
         self.assertEqual(result['errors'], 1)
 
+    def test_counts_failed_batch_as_errors(self, mock_client_cls):
+        client = self._mock_client(mock_client_cls)
+        client.batch_subscribe.side_effect = TaskFailed('mailchimp error', {'error_status_code': 500})
+
+        result = tag_abandoned_cart_in_mailchimp.apply().get()
+
+        client.add_members_to_tag.assert_not_called()
+        self.assertEqual(result['tagged'], 0)
+        self.assertEqual(result['errors'], 1)
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.recovery_email_rejected_at)
+
     def test_marks_permanent_recovery_email_rejection(self, mock_client_cls):
-        mock_client_cls.return_value.add_or_tag_member.side_effect = TaskFailed(
-            'mailchimp error',
-            {
-                'user_uuid': str(self.user.uuid),
-                'error_status_code': 400,
-            },
+        second_user = self._create_abandoned_user('abandoned-too', 'abandoned-oidc-2')
+        client = self._mock_client(
+            mock_client_cls,
+            subscribe_errors=[
+                {
+                    'email_address': 'abandoned@example.com',
+                    'error': 'abandoned@example.com looks fake or invalid, please enter a real email address.',
+                    'error_code': 'ERROR_GENERIC',
+                }
+            ],
         )
 
-        tag_abandoned_cart_in_mailchimp.apply().get()
+        result = tag_abandoned_cart_in_mailchimp.apply().get()
 
+        client.add_members_to_tag.assert_called_once_with(
+            42, ['abandoned-too@example.com'], error_context={'member_count': 1}
+        )
         self.user.refresh_from_db()
         self.assertEqual(self.user.recovery_email_rejected_at, FROZEN_NOW)
-        self.assertEqual(self.user.recovery_email_rejection_reason, 'mailchimp error')
+        self.assertEqual(
+            self.user.recovery_email_rejection_reason,
+            'abandoned@example.com looks fake or invalid, please enter a real email address.',
+        )
+        second_user.refresh_from_db()
+        self.assertIsNone(second_user.recovery_email_rejected_at)
+        self.assertEqual(result['tagged'], 1)
+        self.assertEqual(result['rejected'], 1)
+        self.assertEqual(result['errors'], 1)
 
     def test_does_not_mark_transient_mailchimp_error(self, mock_client_cls):
-        mock_client_cls.return_value.add_or_tag_member.side_effect = TaskFailed(
-            'mailchimp error',
-            {
-                'user_uuid': str(self.user.uuid),
-                'error_status_code': 500,
-                'error_msg_title': 'InternalServerError',
-                'error_msg_detail': 'A deep, internal error has occurred.',
-            },
+        self._mock_client(
+            mock_client_cls,
+            tag_errors=[
+                {'email_addresses': ['abandoned@example.com'], 'error': 'A deep, internal error has occurred.'}
+            ],
         )
 
         tag_abandoned_cart_in_mailchimp.apply().get()
@@ -262,14 +391,25 @@ class TagAbandonedCartInMailchimpTaskTestCase(TestCase):
         self.assertIsNone(self.user.recovery_email_rejected_at)
         self.assertIsNone(self.user.recovery_email_rejection_reason)
 
+    def test_does_not_tag_user_with_subscription(self, mock_client_cls):
+        client = self._mock_client(mock_client_cls)
+        Subscription.objects.create(user=self.user, status=Subscription.StatusValues.ACTIVE)
+
+        with self.assertNumQueries(1):
+            result = tag_abandoned_cart_in_mailchimp.apply().get()
+
+        client.batch_subscribe.assert_not_called()
+        self.assertEqual(result['tagged'], 0)
+
     def test_skips_user_if_subscription_appears_after_initial_selection(self, mock_client_cls):
+        client = self._mock_client(mock_client_cls)
         Subscription.objects.create(user=self.user, status=Subscription.StatusValues.ACTIVE)
         with patch('thunderbird_accounts.authentication.tasks.get_stale_incomplete_signup_users') as mock_get_users:
-            mock_get_users.return_value.iterator.return_value = [self.user]
-
+            mock_get_users.return_value.only.return_value.iterator.return_value = [self.user]
             result = tag_abandoned_cart_in_mailchimp.apply().get()
 
-        mock_client_cls.return_value.add_or_tag_member.assert_not_called()
+        client.batch_subscribe.assert_not_called()
+        client.add_members_to_tag.assert_not_called()
         self.assertEqual(result['tagged'], 0)
         self.assertEqual(result['skipped'], 1)
 
@@ -277,7 +417,7 @@ class TagAbandonedCartInMailchimpTaskTestCase(TestCase):
     def test_no_ops_when_mailchimp_disabled(self, mock_client_cls):
         result = tag_abandoned_cart_in_mailchimp.apply().get()
 
-        mock_client_cls.return_value.add_or_tag_member.assert_not_called()
+        mock_client_cls.return_value.batch_subscribe.assert_not_called()
         self.assertEqual(result['task_status'], 'skipped')
         self.assertEqual(result['tagged'], 0)
 
@@ -373,7 +513,7 @@ class TagAbandonedCartInMailchimpTaskTestCase(TestCase):
 #         self.assertEqual(result['skipped'], 1)
 
 
-@patch('thunderbird_accounts.authentication.tasks.delete_user_data')
+@patch('thunderbird_accounts.authentication.tasks.delete_user_external_data')
 class PurgeIncompleteSignupsTaskTestCase(TestCase):
     def setUp(self):
         self.subdomain = settings.PRIMARY_EMAIL_DOMAIN
@@ -419,8 +559,8 @@ class PurgeIncompleteSignupsTaskTestCase(TestCase):
 
     def test_skips_user_if_subscription_appears_after_initial_selection(self, mock_delete_user_data):
         Subscription.objects.create(user=self.user, status=Subscription.StatusValues.ACTIVE)
-        with patch('thunderbird_accounts.authentication.tasks.get_stale_incomplete_signup_users') as mock_get_users:
-            mock_get_users.return_value.iterator.return_value = [self.user]
+        with patch('thunderbird_accounts.authentication.tasks._stale_incomplete_signup_id_chunks') as mock_chunks:
+            mock_chunks.return_value = iter([[self.user.pk]])
 
             result = purge_incomplete_signups.apply().get()
 
@@ -447,8 +587,8 @@ class PurgeIncompleteSignupsTaskTestCase(TestCase):
             created_at=timezone.now() - timedelta(hours=settings.INCOMPLETE_SIGNUP_PURGE_HOURS + 1)
         )
         mock_delete_user_data.side_effect = [RuntimeError('boom'), []]
-        with patch('thunderbird_accounts.authentication.tasks.get_stale_incomplete_signup_users') as mock_get_users:
-            mock_get_users.return_value.iterator.return_value = [self.user, second_user]
+        with patch('thunderbird_accounts.authentication.tasks._stale_incomplete_signup_id_chunks') as mock_chunks:
+            mock_chunks.return_value = iter([[self.user.pk, second_user.pk]])
 
             result = purge_incomplete_signups.apply().get()
 
@@ -497,8 +637,8 @@ class PurgeIncompleteSignupsTaskTestCase(TestCase):
 
         self.assertEqual(self.user.groups.count(), 0)
 
-        with patch('thunderbird_accounts.authentication.tasks.get_stale_incomplete_signup_users') as mock_get_users:
-            mock_get_users.return_value.iterator.return_value = [self.user]
+        with patch('thunderbird_accounts.authentication.tasks._stale_incomplete_signup_id_chunks') as mock_chunks:
+            mock_chunks.return_value = iter([[self.user.pk]])
 
             result = purge_incomplete_signups.apply().get()
 
@@ -552,11 +692,10 @@ class PurgeIncompleteSignupsTaskTestCase(TestCase):
 
         result = purge_incomplete_signups.apply().get()
 
-        mock_delete_user_data.assert_called_once_with(self.user)
+        mock_delete_user_data.assert_called_once_with(self.user.oidc_id, None, ANY)
 
         # The user was actually purged, not parked in the group
-        self.user.refresh_from_db()
-        self.assertEqual(self.user.groups.count(), 0)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
 
         self.assertEqual(result['deleted'], 1)
         self.assertEqual(result['errors'], 0)
@@ -567,10 +706,81 @@ class PurgeIncompleteSignupsTaskTestCase(TestCase):
 
         result = purge_incomplete_signups.apply().get()
 
-        mock_delete_user_data.assert_called_once_with(self.user)
+        mock_delete_user_data.assert_called_once_with(self.user.oidc_id, None, ANY)
+        # Partially deleted users are still removed locally
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
         self.assertEqual(result['deleted'], 0)
         self.assertEqual(result['errors'], 1)
 
+    @override_switch(PURGE_INCOMPLETE_SIGNUPS_SWITCH, active=True)
+    def test_keeps_local_user_after_unexpected_delete_exception(self, mock_delete_user_data):
+        second_user = User.objects.create(
+            username=f'purge-me-too@{self.subdomain}',
+            email='purge-me-too@example.com',
+            oidc_id='purge-oidc-2',
+        )
+        mock_delete_user_data.side_effect = lambda oidc_id, *args: self._raise_for(oidc_id, 'purge-oidc-1')
+
+        with patch('thunderbird_accounts.authentication.tasks._stale_incomplete_signup_id_chunks') as mock_chunks:
+            User.objects.filter(pk=second_user.pk).update(created_at=User.objects.get(pk=self.user.pk).created_at)
+            mock_chunks.return_value = iter([[self.user.pk, second_user.pk]])
+
+            result = purge_incomplete_signups.apply().get()
+
+        self.assertEqual(mock_delete_user_data.call_count, 2)
+        self.assertTrue(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(User.objects.filter(pk=second_user.pk).exists())
+        self.assertEqual(result['deleted'], 1)
+        self.assertEqual(result['errors'], 1)
+
+    @staticmethod
+    def _raise_for(oidc_id, failing_oidc_id):
+        if oidc_id == failing_oidc_id:
+            raise RuntimeError('boom')
+        return []
+
+    @override_settings(PURGE_INCOMPLETE_SIGNUPS_CHUNK_SIZE=1)
+    def test_fans_out_chunks_to_workers(self, mock_delete_user_data):
+        second_user = User.objects.create(
+            username=f'purge-me-too@{self.subdomain}',
+            email='purge-me-too@example.com',
+            oidc_id='purge-oidc-2',
+        )
+        User.objects.filter(pk=second_user.pk).update(created_at=User.objects.get(pk=self.user.pk).created_at)
+
+        with patch('thunderbird_accounts.authentication.tasks.purge_incomplete_signups_chunk.delay') as mock_delay:
+            result = purge_incomplete_signups.apply().get()
+
+        self.assertEqual(result, {'task_status': 'dispatched', 'chunks': 2, 'candidates': 2})
+        dispatched_ids = {call.args[0][0] for call in mock_delay.call_args_list}
+        self.assertEqual(dispatched_ids, {str(self.user.pk), str(second_user.pk)})
+        self.assertTrue(all(call.args[1] is False for call in mock_delay.call_args_list))
+
+        # Each chunk is processed independently on a worker
+        for call in mock_delay.call_args_list:
+            purge_incomplete_signups_chunk.apply(args=call.args).get()
+        self.assertEqual(Group.objects.get(name='Users to Purge').user_set.count(), 2)
+        mock_delete_user_data.assert_not_called()
+
+    @override_settings(PURGE_INCOMPLETE_SIGNUPS_CHUNK_SIZE=1)
+    def test_resumes_from_checkpoint(self, mock_delete_user_data):
+        second_user = User.objects.create(
+            username=f'purge-me-too@{self.subdomain}',
+            email='purge-me-too@example.com',
+            oidc_id='purge-oidc-2',
+        )
+        User.objects.filter(pk=second_user.pk).update(created_at=User.objects.get(pk=self.user.pk).created_at)
+        first_id, second_id = sorted([self.user.pk, second_user.pk])
+        cache.set(settings.PURGE_INCOMPLETE_SIGNUPS_CHECKPOINT_CACHE_KEY, str(first_id))
+
+        result = purge_incomplete_signups.apply().get()
+
+        # Only the user after the checkpoint was processed, and the checkpoint is cleared once the run finishes
+        self.assertEqual(result['deleted'], 1)
+        purge_group = Group.objects.get(name='Users to Purge')
+        self.assertEqual(list(purge_group.user_set.values_list('pk', flat=True)), [second_id])
+        self.assertIsNone(cache.get(settings.PURGE_INCOMPLETE_SIGNUPS_CHECKPOINT_CACHE_KEY))
+
     @override_switch(PURGE_INCOMPLETE_SIGNUPS_SWITCH, active=False)
     def test_does_not_delete_stale_users_when_switch_is_explicitly_inactive(self, mock_delete_user_data):
         mock_delete_user_data.return_value = []
@@ -677,3 +887,30 @@ class PurgeStaleAllowListEntryTestCase(TestCase):
         self.assertEqual(result['errors'], 0)
 
         self.assertIsNotNone(allow_list_entry)
+
+
+class BulkImportAllowListTaskTestCase(TestCase):
+    @override_settings(ALLOW_LIST_IMPORT_CHUNK_SIZE=2, ALLOW_LIST_IMPORT_MAX_MESSAGES=1)
+    def test_imports_entries_and_caps_messages(self):
+        AllowListEntry.objects.create(email='existing@example.com')
+        entries = 'existing@example.com\nnew@example.com\nnew2@example.com\nnew3@example.com\nbad\nworse'
+
+        import_id, chunk_count, row_count = stash_allow_list_import(entries.splitlines())
+
+        result = bulk_import_allow_list.apply(args=(import_id, chunk_count, row_count)).get()
+
+        self.assertEqual(result['task_status'], 'completed')
+        self.assertEqual(result['added'], 3)
+        self.assertEqual(result['dupe_count'], 1)
+        self.assertEqual(result['error_count'], 2)
+        self.assertEqual(result['errors'], ['bad is not a valid email address.'])
+        self.assertEqual(AllowListEntry.objects.count(), 4)
+        # The import is dropped from the cache once imported
+        self.assertIsNone(cache.get(f'{settings.ALLOW_LIST_IMPORT_CACHE_KEY}:{import_id}:0'))
+
+    def test_fails_when_the_import_has_expired(self):
+        import_id, chunk_count, row_count = stash_allow_list_import(['new@example.com', 'new2@example.com'])
+        cache.delete(f'{settings.ALLOW_LIST_IMPORT_CACHE_KEY}:{import_id}:0')
+
+        with self.assertRaises(TaskFailed):
+            bulk_import_allow_list.apply(args=(import_id, chunk_count, row_count)).get()
@@ -1,8 +1,12 @@
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase, override_settings
 
 from thunderbird_accounts.authentication.models import AllowListEntry, User
-from thunderbird_accounts.authentication.reserved import is_reserved
-from thunderbird_accounts.authentication.utils import is_email_in_allow_list
+from thunderbird_accounts.authentication.reserved import checker, is_reserved
+from thunderbird_accounts.authentication import utils
+from thunderbird_accounts.authentication.utils import import_allow_list_entries, is_email_in_allow_list
 
 
 class IsReservedUnitTests(TestCase):
@@ -194,6 +198,23 @@ class IsReservedUnitTests(TestCase):
         ]:
             self.assertTrue(is_reserved(name), name)
 
+    def test_affix_trie_matches_every_term(self):
+        # Every affix term is found by the precompiled tries as an exact match, prefix, and suffix.
+        for term in checker.AFFIX_RESERVED_LOCAL_PARTS:
+            for candidate in [term, f'{term}x', f'x{term}']:
+                self.assertTrue(checker._affix_match(candidate), candidate)
+
+    def test_is_reserved_cache_is_bounded(self):
+        self.assertEqual(is_reserved.cache_info().maxsize, checker._IS_RESERVED_CACHE_SIZE)
+
+    def test_compiled_words_match_json_words(self):
+        self.assertEqual(checker._load_compiled_words(checker._source_checksum()), checker._load_json_words())
+
+    def test_stale_compiled_words_fall_back_to_json(self):
+        self.assertIsNone(checker._load_compiled_words('stale-checksum'))
+        with mock.patch.object(checker, '_source_checksum', return_value='stale-checksum'):
+            self.assertEqual(checker._load_words(), checker._load_json_words())
+
 
 @override_settings(USE_ALLOW_LIST=True)
 class IsEmailInAllowListUnitTests(TestCase):
@@ -238,3 +259,68 @@ class IsEmailInAllowListUnitTests(TestCase):
     @override_settings(USE_ALLOW_LIST=False)
     def test_returns_true_when_allow_list_is_disabled(self):
         self.assertTrue(is_email_in_allow_list('not-listed@example.com'))
+
+
+@override_settings(USE_ALLOW_LIST=True, IS_IN_ALLOW_LIST_CACHE_ENABLED=True)
+class IsEmailInAllowListCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        utils._allow_list_l1_cache.clear()
+        utils.allow_list_cache_stats.clear()
+
+    def test_repeated_checks_are_served_from_cache(self):
+        AllowListEntry.objects.create(email='allow-listed@example.com')
+
+        with self.assertNumQueries(2):
+            self.assertTrue(is_email_in_allow_list('allow-listed@example.com'))
+        with self.assertNumQueries(0):
+            self.assertTrue(is_email_in_allow_list('allow-listed@example.com'))
+
+        utils._allow_list_l1_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertTrue(is_email_in_allow_list('allow-listed@example.com'))
+
+        self.assertEqual(utils.allow_list_cache_stats, {'miss': 1, 'l1_hit': 1, 'l2_hit': 1})
+
+    def test_negative_results_are_cached(self):
+        self.assertFalse(is_email_in_allow_list('missing@example.com'))
+        with self.assertNumQueries(0):
+            self.assertFalse(is_email_in_allow_list('missing@example.com'))
+
+    def test_allow_list_entry_changes_invalidate_cache(self):
+        self.assertFalse(is_email_in_allow_list('allow-listed@example.com'))
+
+        entry = AllowListEntry.objects.create(email='allow-listed@example.com')
+        self.assertTrue(is_email_in_allow_list('allow-listed@example.com'))
+
+        entry.delete()
+        self.assertFalse(is_email_in_allow_list('allow-listed@example.com'))
+
+    def test_bulk_import_invalidates_cache(self):
+        self.assertFalse(is_email_in_allow_list('imported@example.com'))
+
+        import_allow_list_entries(['imported@example.com'])
+
+        self.assertTrue(is_email_in_allow_list('imported@example.com'))
+
+    def test_user_email_changes_invalidate_cache(self):
+        user = User.objects.create(
+            username='user@example.com',
+            email='user@example.com',
+            recovery_email='old-recovery@example.com',
+            is_active=True,
+        )
+        self.assertTrue(is_email_in_allow_list('old-recovery@example.com'))
+        self.assertFalse(is_email_in_allow_list('new-recovery@example.com'))
+
+        user = User.objects.get(pk=user.pk)
+        user.recovery_email = 'new-recovery@example.com'
+        user.save()
+
+        self.assertFalse(is_email_in_allow_list('old-recovery@example.com'))
+        self.assertTrue(is_email_in_allow_list('new-recovery@example.com'))
+
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+
+        self.assertFalse(is_email_in_allow_list('new-recovery@example.com'))
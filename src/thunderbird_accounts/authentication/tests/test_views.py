@@ -1,10 +1,18 @@
+from unittest.mock import patch
+
+from django.conf import settings
 from django.contrib.auth.models import Permission
 from django.contrib.messages import get_messages
-from django.test import Client as RequestClient, TestCase
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client as RequestClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.crypto import get_random_string
 
 from thunderbird_accounts.authentication.models import AllowListEntry, User
+from thunderbird_accounts.authentication.utils import read_stashed_allow_list_import
 from thunderbird_accounts.core.tests.utils import oidc_force_login
 
 
@@ -99,3 +107,113 @@ class BulkImportAllowListTestCase(TestCase):
                 message.startswith('dsc_123 is not a valid discount id. Use the full Paddle id') for message in messages
             )
         )
+
+    def test_bulk_import_skips_existing_and_repeated_emails(self):
+        AllowListEntry.objects.create(email='existing@example.com')
+
+        response = self.client.post(
+            reverse('allow_list_entry_import_submit'),
+            {
+                'bulk-entry': 'existing@example.com\nnew@example.com\nnew@example.com\nnot-an-email',
+            },
+            follow=False,
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            set(AllowListEntry.objects.values_list('email', flat=True)), {'existing@example.com', 'new@example.com'}
+        )
+        messages = [str(message) for message in get_messages(response.wsgi_request)]
+        self.assertIn('existing@example.com already exists in the allow list.', messages)
+        self.assertIn('new@example.com already exists in the allow list.', messages)
+        self.assertIn('not-an-email is not a valid email address.', messages)
+        self.assertIn('Imported 1 email to the allow list.', messages)
+
+    @override_settings(ALLOW_LIST_IMPORT_CHUNK_SIZE=2)
+    def test_bulk_import_uses_one_lookup_and_insert_per_chunk(self):
+        entries = '\n'.join(f'user{i}@example.com' for i in range(4))
+
+        # 2 chunks x (1 lookup + 1 insert + 1 inserted check) on top of the session/auth and message queries.
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('allow_list_entry_import_submit'), {'bulk-entry': entries})
+
+        self.assertEqual(AllowListEntry.objects.count(), 4)
+        allow_list_queries = [q['sql'] for q in queries.captured_queries if 'authentication_allowlistentry' in q['sql']]
+        self.assertEqual(len(allow_list_queries), 6)
+
+    def test_bulk_import_reports_entries_created_concurrently_as_dupes(self):
+        bulk_create = AllowListEntry.objects.bulk_create
+
+        def create_concurrently(entries, **kwargs):
+            # Someone else adds one of the emails between the lookup and the insert
+            AllowListEntry.objects.create(email='raced@example.com')
+            return bulk_create(entries, **kwargs)
+
+        with patch.object(AllowListEntry.objects, 'bulk_create', side_effect=create_concurrently):
+            response = self.client.post(
+                reverse('allow_list_entry_import_submit'), {'bulk-entry': 'raced@example.com\nnew@example.com'}
+            )
+
+        messages = [str(message) for message in get_messages(response.wsgi_request)]
+        self.assertIn('raced@example.com already exists in the allow list.', messages)
+        self.assertIn('Imported 1 email to the allow list.', messages)
+
+    def test_bulk_import_accepts_uploaded_csv(self):
+        upload = SimpleUploadedFile('entries.csv', b'\xef\xbb\xbfhello@example.com\r\nhello2@example.com\r\n')
+
+        response = self.client.post(reverse('allow_list_entry_import_submit'), {'bulk-file': upload})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            set(AllowListEntry.objects.values_list('email', flat=True)), {'hello@example.com', 'hello2@example.com'}
+        )
+
+    @override_settings(ALLOW_LIST_IMPORT_ASYNC_THRESHOLD=2)
+    def test_bulk_import_queues_large_imports(self):
+        entries = 'hello@example.com\nhello2@example.com\nhello3@example.com'
+
+        with patch('thunderbird_accounts.authentication.tasks.bulk_import_allow_list.delay') as delay_mock:
+            delay_mock.return_value.id = 'task-123'
+            response = self.client.post(reverse('allow_list_entry_import_submit'), {'bulk-entry': entries})
+
+        import_id, chunk_count, row_count = delay_mock.call_args.args
+        self.assertEqual((chunk_count, row_count), (1, 3))
+        self.assertEqual(list(read_stashed_allow_list_import(import_id, chunk_count)), entries.splitlines())
+        self.assertEqual(AllowListEntry.objects.count(), 0)
+        self.assertRedirects(
+            response,
+            reverse('allow_list_entry_import_status', kwargs={'task_id': 'task-123'}),
+            fetch_redirect_response=False,
+        )
+
+    @override_settings(ALLOW_LIST_IMPORT_ASYNC_THRESHOLD=2, ALLOW_LIST_IMPORT_CHUNK_SIZE=8)
+    def test_bulk_import_queues_large_uploads_in_chunks(self):
+        lines = [f'hello{i}@example.com\r\n' for i in range(20)]
+        upload = SimpleUploadedFile('entries.csv', ''.join(lines).encode())
+
+        with patch('thunderbird_accounts.authentication.tasks.bulk_import_allow_list.delay') as delay_mock:
+            delay_mock.return_value.id = 'task-123'
+            self.client.post(reverse('allow_list_entry_import_submit'), {'bulk-file': upload})
+
+        import_id, chunk_count, row_count = delay_mock.call_args.args
+        self.assertEqual((chunk_count, row_count), (3, 20))
+        self.assertEqual(list(read_stashed_allow_list_import(import_id, chunk_count)), lines)
+        # Chunks are dropped from the cache once read
+        self.assertIsNone(cache.get(f'{settings.ALLOW_LIST_IMPORT_CACHE_KEY}:{import_id}:0'))
+
+    def test_bulk_import_status_page_shows_result(self):
+        with patch('thunderbird_accounts.authentication.views.AsyncResult') as async_result_mock:
+            async_result_mock.return_value.state = 'SUCCESS'
+            async_result_mock.return_value.ready.return_value = True
+            async_result_mock.return_value.info = {
+                'added': 3,
+                'dupe_count': 1,
+                'error_count': 0,
+                'dupes': ['hello@example.com already exists in the allow list.'],
+                'errors': [],
+            }
+            response = self.client.get(reverse('allow_list_entry_import_status', kwargs={'task_id': 'task-123'}))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'hello@example.com already exists in the allow list.')
+        self.assertNotContains(response, 'http-equiv="refresh"')
@@ -0,0 +1,125 @@
+"""Access token verification cache for bearer token authenticated endpoints.
+
+Clients such as the desktop app and Appointment call our OIDC bearer token endpoints repeatedly with the same access
+token, and each call used to cost a Keycloak userinfo request. The userinfo claims, and the user they resolved to, are
+cached under a hash of the access token until the token's ``exp`` or OIDC_TOKEN_CACHE_MAX_TTL_IN_SECONDS, whichever
+comes first.
+
+Revocation: a token revoked in Keycloak is still accepted until its cache entry expires, so the max TTL is the
+revocation window (0 disables the cache). Logging out forgets the session's token straight away.
+
+With OIDC_VERIFY_ACCESS_TOKEN_LOCALLY the access token's signature is checked against the realm's JWKS (cached for
+OIDC_JWKS_CACHE_TTL_IN_SECONDS), along with its issuer, type and client, and its claims are used directly, skipping
+Keycloak entirely. Keycloak can't tell us about a revoked token in that mode at all, so it's only suitable for
+short-lived access tokens.
+"""
+
+import hashlib
+import logging
+import time
+from typing import Optional
+
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+
+_jwks_client: Optional[jwt.PyJWKClient] = None
+
+
+def _cache_key(access_token: str) -> str:
+    token_hash = hashlib.sha256(access_token.encode()).hexdigest()
+    return f'{settings.OIDC_TOKEN_CACHE_KEY}:{token_hash}'
+
+
+def _token_expiry(access_token: str) -> Optional[float]:
+    """Return the access token's ``exp``, or None if it isn't a JWT carrying one."""
+    try:
+        return float(jwt.decode(access_token, options={'verify_signature': False})['exp'])
+    except (jwt.PyJWTError, KeyError, ValueError, TypeError):
+        return None
+
+
+def get_cached_token(access_token: str) -> Optional[dict]:
+    """Return the cached ``{'claims', 'user_id', 'expires_at'}`` entry for an access token, if any."""
+    if not settings.OIDC_TOKEN_CACHE_MAX_TTL_IN_SECONDS:
+        return None
+
+    return cache.get(_cache_key(access_token))
+
+
+def cache_token(access_token: str, claims: dict, user_id=None):
+    """Cache the claims (and optionally the user) an access token resolved to, until the token expires or the
+    max TTL is up."""
+    if not settings.OIDC_TOKEN_CACHE_MAX_TTL_IN_SECONDS:
+        return
+
+    cached = cache.get(_cache_key(access_token))
+    if cached:
+        expires_at = cached['expires_at']
+    else:
+        expires_at = time.time() + settings.OIDC_TOKEN_CACHE_MAX_TTL_IN_SECONDS
+        token_expiry = claims.get('exp') or _token_expiry(access_token)
+        if token_expiry:
+            expires_at = min(expires_at, float(token_expiry))
+
+    timeout = expires_at - time.time()
+    if timeout <= 0:
+        return
+
+    cache.set(
+        _cache_key(access_token),
+        {'claims': claims, 'user_id': user_id, 'expires_at': expires_at},
+        timeout,
+    )
+
+
+def forget_token(access_token: Optional[str]):
+    """Drop an access token's cache entry, e.g. once the user has logged out."""
+    if access_token:
+        cache.delete(_cache_key(access_token))
+
+
+def _get_jwks_client() -> jwt.PyJWKClient:
+    global _jwks_client
+
+    if _jwks_client is None:
+        _jwks_client = jwt.PyJWKClient(
+            settings.OIDC_OP_JWKS_ENDPOINT, cache_keys=True, lifespan=settings.OIDC_JWKS_CACHE_TTL_IN_SECONDS
+        )
+    return _jwks_client
+
+
+def verify_access_token_locally(access_token: str) -> Optional[dict]:
+    """Verify an access token's signature, expiry and issuer against the realm and return its claims.
+
+    Only access tokens (``typ`` Bearer) issued to one of OIDC_ACCESS_TOKEN_ALLOWED_CLIENTS are accepted, so the realm's
+    ID tokens and tokens meant for unrelated clients aren't. Returns None if the token can't be verified locally, in
+    which case the caller should fall back to Keycloak."""
+    if not settings.OIDC_OP_ISSUER:
+        # PyJWT skips the issuer check entirely without one
+        logging.warning('Could not verify access token locally: OIDC_OP_ISSUER is not set')
+        return None
+
+    try:
+        signing_key = _get_jwks_client().get_signing_key_from_jwt(access_token)
+        claims = jwt.decode(
+            access_token,
+            signing_key.key,
+            algorithms=[settings.OIDC_RP_SIGN_ALGO],
+            issuer=settings.OIDC_OP_ISSUER,
+            # Keycloak sets aud to the resource servers, the requesting client is in azp instead
+            options={'require': ['exp', 'iss', 'sub', 'typ', 'azp'], 'verify_aud': False},
+        )
+    except jwt.PyJWTError as ex:
+        logging.info(f'Could not verify access token locally: {ex}')
+        return None
+
+    if claims['typ'] != 'Bearer':
+        logging.info(f'Could not verify access token locally: it is a {claims["typ"]} token')
+        return None
+
+    if claims['azp'] not in settings.OIDC_ACCESS_TOKEN_ALLOWED_CLIENTS:
+        logging.info(f'Could not verify access token locally: client {claims["azp"]} is not allowed')
+        return None
+
+    return claims
@@ -1,15 +1,28 @@
+import csv
 import enum
+import hashlib
+import itertools
 import logging
+import re
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from collections.abc import Callable, Iterable, Iterator
 from urllib.parse import quote, urljoin
 
 import sentry_sdk
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
 from django.db.models import Q
 from django.urls import reverse
 
 from thunderbird_accounts.core.utils import get_absolute_url
 from thunderbird_accounts.authentication.reserved import is_reserved
 
+DISCOUNT_ID_PATTERN = re.compile(r'^dsc_[a-z0-9]{26}$')
+
 
 class KeycloakRequiredAction(enum.StrEnum):
     """Required actions, they're defined in the server's provider info.
@@ -45,13 +58,64 @@ class KeycloakRequiredAction(enum.StrEnum):
     WEBAUTHN_REGISTER_PASSWORDLESS = 'webauthn-register-passwordless'
 
 
-def is_email_in_allow_list(email: str) -> bool:
-    """If USE_ALLOW_LIST is enabled check the email for an existing User or an AllowListEntry."""
-    from thunderbird_accounts.authentication.models import AllowListEntry, User
+# In-process (L1) copy of recent allow list membership results: email hash -> (expires_at, is_in_allow_list).
+# It sits in front of the shared Redis (L2) cache, so it is only kept for a few seconds; invalidations from other
+# processes are picked up once an entry expires.
+_allow_list_l1_cache: OrderedDict[str, tuple[float, bool]] = OrderedDict()
+_allow_list_l1_lock = threading.Lock()
 
-    # If we're not using the allow list we don't check it.
-    if not settings.USE_ALLOW_LIST:
-        return True
+# Hit/miss counters for the allow list membership cache, keyed by l1_hit, l2_hit and miss.
+allow_list_cache_stats: Counter = Counter()
+
+
+def _allow_list_cache_version() -> int:
+    """The current allow list cache version, membership results are stored under it."""
+    from django.core.cache import cache
+
+    key = f'{settings.IS_IN_ALLOW_LIST_CACHE_KEY}:version'
+    # Seed with the current time so an evicted version key can't resurrect entries cached under an older version.
+    cache.add(key, time.time_ns(), timeout=None)
+    return cache.get(key)
+
+
+def invalidate_allow_list_cache():
+    """Invalidate every cached allow list membership result.
+
+    Called when allow list entries or users change, bumping the version makes every previously cached result
+    unreachable (they'll expire on their own)."""
+    from django.core.cache import cache
+
+    if not settings.IS_IN_ALLOW_LIST_CACHE_ENABLED:
+        return
+
+    key = f'{settings.IS_IN_ALLOW_LIST_CACHE_KEY}:version'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+    with _allow_list_l1_lock:
+        _allow_list_l1_cache.clear()
+
+
+def invalidate_allow_list_cache_for_emails(*emails: str | None):
+    """Invalidate the cached allow list membership of specific emails, e.g. after a user's emails change."""
+    from django.core.cache import cache
+
+    email_hashes = [hashlib.sha256(email.encode()).hexdigest() for email in emails if email]
+    if not settings.IS_IN_ALLOW_LIST_CACHE_ENABLED or not email_hashes:
+        return
+
+    version = _allow_list_cache_version()
+    cache.delete_many([f'{settings.IS_IN_ALLOW_LIST_CACHE_KEY}:{version}:{email_hash}' for email_hash in email_hashes])
+
+    with _allow_list_l1_lock:
+        for email_hash in email_hashes:
+            _allow_list_l1_cache.pop(email_hash, None)
+
+
+def _is_email_in_allow_list_uncached(email: str) -> bool:
+    from thunderbird_accounts.authentication.models import AllowListEntry, User
 
     # Are they an existing active user?
     # Matching by email which is the thundermail address or the recovery email
@@ -70,6 +134,49 @@ def is_email_in_allow_list(email: str) -> bool:
     return True
 
 
+def is_email_in_allow_list(email: str) -> bool:
+    """If USE_ALLOW_LIST is enabled check the email for an existing User or an AllowListEntry.
+
+    Results, including negative ones, are cached in-process and in Redis so repeated checks (or someone probing random
+    emails) don't hit the database. See :any:`invalidate_allow_list_cache`."""
+    from django.core.cache import cache
+
+    # If we're not using the allow list we don't check it.
+    if not settings.USE_ALLOW_LIST:
+        return True
+
+    if not settings.IS_IN_ALLOW_LIST_CACHE_ENABLED:
+        return _is_email_in_allow_list_uncached(email)
+
+    email_hash = hashlib.sha256(email.encode()).hexdigest()
+    now = time.monotonic()
+
+    with _allow_list_l1_lock:
+        cached = _allow_list_l1_cache.get(email_hash)
+        if cached and cached[0] > now:
+            _allow_list_l1_cache.move_to_end(email_hash)
+            allow_list_cache_stats['l1_hit'] += 1
+            return cached[1]
+
+    cache_key = f'{settings.IS_IN_ALLOW_LIST_CACHE_KEY}:{_allow_list_cache_version()}:{email_hash}'
+    is_in_allow_list = cache.get(cache_key)
+    if is_in_allow_list is None:
+        allow_list_cache_stats['miss'] += 1
+        is_in_allow_list = _is_email_in_allow_list_uncached(email)
+        cache.set(cache_key, is_in_allow_list, settings.IS_IN_ALLOW_LIST_CACHE_MAX_AGE_IN_SECONDS)
+    else:
+        allow_list_cache_stats['l2_hit'] += 1
+
+    expires_at = now + settings.IS_IN_ALLOW_LIST_L1_CACHE_MAX_AGE_IN_SECONDS
+    with _allow_list_l1_lock:
+        _allow_list_l1_cache[email_hash] = (expires_at, is_in_allow_list)
+        _allow_list_l1_cache.move_to_end(email_hash)
+        while len(_allow_list_l1_cache) > settings.IS_IN_ALLOW_LIST_L1_CACHE_MAX_ENTRIES:
+            _allow_list_l1_cache.popitem(last=False)
+
+    return is_in_allow_list
+
+
 def is_email_reserved(email: str):
     # Retrieve just the local part if we passed an entire email
     if '@' in email:
@@ -77,6 +184,160 @@ def is_email_reserved(email: str):
     return is_reserved(email)
 
 
+def _parse_allow_list_row(row: list[str]) -> tuple[str, str | None]:
+    """Validate a single ``email`` or ``email,discount_id`` csv row.
+
+    Raises a ValidationError with a user-facing message if the row is invalid."""
+    entry = row[0].strip()
+    discount_id = row[1].strip() if len(row) > 1 else None
+    if not discount_id:
+        discount_id = None
+
+    if len(row) > 2 and any(column.strip() for column in row[2:]):
+        raise ValidationError(f'{entry} has too many columns. Use email or email,discount_id.')
+
+    try:
+        validate_email(entry)
+    except ValidationError:
+        raise ValidationError(f'{entry} is not a valid email address.')
+
+    if discount_id and not DISCOUNT_ID_PATTERN.fullmatch(discount_id):
+        raise ValidationError(
+            f'{discount_id} is not a valid discount id. '
+            'Use the full Paddle id in the format dsc_ followed by 26 lowercase letters or numbers.'
+        )
+
+    return entry, discount_id
+
+
+def _insert_allow_list_chunk(chunk: dict[str, str | None], dupes: list[str], errors: list[str]) -> int:
+    """Insert a chunk of email -> discount_id pairs, skipping emails already on the allow list.
+
+    Returns the number of entries inserted."""
+    from thunderbird_accounts.authentication.models import AllowListEntry
+
+    existing = set(AllowListEntry.objects.filter(email__in=chunk.keys()).values_list('email', flat=True))
+    dupes.extend(f'{email} already exists in the allow list.' for email in chunk if email in existing)
+
+    new_entries = [
+        AllowListEntry(email=email, user=None, discount_id=discount_id)
+        for email, discount_id in chunk.items()
+        if email not in existing
+    ]
+    if not new_entries:
+        return 0
+
+    try:
+        # ignore_conflicts covers an entry created between our lookup and the insert, but doesn't tell us which
+        # entries it dropped, so look for the ones that made it.
+        AllowListEntry.objects.bulk_create(new_entries, ignore_conflicts=True)
+        inserted = set(
+            AllowListEntry.objects.filter(pk__in=[entry.pk for entry in new_entries]).values_list('email', flat=True)
+        )
+    except Exception as ex:
+        errors.append(f'{len(new_entries)} entries could not be created due to: {ex}.')
+        return 0
+
+    dupes.extend(
+        f'{entry.email} already exists in the allow list.' for entry in new_entries if entry.email not in inserted
+    )
+    return len(inserted)
+
+
+def import_allow_list_entries(lines: Iterable[str], on_progress: Callable[[int], None] | None = None) -> dict:
+    """Bulk import allow list entries from csv lines of ``email`` or ``email,discount_id``.
+
+    Lines are consumed lazily and processed in chunks of ``ALLOW_LIST_IMPORT_CHUNK_SIZE`` rows, each chunk costing one
+    query to find existing emails, one bulk insert for the new ones and one query to count what was inserted.
+    ``on_progress`` is called with the number of rows processed so far after each chunk.
+
+    Returns a dict with the number of entries ``added`` and lists of ``dupes`` and ``errors`` messages.
+    """
+    chunk_size = settings.ALLOW_LIST_IMPORT_CHUNK_SIZE
+    chunk: dict[str, str | None] = {}
+    dupes: list[str] = []
+    errors: list[str] = []
+    added = 0
+    processed = 0
+
+    for row in csv.reader(lines):
+        if not row or all(not column.strip() for column in row):
+            continue
+
+        processed += 1
+        try:
+            email, discount_id = _parse_allow_list_row(row)
+        except ValidationError as ex:
+            errors.append(ex.message)
+            continue
+
+        if email in chunk:
+            dupes.append(f'{email} already exists in the allow list.')
+            continue
+
+        chunk[email] = discount_id
+        if len(chunk) >= chunk_size:
+            added += _insert_allow_list_chunk(chunk, dupes, errors)
+            chunk = {}
+            if on_progress:
+                on_progress(processed)
+
+    if chunk:
+        added += _insert_allow_list_chunk(chunk, dupes, errors)
+    if on_progress:
+        on_progress(processed)
+
+    # bulk_create doesn't send model signals, so invalidate the membership cache ourselves.
+    if added:
+        invalidate_allow_list_cache()
+
+    return {'added': added, 'dupes': dupes, 'errors': errors}
+
+
+def _allow_list_import_key(import_id: str, chunk: int) -> str:
+    return f'{settings.ALLOW_LIST_IMPORT_CACHE_KEY}:{import_id}:{chunk}'
+
+
+def stash_allow_list_import(lines: Iterable[str]) -> tuple[str, int, int]:
+    """Store csv lines in the shared cache in chunks of ``ALLOW_LIST_IMPORT_CHUNK_SIZE`` lines, for a Celery worker to
+    import with :any:`read_stashed_allow_list_import`.
+
+    Returns the import's id, its number of chunks and its number of lines."""
+    from django.core.cache import cache
+
+    import_id = uuid.uuid4().hex
+    chunk_count = 0
+    line_count = 0
+    lines = iter(lines)
+    while chunk := list(itertools.islice(lines, settings.ALLOW_LIST_IMPORT_CHUNK_SIZE)):
+        cache.set(
+            _allow_list_import_key(import_id, chunk_count), chunk, settings.ALLOW_LIST_IMPORT_CACHE_TTL_IN_SECONDS
+        )
+        chunk_count += 1
+        line_count += len(chunk)
+
+    return import_id, chunk_count, line_count
+
+
+def read_stashed_allow_list_import(import_id: str, chunk_count: int) -> Iterator[str]:
+    """Yield the lines stored by :any:`stash_allow_list_import`, deleting each chunk once it has been read."""
+    from django.core.cache import cache
+
+    for chunk in range(chunk_count):
+        key = _allow_list_import_key(import_id, chunk)
+        lines = cache.get(key)
+        if lines is None:
+            raise ValueError(f'Chunk {chunk} of allow list import {import_id} is missing from the cache')
+        cache.delete(key)
+        yield from lines
+
+
+def discard_stashed_allow_list_import(import_id: str, chunk_count: int):
+    from django.core.cache import cache
+
+    cache.delete_many([_allow_list_import_key(import_id, chunk) for chunk in range(chunk_count)])
+
+
 def get_user_by_contact_email(email: str):
     """Return a user whose recovery email or account email matches the given address."""
     from thunderbird_accounts.authentication.models import User
@@ -125,34 +386,48 @@ def create_login_hint_url(login_hint: str):
     )
 
 
-def delete_user_data(user) -> list[str]:
-    """Delete a user from Keycloak, Stalwart, and the local DB.
+def delete_user_external_data(
+    oidc_id: str | None, stalwart_primary_email: str | None, keycloak_client=None
+) -> list[str]:
+    """Delete a user from Keycloak and Stalwart.
+
+    This doesn't touch the local DB, so it can be run from worker threads. Pass a ``keycloak_client`` to share one
+    admin token across many deletions.
 
     Returns a list of error messages (empty on full success).
-    Errors from external services are captured but do not prevent
-    the local DB deletion from proceeding.
     """
-
     from thunderbird_accounts.authentication.clients import KeycloakClient
     from thunderbird_accounts.authentication.exceptions import DeleteUserError
     from thunderbird_accounts.mail.clients import MailClient
 
     errors = []
 
-    if user.oidc_id:
+    if oidc_id:
         try:
-            KeycloakClient().delete_user(user.oidc_id)
+            (keycloak_client or KeycloakClient()).delete_user(oidc_id)
         except DeleteUserError as ex:
             sentry_sdk.capture_exception(ex)
             errors.append(f'Keycloak: {ex}')
 
-        if user.stalwart_primary_email:
+        if stalwart_primary_email:
             try:
-                MailClient().delete_account(user.stalwart_primary_email)
+                MailClient().delete_account(stalwart_primary_email)
             except Exception as ex:
                 sentry_sdk.capture_exception(ex)
                 errors.append(f'Stalwart: {ex}')
 
+    return errors
+
+
+def delete_user_data(user) -> list[str]:
+    """Delete a user from Keycloak, Stalwart, and the local DB.
+
+    Returns a list of error messages (empty on full success).
+    Errors from external services are captured but do not prevent
+    the local DB deletion from proceeding.
+    """
+    errors = delete_user_external_data(user.oidc_id, user.stalwart_primary_email if user.oidc_id else None)
+
     if errors:
         logging.error(f'Errors during user data deletion for {user.username}: {errors}')
 
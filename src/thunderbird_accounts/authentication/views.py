@@ -1,13 +1,12 @@
-import csv
-import re
+import codecs
+import itertools
 
+from celery.result import AsyncResult
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import logout as django_logout
 from django.contrib.auth.decorators import login_required, permission_required
 
-from django.core.exceptions import ValidationError
-from django.core.validators import validate_email
 from django.http import HttpRequest, HttpResponseRedirect
 from django.urls import reverse
 from urllib.parse import quote
@@ -20,11 +19,15 @@ from django.views.generic import TemplateView
 from mozilla_django_oidc.views import OIDCAuthenticationRequestView
 
 from thunderbird_accounts.authentication.mfa import MFA_REAUTH_PENDING_SESSION_KEY
-from thunderbird_accounts.authentication.utils import create_aia_url, KeycloakRequiredAction
+from thunderbird_accounts.authentication.token_cache import forget_token
+from thunderbird_accounts.authentication.utils import (
+    create_aia_url,
+    import_allow_list_entries,
+    stash_allow_list_import,
+    KeycloakRequiredAction,
+)
 from thunderbird_accounts.core.utils import get_absolute_url
 
-DISCOUNT_ID_PATTERN = re.compile(r'^dsc_[a-z0-9]{26}$')
-
 
 @login_required
 def start_reset_password_flow(request: HttpRequest):
@@ -91,6 +94,7 @@ def start_oidc_logout(request: HttpRequest):
 @login_required
 def oidc_logout_callback(request: HttpRequest):
     """Finalize logout locally after the user confirmed the logout."""
+    forget_token(request.session.get('oidc_access_token'))
     django_logout(request)
 
     # Redirect to home (Vue app catch-all will render)
@@ -103,61 +107,36 @@ def oidc_logout_callback(request: HttpRequest):
 def bulk_import_allow_list(request: HttpRequest):
     """
     Form submit for :any:`AdminAllowListEntryImport`, will bulk import email entries.
+
+    Entries come from the textarea or an uploaded csv file. Imports larger than ``ALLOW_LIST_IMPORT_ASYNC_THRESHOLD``
+    rows are queued as a Celery task and the user is redirected to :any:`AdminAllowListEntryImportStatus`.
     """
     # This file is loaded before models are ready, so we import locally here...for now.
-    from thunderbird_accounts.authentication.models import AllowListEntry
-
-    entries: str = request.POST.get('bulk-entry', '')
-    # Normalize new lines (I'm not sure if this is actually needed but best to be safe here.)
-    entries = entries.replace('\r\n', '\n').replace('\r', '\n')
-
-    dupes = []
-    errors = []
-    add_amount = 0
-
-    for row in csv.reader(entries.splitlines()):
-        if not row or all(not column.strip() for column in row):
-            continue
-
-        entry = row[0].strip()
-        discount_id = row[1].strip() if len(row) > 1 else None
-        if not discount_id:
-            discount_id = None
-
-        if len(row) > 2 and any(column.strip() for column in row[2:]):
-            errors.append(f'{entry} has too many columns. Use email or email,discount_id.')
-            continue
-
-        try:
-            validate_email(entry)
-        except ValidationError:
-            errors.append(f'{entry} is not a valid email address.')
-            continue
-
-        if discount_id and not DISCOUNT_ID_PATTERN.fullmatch(discount_id):
-            errors.append(
-                f'{discount_id} is not a valid discount id. '
-                'Use the full Paddle id in the format dsc_ followed by 26 lowercase letters or numbers.'
-            )
-            continue
-
-        try:
-            AllowListEntry.objects.get(email=entry)
-            dupes.append(f'{entry} already exists in the allow list.')
-
-            # If we didn't error out here, move onto the next one
-            continue
-        except AllowListEntry.DoesNotExist:
-            # okie
-            try:
-                AllowListEntry(email=entry, user=None, discount_id=discount_id).save()
-                add_amount += 1
-            except Exception as ex:
-                errors.append(f'{entry} could not be created due to: {ex}.')
-
-    for error in errors:
+    from thunderbird_accounts.authentication.tasks import bulk_import_allow_list as bulk_import_allow_list_task
+
+    uploaded_file = request.FILES.get('bulk-file')
+    if uploaded_file:
+        # Stream the upload line by line rather than reading it into memory.
+        lines = codecs.iterdecode(uploaded_file, 'utf-8-sig')
+    else:
+        lines = iter(request.POST.get('bulk-entry', '').splitlines())
+
+    # Only read as far as it takes to tell a small import, which runs right away, from a large one
+    threshold = settings.ALLOW_LIST_IMPORT_ASYNC_THRESHOLD
+    head = list(itertools.islice(lines, threshold + 1))
+
+    if len(head) > threshold:
+        # Web and Celery workers don't share a disk, so the rows are handed over through the shared cache
+        import_id, chunk_count, row_count = stash_allow_list_import(itertools.chain(head, lines))
+        task = bulk_import_allow_list_task.delay(import_id, chunk_count, row_count)
+        return HttpResponseRedirect(reverse('allow_list_entry_import_status', kwargs={'task_id': task.id}))
+
+    result = import_allow_list_entries(head)
+    add_amount = result['added']
+
+    for error in result['errors']:
         messages.error(request, error)
-    for dupe in dupes:
+    for dupe in result['dupes']:
         messages.warning(request, dupe)
 
     if add_amount > 0:
@@ -186,3 +165,28 @@ class AdminAllowListEntryImport(TemplateView):
         context.update({'app_label': 'authentication', 'submit_url': reverse('allow_list_entry_import_submit')})
 
         return context
+
+
+@method_decorator(never_cache, name='dispatch')
+@method_decorator(staff_member_required, name='dispatch')
+@method_decorator(permission_required('authentication.add_allowlistentry'), name='dispatch')
+class AdminAllowListEntryImportStatus(TemplateView):
+    """Progress page for an allow list import running as a Celery task."""
+
+    template_name = 'admin/authentication/allowlistentry/import_status.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        task = AsyncResult(kwargs['task_id'])
+        info = task.info if isinstance(task.info, dict) else {}
+        context.update(
+            {
+                'app_label': 'authentication',
+                'state': task.state,
+                'is_finished': task.ready(),
+                'info': info,
+                'import_url': reverse('allow_list_entry_import'),
+            }
+        )
+
+        return context
@@ -3,6 +3,7 @@
 import os
 
 from celery import Celery
+from celery.signals import worker_process_shutdown, worker_ready
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'thunderbird_accounts.settings')
@@ -12,3 +13,24 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
+
+
+@worker_ready.connect
+def start_metrics_server(**kwargs):
+    """Expose the worker's Prometheus metrics on WORKER_METRICS_PORT, web workers serve them on /metrics instead."""
+    from django.conf import settings
+    from prometheus_client import start_http_server
+
+    from thunderbird_accounts.infra.metrics import get_metrics_registry
+
+    if settings.WORKER_METRICS_PORT:
+        start_http_server(settings.WORKER_METRICS_PORT, registry=get_metrics_registry())
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    """Drop a finished pool process's live gauges from the multiprocess metrics."""
+    from prometheus_client import multiprocess
+
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,20 @@
+from unittest.mock import patch
+
+from asgiref.sync import iscoroutinefunction
+from django.core.handlers.asgi import ASGIHandler
+from django.test import SimpleTestCase, override_settings
+
+
+class AsyncMiddlewareChainTestCase(SimpleTestCase):
+    """Test that every middleware runs natively under ASGI, so async views aren't pushed back onto a thread"""
+
+    @override_settings(DEBUG=True, QUERY_BUDGET_ENABLED=True)
+    @patch('thunderbird_accounts.authentication.middleware.resolve_host_addresses', return_value=frozenset())
+    def test_no_middleware_is_adapted(self, mock_resolve_host_addresses):
+        handler = ASGIHandler()
+
+        # Django logs each middleware it has to wrap in sync_to_async, but only with DEBUG on
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            handler.load_middleware(is_async=True)
+
+        self.assertTrue(iscoroutinefunction(handler._middleware_chain))
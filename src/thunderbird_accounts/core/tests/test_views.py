@@ -4,6 +4,7 @@ from django.utils.html import strip_tags
 from unittest.mock import patch, Mock
 
 from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.test import SimpleTestCase, TestCase, Client as RequestClient
 from django.urls import reverse
 from pathlib import Path
@@ -251,7 +252,7 @@ class HomeViewNeedsTosAcceptanceTestCase(TestCase):
         self.assertTrue(blob.get('needsTosAcceptance'))
 
     def test_needs_tos_acceptance_false_with_duplicate_acceptances(self):
-        """Duplicate acceptance responses should not cause the check to fail."""
+        """A repeated acceptance is rejected by the database and doesn't affect the check."""
         tos = LegalDocument.objects.create(
             document_type=LegalDocument.DocumentType.TOS,
             version='2.0',
@@ -265,17 +266,18 @@ class HomeViewNeedsTosAcceptanceTestCase(TestCase):
             content_path='privacy/v2.0',
         )
 
-        # Force duplicate responses
-        LegalDocumentResponse.objects.create(
-            user=self.user,
-            document=tos,
-            action=LegalDocumentResponse.Action.ACCEPTED,
-        )
         LegalDocumentResponse.objects.create(
             user=self.user,
             document=tos,
             action=LegalDocumentResponse.Action.ACCEPTED,
         )
+        # Force a duplicate response
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            LegalDocumentResponse.objects.create(
+                user=self.user,
+                document=tos,
+                action=LegalDocumentResponse.Action.ACCEPTED,
+            )
         LegalDocumentResponse.objects.create(
             user=self.user,
             document=privacy,
@@ -23,7 +23,8 @@ from thunderbird_accounts.mail.exceptions import (
 )
 from thunderbird_accounts.mail.utils import decode_app_password, filter_app_passwords
 
-from thunderbird_accounts.legal.models import LegalDocument, LegalDocumentResponse
+from thunderbird_accounts.legal.models import LegalDocument
+from thunderbird_accounts.legal.responses import get_accepted_document_ids
 
 
 # Keep in sync with the public routes in assets/app/vue/router.ts.
@@ -129,17 +130,8 @@ def home(request: HttpRequest):
 
     # Check if the user needs to accept the latest legal documents
     if request.user.is_authenticated:
-        legal_doc_count = LegalDocument.objects.filter(is_current=True).count()
-        accepted_current_doc_count = (
-            LegalDocument.objects.filter(
-                is_current=True,
-                responses__user=request.user,
-                responses__action=LegalDocumentResponse.Action.ACCEPTED,
-            )
-            .distinct()
-            .count()
-        )
-        needs_tos_acceptance = legal_doc_count != accepted_current_doc_count
+        current_doc_ids = {str(pk) for pk in LegalDocument.objects.filter(is_current=True).values_list('pk', flat=True)}
+        needs_tos_acceptance = current_doc_ids != get_accepted_document_ids(request.user, current_doc_ids)
 
     form_data = request.session.get('form_data')
     if request.session.get('form_data'):
@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+
+
+class InfraConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'thunderbird_accounts.infra'
+    verbose_name = 'Infra'
+
+    def ready(self):
+        # Import here so Django finishes app loading first.
+        from thunderbird_accounts.infra.metrics import instrument_outbound_clients
+        from thunderbird_accounts.infra.queries import register_query_budget_task_handlers
+
+        instrument_outbound_clients()
+        register_query_budget_task_handlers()
@@ -0,0 +1,37 @@
+"""Blocking I/O from async views.
+
+The Stalwart, Keycloak and DNS clients are synchronous. Async views hand their calls to ``run_blocking``, which runs
+them on a bounded pool of BLOCKING_IO_MAX_WORKERS threads shared by the process, so a request waiting on a slow
+backend holds a pool thread rather than the event loop or Django's per-request sync thread.
+
+Only use it for work that doesn't touch the database: pool threads have their own connections, which aren't closed
+at the end of the request and can't see a test case's transaction. Database work in async views goes through the
+async ORM or ``sync_to_async``.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.BLOCKING_IO_MAX_WORKERS, thread_name_prefix='blocking-io'
+                )
+
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking, database-free call on the blocking I/O pool and return its result."""
+    return await sync_to_async(func, thread_sensitive=False, executor=_get_executor())(*args, **kwargs)
@@ -0,0 +1,34 @@
+import threading
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from thunderbird_accounts.infra.metrics import OUTBOUND_POOL_MAX_SIZE
+
+_sessions: dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_pooled_session(service: str, pool_maxsize: int | None = None) -> requests.Session:
+    """Return the process-wide session for an external service, so its connections are pooled and reused across
+    requests instead of reconnecting (and renegotiating TLS) for every call.
+
+    The pool holds ``pool_maxsize`` connections, ``OUTBOUND_HTTP_POOL_MAXSIZE`` by default. The session never stores
+    cookies, since it makes requests on behalf of different end users."""
+    session = _sessions.get(service)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(service)
+            if session is None:
+                pool_maxsize = pool_maxsize or settings.OUTBOUND_HTTP_POOL_MAXSIZE
+                session = requests.Session()
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                OUTBOUND_POOL_MAX_SIZE.labels(service=service).set(pool_maxsize)
+                _sessions[service] = session
+
+    return session
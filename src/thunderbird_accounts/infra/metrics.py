@@ -0,0 +1,220 @@
+"""Prometheus metrics exported on the ``metrics`` endpoint.
+
+Metrics live in the default registry, so they are per process. To aggregate every web or Celery worker process
+behind one scrape, point ``PROMETHEUS_MULTIPROC_DIR`` at an empty directory shared by them before they start, and
+``get_metrics_registry`` will collect from all of them.
+
+Outbound calls to Stalwart, Keycloak, Paddle, Mailchimp, Zendesk, PostHog and Cloudflare are all made with
+``requests`` or, for the Cloudflare SDK, ``httpx``. ``instrument_outbound_clients`` wraps both libraries'
+``send`` so every call is counted and timed here, labelled by service, endpoint template and status, without
+touching the individual clients. ``httpx`` only comes with the Cloudflare SDK, so it is only instrumented when it is
+installed.
+
+Endpoint templates must not carry customer data or grow with the number of customers, so every path segment after a
+collection such as ``principal`` or ``users`` is replaced with ``{id}``, whatever it looks like. Ids under collections
+not listed here are still caught if they look like numbers, uuids, emails or long opaque ids.
+"""
+
+import os
+import re
+import time
+from contextlib import contextmanager
+from functools import cache, wraps
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+HEALTH_CHECK_DURATION = Histogram(
+    'accounts_health_check_duration_seconds',
+    'Time taken by each dependency health check.',
+    ['dependency', 'healthy'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+APP_PASSWORD_HASH_QUEUE_TIME = Histogram(
+    'accounts_app_password_hash_queue_seconds',
+    'Time app passwords waited for a free hashing worker.',
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+APP_PASSWORD_HASH_DURATION = Histogram(
+    'accounts_app_password_hash_duration_seconds',
+    'Time spent hashing app passwords.',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+APP_PASSWORD_HASHES_REJECTED = Counter(
+    'accounts_app_password_hashes_rejected',
+    'App passwords turned away because the hashing queue was full.',
+)
+
+OUTBOUND_REQUESTS = Counter(
+    'accounts_outbound_requests',
+    'Requests made to external services.',
+    ['service', 'method', 'endpoint', 'status'],
+)
+OUTBOUND_REQUEST_DURATION = Histogram(
+    'accounts_outbound_request_duration_seconds',
+    'Time spent waiting on requests to external services.',
+    ['service', 'method', 'endpoint', 'status'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+OUTBOUND_REQUESTS_IN_FLIGHT = Gauge(
+    'accounts_outbound_requests_in_flight',
+    'Requests to external services currently waiting on a response.',
+    ['service'],
+    multiprocess_mode='livesum',
+)
+# Together with the in flight gauge this shows how close a pooled client is to running out of connections.
+OUTBOUND_POOL_MAX_SIZE = Gauge(
+    'accounts_outbound_pool_max_size',
+    'Connection pool size of pooled external service clients.',
+    ['service'],
+    multiprocess_mode='livemax',
+)
+
+# Collections of the external services' APIs, the path segment after one of these names a single object, e.g. a
+# Stalwart principal or a customer's domain under dns/records.
+_COLLECTION_SEGMENTS = frozenset(
+    {
+        # Stalwart
+        'principal',
+        'records',
+        # Keycloak
+        'users',
+        'credentials',
+        # Zendesk
+        'tickets',
+        'ticket_forms',
+        'uploads',
+        # Paddle
+        'subscriptions',
+        'customers',
+        'prices',
+        'products',
+        'transactions',
+        # Mailchimp
+        'lists',
+        'members',
+        'segments',
+        # Cloudflare
+        'zones',
+        'dns_records',
+    }
+)
+# Segments after a collection that are actions on it rather than objects in it.
+_COLLECTION_ACTION_SEGMENTS = frozenset({'deploy'})
+
+# Path segments that identify a single object rather than an endpoint: numbers, uuids, emails and the opaque
+# prefixed ids used by Paddle (e.g. sub_01h8...) and Stalwart.
+_ID_SEGMENT_RE = re.compile(
+    r'^(\d+|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|[^/]*@[^/]*|(?=[^/]*\d)[\w.~-]{16,})$',
+    re.IGNORECASE,
+)
+
+
+@cache
+def _service_hosts() -> dict[str, str]:
+    hosts = {}
+    for service, urls in (
+        ('keycloak', ['KEYCLOAK_API_ENDPOINT', 'KEYCLOAK_ADMIN_TOKEN_ENDPOINT', 'OIDC_OP_TOKEN_ENDPOINT']),
+        ('stalwart', ['STALWART_BASE_API_URL', 'STALWART_JMAP_API_URL']),
+        ('posthog', ['POSTHOG_HOST']),
+    ):
+        for setting in urls:
+            # The Keycloak settings only exist with the oidc auth scheme
+            url = getattr(settings, setting, None)
+            if url:
+                hosts[urlsplit(url).hostname] = service
+    return hosts
+
+
+def service_for_host(host: str | None) -> str:
+    """Map a request's host to the external service it belongs to."""
+    if not host:
+        return 'other'
+
+    service = _service_hosts().get(host)
+    if service:
+        return service
+
+    for suffix, service in (
+        ('.zendesk.com', 'zendesk'),
+        ('.api.mailchimp.com', 'mailchimp'),
+        ('.paddle.com', 'paddle'),
+        ('.cloudflare.com', 'cloudflare'),
+    ):
+        if host.endswith(suffix):
+            return service
+
+    return 'other'
+
+
+def endpoint_template(path: str) -> str:
+    """Replace the ids in a url path with ``{id}`` so requests to the same endpoint share a label."""
+    segments = path.split('/')
+    template = []
+    for previous, segment in zip([''] + segments, segments):
+        is_object = previous in _COLLECTION_SEGMENTS and segment and segment not in _COLLECTION_ACTION_SEGMENTS
+        template.append('{id}' if is_object or _ID_SEGMENT_RE.match(segment) else segment)
+    return '/'.join(template) or '/'
+
+
+@contextmanager
+def observe_outbound_request(method: str, url: str):
+    """Record an outbound request to ``url``. Yields a dict whose ``status`` should be set from the response."""
+    parts = urlsplit(url)
+    service = service_for_host(parts.hostname)
+    outcome = {'status': 'error'}
+
+    in_flight = OUTBOUND_REQUESTS_IN_FLIGHT.labels(service=service)
+    in_flight.inc()
+    start = time.perf_counter()
+    try:
+        yield outcome
+    finally:
+        in_flight.dec()
+        labels = {
+            'service': service,
+            'method': method.upper(),
+            'endpoint': endpoint_template(parts.path),
+            'status': str(outcome['status']),
+        }
+        OUTBOUND_REQUESTS.labels(**labels).inc()
+        OUTBOUND_REQUEST_DURATION.labels(**labels).observe(time.perf_counter() - start)
+
+
+def _instrument_send(send, get_method_and_url):
+    @wraps(send)
+    def _send(self, request, *args, **kwargs):
+        method, url = get_method_and_url(request)
+        with observe_outbound_request(method, url) as outcome:
+            response = send(self, request, *args, **kwargs)
+            outcome['status'] = response.status_code
+            return response
+
+    _send.instrumented = True
+    return _send
+
+
+def instrument_outbound_clients():
+    """Record metrics for every request sent with ``requests`` or ``httpx``. Safe to call more than once."""
+    if not getattr(requests.Session.send, 'instrumented', False):
+        requests.Session.send = _instrument_send(requests.Session.send, lambda request: (request.method, request.url))
+    if httpx and not getattr(httpx.Client.send, 'instrumented', False):
+        httpx.Client.send = _instrument_send(httpx.Client.send, lambda request: (request.method, str(request.url)))
+
+
+def get_metrics_registry() -> CollectorRegistry:
+    """Return the registry to export, aggregating every process's metrics when running in multiprocess mode."""
+    if not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
@@ -0,0 +1,45 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from thunderbird_accounts.infra.queries import track_queries
+
+
+class QueryBudgetMiddleware:
+    """Track each request's database queries against its view's query budget, see ``infra.queries``."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_ENABLED:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        with track_queries('unresolved') as tracker:
+            response = self.get_response(request)
+
+        self._report(request, tracker)
+        return response
+
+    async def __acall__(self, request):
+        with track_queries('unresolved') as tracker:
+            response = await self.get_response(request)
+
+        self._report(request, tracker)
+        return response
+
+    def _report(self, request, tracker):
+        # The view is only known once the url has been resolved further down the stack
+        if request.resolver_match:
+            func = request.resolver_match.func
+            tracker.name = request.resolver_match.view_name or f'{func.__module__}.{func.__qualname__}'
+
+        tracker.report()
@@ -0,0 +1,193 @@
+"""Per-request and per-task database query budgets.
+
+``track_queries`` counts every query and the total database time spent inside it, and groups queries by their SQL
+shape (the parameterised SQL, with ``IN`` lists collapsed) so a query repeated per row shows up as an N+1. When a
+request or task runs more queries than its budget in ``QUERY_BUDGETS``, or repeats a shape at least
+``QUERY_BUDGET_REPEATED_QUERY_THRESHOLD`` times, it is logged, counted in the ``metrics`` endpoint and left as a
+Sentry breadcrumb. With ``QUERY_BUDGET_RAISE`` (on in tests) going over budget also raises ``QueryBudgetExceeded``,
+so a regression fails the test suite rather than reaching a deploy.
+
+Requests are tracked by ``QueryBudgetMiddleware`` and Celery tasks by ``register_query_budget_task_handlers``,
+both only when ``QUERY_BUDGET_ENABLED`` is set.
+
+Open trackers live in a context variable rather than on the connections of the thread that opened them, and every
+connection gets an execute wrapper that hands its queries to the trackers of the current context. ``sync_to_async``
+and ``run_blocking`` copy the context into their threads, so an async view's database work is counted against its
+request even though it runs on another thread's connection.
+"""
+
+import functools
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+import sentry_sdk
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from prometheus_client import Counter as MetricCounter, Histogram
+
+QUERY_COUNT = Histogram(
+    'accounts_db_queries',
+    'Database queries run per request or task.',
+    ['name'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+QUERY_DURATION = Histogram(
+    'accounts_db_query_duration_seconds',
+    'Total time spent in database queries per request or task.',
+    ['name'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+QUERY_BUDGET_OFFENCES = MetricCounter(
+    'accounts_db_query_budget_offences',
+    'Requests or tasks that went over their query budget or repeated a query.',
+    ['name', 'reason'],
+)
+
+_IN_LIST_RE = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+
+# The trackers open in the current context, innermost last.
+_active_trackers: ContextVar[tuple['QueryTracker', ...]] = ContextVar('query_trackers', default=())
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a request or task runs more queries than its budget allows and ``QUERY_BUDGET_RAISE`` is set."""
+
+    def __init__(self, name: str, count: int, budget: int):
+        self.name = name
+        self.count = count
+        self.budget = budget
+
+    def __str__(self):
+        return f'{self.name} ran {self.count} queries, over its budget of {self.budget}'
+
+
+def sql_shape(sql: str) -> str:
+    """Return the shape of a parameterised query, so the same query with different ``IN`` lists groups together."""
+    return _IN_LIST_RE.sub('(%s, ...)', sql)
+
+
+class QueryTracker:
+    """Execute wrapper counting queries, their total time and how often each SQL shape runs."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        # Queries can come in from several threads at once, see the module docstring
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                self.duration += duration
+                self.count += 1
+                self.shapes[sql_shape(sql)] += 1
+
+    @property
+    def budget(self) -> int | None:
+        return settings.QUERY_BUDGETS.get(self.name)
+
+    def repeated_queries(self) -> list[tuple[str, int]]:
+        return [
+            (shape, count)
+            for shape, count in self.shapes.most_common()
+            if count >= settings.QUERY_BUDGET_REPEATED_QUERY_THRESHOLD
+        ]
+
+    def report(self, raise_over_budget: bool = True):
+        """Record this tracker's totals and report it if it went over budget or repeated a query."""
+        QUERY_COUNT.labels(name=self.name).observe(self.count)
+        QUERY_DURATION.labels(name=self.name).observe(self.duration)
+
+        budget = self.budget
+        over_budget = budget is not None and self.count > budget
+        repeated = self.repeated_queries()
+        if not over_budget and not repeated:
+            return
+
+        data = {'queries': self.count, 'duration': self.duration, 'budget': budget, 'repeated': repeated[:5]}
+        if over_budget:
+            QUERY_BUDGET_OFFENCES.labels(name=self.name, reason='budget').inc()
+        if repeated:
+            QUERY_BUDGET_OFFENCES.labels(name=self.name, reason='repeated').inc()
+
+        logging.warning(f'Query budget offender {self.name}: {data}')
+        sentry_sdk.add_breadcrumb(category='query_budget', message=self.name, level='warning', data=data)
+
+        if over_budget and raise_over_budget and settings.QUERY_BUDGET_RAISE:
+            raise QueryBudgetExceeded(self.name, self.count, budget)
+
+
+def _execute_with_trackers(execute, sql, params, many, context):
+    """Execute wrapper passing a query through every tracker open in the current context."""
+    for tracker in _active_trackers.get():
+        execute = functools.partial(tracker, execute)
+    return execute(sql, params, many, context)
+
+
+def _install_execute_wrapper(connection):
+    if _execute_with_trackers not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_with_trackers)
+
+
+def _connection_created(sender, connection, **kwargs):
+    _install_execute_wrapper(connection)
+
+
+@contextmanager
+def track_queries(name: str):
+    """Track the queries run while the context is open, including those run on other threads through
+    ``sync_to_async`` or ``run_blocking``."""
+    # Connections opened before the connection_created handler was registered don't have the wrapper yet
+    for connection in connections.all(initialized_only=True):
+        _install_execute_wrapper(connection)
+
+    tracker = QueryTracker(name)
+    token = _active_trackers.set((*_active_trackers.get(), tracker))
+    try:
+        yield tracker
+    finally:
+        _active_trackers.reset(token)
+
+
+# Open trackers for running Celery tasks, keyed by task id.
+_task_trackers: dict[str, tuple[ExitStack, QueryTracker]] = {}
+
+
+def _start_task_tracking(task_id=None, task=None, **kwargs):
+    stack = ExitStack()
+    tracker = stack.enter_context(track_queries(task.name))
+    _task_trackers[task_id] = (stack, tracker)
+
+
+def _finish_task_tracking(task_id=None, **kwargs):
+    stack, tracker = _task_trackers.pop(task_id, (None, None))
+    if stack is None:
+        return
+
+    stack.close()
+    # The task has already finished by now, so an offending task is only reported.
+    tracker.report(raise_over_budget=False)
+
+
+def register_query_budget_task_handlers():
+    """Track the queries of every Celery task, and give new connections the trackers' execute wrapper, when
+    ``QUERY_BUDGET_ENABLED`` is set."""
+    if not settings.QUERY_BUDGET_ENABLED:
+        return
+
+    connection_created.connect(_connection_created, dispatch_uid='query_budget_connection_created')
+    task_prerun.connect(_start_task_tracking, dispatch_uid='query_budget_task_prerun')
+    task_postrun.connect(_finish_task_tracking, dispatch_uid='query_budget_task_postrun')
@@ -0,0 +1,24 @@
+import threading
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from thunderbird_accounts.infra.blocking import run_blocking
+
+
+class RunBlockingTestCase(SimpleTestCase):
+    def test_runs_on_the_blocking_io_pool(self):
+        def current_thread_name(suffix):
+            return f'{threading.current_thread().name}{suffix}'
+
+        result = async_to_sync(run_blocking)(current_thread_name, suffix='!')
+
+        self.assertTrue(result.startswith('blocking-io'))
+        self.assertTrue(result.endswith('!'))
+
+    def test_exceptions_are_raised_to_the_caller(self):
+        def fail():
+            raise ConnectionError('Stalwart is down')
+
+        with self.assertRaises(ConnectionError):
+            async_to_sync(run_blocking)(fail)
@@ -0,0 +1,26 @@
+from http.client import HTTPMessage
+from types import SimpleNamespace
+
+import requests
+from django.test import TestCase
+from requests.cookies import extract_cookies_to_jar
+
+from thunderbird_accounts.infra.http import get_pooled_session
+
+
+class PooledSessionTestCase(TestCase):
+    def test_sessions_are_shared_per_service(self):
+        self.assertIs(get_pooled_session('keycloak'), get_pooled_session('keycloak'))
+        self.assertIsNot(get_pooled_session('keycloak'), get_pooled_session('stalwart'))
+
+    def test_session_does_not_keep_cookies(self):
+        message = HTTPMessage()
+        message['Set-Cookie'] = 'AWSALB=abc123; Path=/'
+        response = requests.Response()
+        response._original_response = SimpleNamespace(msg=message)
+        request = requests.Request('POST', 'https://keycloak.example.org/admin/realms/tbpro/users').prepare()
+
+        # A shared session that accepted cookies would replay this one on every other user's requests
+        extract_cookies_to_jar(get_pooled_session('keycloak').cookies, request, response)
+
+        self.assertEqual(len(get_pooled_session('keycloak').cookies), 0)
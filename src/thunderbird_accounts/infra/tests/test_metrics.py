@@ -0,0 +1,97 @@
+from unittest.mock import patch
+
+import requests
+from django.test import TestCase, override_settings
+from prometheus_client import REGISTRY
+from requests.adapters import BaseAdapter
+
+from thunderbird_accounts.infra import metrics
+
+
+class StaticAdapter(BaseAdapter):
+    def __init__(self, status_code):
+        super().__init__()
+        self.status_code = status_code
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = self.status_code
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+class OutboundMetricsTestCase(TestCase):
+    def setUp(self):
+        metrics._service_hosts.cache_clear()
+        self.addCleanup(metrics._service_hosts.cache_clear)
+
+    def _sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_endpoint_template_replaces_ids(self):
+        self.assertEqual(
+            metrics.endpoint_template('/api/principal/user@example.com'),
+            '/api/principal/{id}',
+        )
+        self.assertEqual(
+            metrics.endpoint_template('/subscriptions/sub_01h8bx69629a16wwm9z8rjmak3/cancel'),
+            '/subscriptions/{id}/cancel',
+        )
+        self.assertEqual(
+            metrics.endpoint_template('/users/0b4e4f3c-3c1a-4a7e-9b4c-2d6f1f0e8a11/credentials/12'),
+            '/users/{id}/credentials/{id}',
+        )
+        self.assertEqual(metrics.endpoint_template('/api/v2/ticket_forms'), '/api/v2/ticket_forms')
+
+    def test_endpoint_template_replaces_objects_of_collections(self):
+        self.assertEqual(metrics.endpoint_template('/api/principal/customer-domain.org'), '/api/principal/{id}')
+        self.assertEqual(metrics.endpoint_template('/api/dns/records/customer-domain.org'), '/api/dns/records/{id}')
+        self.assertEqual(metrics.endpoint_template('/api/v2/uploads/abc.json'), '/api/v2/uploads/{id}')
+        self.assertEqual(metrics.endpoint_template('/api/principal/deploy'), '/api/principal/deploy')
+        self.assertEqual(metrics.endpoint_template('/admin/realms/tbpro/users/'), '/admin/realms/tbpro/users/')
+
+    @override_settings(STALWART_BASE_API_URL='https://stalwart.internal:8080')
+    def test_service_for_host(self):
+        self.assertEqual(metrics.service_for_host('stalwart.internal'), 'stalwart')
+        self.assertEqual(metrics.service_for_host('mzla.zendesk.com'), 'zendesk')
+        self.assertEqual(metrics.service_for_host('us21.api.mailchimp.com'), 'mailchimp')
+        self.assertEqual(metrics.service_for_host('sandbox-api.paddle.com'), 'paddle')
+        self.assertEqual(metrics.service_for_host('example.org'), 'other')
+
+    def test_requests_are_counted_and_timed(self):
+        labels = {'service': 'zendesk', 'method': 'GET', 'endpoint': '/api/v2/ticket_forms/{id}', 'status': '404'}
+        before = self._sample('accounts_outbound_requests_total', **labels)
+
+        session = requests.Session()
+        session.mount('https://', StaticAdapter(404))
+        session.get('https://mzla.zendesk.com/api/v2/ticket_forms/123?include=ticket_fields')
+
+        self.assertEqual(self._sample('accounts_outbound_requests_total', **labels), before + 1)
+        self.assertIsNotNone(REGISTRY.get_sample_value('accounts_outbound_request_duration_seconds_count', labels))
+        self.assertEqual(self._sample('accounts_outbound_requests_in_flight', service='zendesk'), 0)
+
+    def test_failed_requests_are_counted_as_errors(self):
+        labels = {'service': 'paddle', 'method': 'POST', 'endpoint': '/transactions', 'status': 'error'}
+        before = self._sample('accounts_outbound_requests_total', **labels)
+
+        session = requests.Session()
+        with (
+            patch.object(StaticAdapter, 'send', side_effect=requests.ConnectionError),
+            self.assertRaises(requests.ConnectionError),
+        ):
+            session.mount('https://', StaticAdapter(200))
+            session.post('https://api.paddle.com/transactions')
+
+        self.assertEqual(self._sample('accounts_outbound_requests_total', **labels), before + 1)
+
+    def test_instrumentation_is_only_applied_once(self):
+        send = requests.Session.send
+
+        metrics.instrument_outbound_clients()
+
+        self.assertIs(requests.Session.send, send)
+        self.assertTrue(send.instrumented)
@@ -0,0 +1,122 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from thunderbird_accounts.authentication.models import User
+from thunderbird_accounts.infra import queries
+from thunderbird_accounts.infra.middleware import QueryBudgetMiddleware
+
+
+def _query_users(times):
+    for _ in range(times):
+        list(User.objects.filter(username='nobody@example.org'))
+
+
+def _query_users_in_thread(times):
+    try:
+        _query_users(times)
+    finally:
+        connection.close()
+
+
+class QueryTrackerTestCase(TestCase):
+    def test_sql_shape_collapses_in_lists(self):
+        self.assertEqual(
+            queries.sql_shape('SELECT * FROM "user" WHERE "id" IN (%s, %s, %s) AND "is_active" = %s'),
+            queries.sql_shape('SELECT * FROM "user" WHERE "id" IN (%s) AND "is_active" = %s'),
+        )
+
+    def test_queries_are_counted_and_grouped_by_shape(self):
+        with queries.track_queries('test') as tracker:
+            _query_users(3)
+            User.objects.count()
+
+        self.assertEqual(tracker.count, 4)
+        self.assertGreater(tracker.duration, 0)
+        self.assertEqual(sorted(tracker.shapes.values()), [1, 3])
+
+    def test_queries_on_other_threads_are_counted(self):
+        async def query_elsewhere():
+            await sync_to_async(_query_users_in_thread, thread_sensitive=False)(2)
+
+        with queries.track_queries('outer') as outer, queries.track_queries('inner') as inner:
+            async_to_sync(query_elsewhere)()
+            _query_users(1)
+
+        self.assertEqual(inner.count, 3)
+        self.assertEqual(outer.count, 3)
+
+    def test_queries_after_tracking_are_not_counted(self):
+        with queries.track_queries('test') as tracker:
+            _query_users(1)
+        _query_users(1)
+
+        self.assertEqual(tracker.count, 1)
+
+    @override_settings(QUERY_BUDGET_REPEATED_QUERY_THRESHOLD=3)
+    @patch('thunderbird_accounts.infra.queries.sentry_sdk.add_breadcrumb')
+    def test_repeated_queries_are_reported(self, mock_add_breadcrumb):
+        with queries.track_queries('test') as tracker:
+            _query_users(3)
+
+        with self.assertLogs(level='WARNING') as logs:
+            tracker.report()
+
+        self.assertIn('Query budget offender test', logs.output[0])
+        mock_add_breadcrumb.assert_called_once()
+        self.assertEqual(mock_add_breadcrumb.call_args.kwargs['data']['repeated'][0][1], 3)
+
+    @override_settings(QUERY_BUDGETS={'test': 1})
+    def test_task_over_budget_is_reported_but_not_raised(self):
+        task = SimpleNamespace(name='test')
+
+        queries._start_task_tracking(task_id='task-1', task=task)
+        _query_users(2)
+        with self.assertLogs(level='WARNING'):
+            queries._finish_task_tracking(task_id='task-1', task=task)
+
+        self.assertNotIn('task-1', queries._task_trackers)
+
+
+@override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_RAISE=True)
+class QueryBudgetMiddlewareTestCase(TestCase):
+    def _middleware(self, times):
+        def get_response(request):
+            request.resolver_match = SimpleNamespace(view_name='users', func=_query_users)
+            _query_users(times)
+            return HttpResponse()
+
+        return QueryBudgetMiddleware(get_response)
+
+    def _async_middleware(self, times, view_name='users'):
+        async def get_response(request):
+            request.resolver_match = SimpleNamespace(view_name=view_name, func=_query_users)
+            await sync_to_async(_query_users_in_thread, thread_sensitive=False)(times)
+            return HttpResponse()
+
+        return QueryBudgetMiddleware(get_response)
+
+    @override_settings(QUERY_BUDGETS={'users': 2})
+    def test_within_budget(self):
+        response = self._middleware(2)(RequestFactory().get('/'))
+
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(QUERY_BUDGETS={'users': 2})
+    def test_over_budget_raises(self):
+        with self.assertRaises(queries.QueryBudgetExceeded), self.assertLogs(level='WARNING'):
+            self._middleware(3)(RequestFactory().get('/'))
+
+    @override_settings(QUERY_BUDGETS={'users': 2})
+    def test_async_over_budget_raises(self):
+        with self.assertRaises(queries.QueryBudgetExceeded), self.assertLogs(level='WARNING'):
+            async_to_sync(self._async_middleware(3))(RequestFactory().get('/'))
+
+    @override_settings(QUERY_BUDGETS={f'{__name__}._query_users': 2})
+    def test_unnamed_view_uses_its_function_path(self):
+        with self.assertRaises(queries.QueryBudgetExceeded), self.assertLogs(level='WARNING'):
+            async_to_sync(self._async_middleware(3, view_name=None))(RequestFactory().get('/'))
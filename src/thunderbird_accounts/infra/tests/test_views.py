@@ -0,0 +1,118 @@
+import threading
+import time
+from unittest.mock import Mock, patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from thunderbird_accounts.infra import views
+
+
+@override_settings(HEALTH_CHECK_TIMEOUT_IN_SECONDS=1, HEALTH_CHECK_CACHE_TTL_IN_SECONDS=5)
+class HealthCheckTestCase(TestCase):
+    def setUp(self):
+        views._cached_health = None
+        views._running_checks.clear()
+
+    def _patch_checks(self, **checks):
+        return patch.dict(views.HEALTH_CHECKS, checks, clear=True)
+
+    def test_checks_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=1)
+
+        def check():
+            # Only passes if both checks are running at the same time
+            barrier.wait()
+            return True
+
+        with self._patch_checks(redis=check, database=check):
+            response = self.client.get(reverse('health_ready'))
+
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertTrue(payload['redis']['healthy'])
+        self.assertTrue(payload['database']['healthy'])
+        self.assertTrue(payload['accounts']['healthy'])
+
+    def test_results_are_cached(self):
+        check = Mock(return_value=True)
+
+        with self._patch_checks(redis=check):
+            self.client.get('/health')
+            self.client.get('/health')
+
+        check.assert_called_once()
+
+    @override_settings(HEALTH_CHECK_TIMEOUT_IN_SECONDS=0.1)
+    def test_slow_and_failing_checks_are_unhealthy(self):
+        release = threading.Event()
+
+        def raises():
+            raise ConnectionError('Connection refused')
+
+        with self._patch_checks(redis=Mock(return_value=True), keycloak=release.wait, stalwart=raises):
+            response = self.client.get(reverse('health_ready'))
+            release.set()
+
+        self.assertEqual(response.status_code, 503)
+        payload = response.json()
+        self.assertTrue(payload['redis']['healthy'])
+        self.assertFalse(payload['keycloak']['healthy'])
+        self.assertFalse(payload['stalwart']['healthy'])
+        self.assertFalse(payload['accounts']['healthy'])
+
+    @override_settings(HEALTH_CHECK_TIMEOUT_IN_SECONDS=0.1, HEALTH_CHECK_CACHE_TTL_IN_SECONDS=0)
+    def test_hung_check_is_not_resubmitted(self):
+        release = threading.Event()
+        check = Mock(side_effect=release.wait)
+
+        with self._patch_checks(keycloak=check):
+            self.client.get('/health')
+            self.client.get('/health')
+            release.set()
+            views._running_checks['keycloak'].result(timeout=1)
+
+        check.assert_called_once()
+
+    def test_liveness_does_not_check_dependencies(self):
+        check = Mock(return_value=True)
+
+        with self._patch_checks(redis=check):
+            response = self.client.get(reverse('health_live'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'healthy': True})
+        check.assert_not_called()
+
+    def test_check_latency_is_exported(self):
+        with self._patch_checks(redis=lambda: time.sleep(0.01) or True):
+            self.client.get('/health')
+
+        with override_settings(METRICS_AUTH_TOKEN='scraper-token'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scraper-token')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'accounts_health_check_duration_seconds_count{dependency="redis",healthy="true"}',
+            response.content.decode(),
+        )
+
+
+class MetricsViewTestCase(TestCase):
+    @override_settings(METRICS_AUTH_TOKEN='scraper-token')
+    def test_requires_token(self):
+        for authorization in (None, 'Bearer wrong-token', 'Basic scraper-token'):
+            with self.subTest(authorization=authorization):
+                headers = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+                self.assertEqual(self.client.get(reverse('metrics'), **headers).status_code, 403)
+
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scraper-token')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_AUTH_TOKEN=None, IS_DEV=False)
+    def test_forbidden_without_configured_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    @override_settings(METRICS_AUTH_TOKEN=None, IS_DEV=True)
+    def test_open_in_dev_without_configured_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
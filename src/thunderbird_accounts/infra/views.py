@@ -1,89 +1,170 @@
+import hmac
 import logging
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
 import requests.exceptions
 
+from django.conf import settings
 from django.core.cache import cache
-from django.http import HttpRequest, JsonResponse
+from django.db import close_old_connections
+from django.http import HttpRequest, HttpResponse, HttpResponseForbidden, JsonResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from thunderbird_accounts.authentication.clients import KeycloakClient
 from thunderbird_accounts.authentication.models import User
+from thunderbird_accounts.infra.metrics import HEALTH_CHECK_DURATION, get_metrics_registry
 from thunderbird_accounts.mail.clients import MailClient
 
 from datetime import datetime
 from uuid import uuid4 as UUID
 
 
-class PerformanceMonitored:
-    def __init__(self, func):
-        self.func = func
+def _check_keycloak():
+    # Retrieve the list of required actions as a no-op action to demonstrate that keycloak's api is reachable and
+    # operational.
+    try:
+        keycloak_client = KeycloakClient()
+        keycloak_client.request('authentication/required-actions')
+        return True
+    except requests.exceptions.HTTPError:
+        return False
 
-    def __call__(self, *args, **kwargs):
-        start = time.perf_counter()
-        result = self.func(*args, **kwargs)
-        finish = time.perf_counter()
-        duration = finish - start
-        logging.debug(f'Performance monitoring -- Function {self.func} ran in {duration} seconds')
-        return result, duration
 
+def _check_stalwart():
+    # Retrieve telemetry results as a no-op action to demonstrate that stalwart's api is reachable and operational.
+    # The JMAP client fetches its session on init, which already proves that.
+    try:
+        stalwart_client = MailClient()
+        if not settings.STALWART_ADMIN_API_USE_JMAP:
+            stalwart_client.get_telemetry()
+        return True
+    except requests.exceptions.HTTPError:
+        return False
 
-def health_check(request: HttpRequest):
-    """Prove the service is responsive."""
 
-    @PerformanceMonitored
-    def __check_keycloak():
-        # Retrieve the list of required actions as a no-op action to demonstrate that keycloak's api is reachable and
-        # operational.
-        try:
-            keycloak_client = KeycloakClient()
-            keycloak_client.request('authentication/required-actions')
-            return True
-        except requests.exceptions.HTTPError:
-            return False
-
-    @PerformanceMonitored
-    def __check_stalwart():
-        # Retrieve telemetry results as a no-op action to demonstrate that stalwart's api is reachable and operational.
-        try:
-            stalwart_client = MailClient()
-            stalwart_client.get_telemetry()
-            return True
-        except requests.exceptions.HTTPError:
-            return False
+def _check_redis():
+    # Set and retrieve the current timestamp to demonstrate that redis is reachable and operational.
+    key = f'health_check_{UUID()}'
+    now = datetime.now().isoformat()
+    cache.set(key, now)
+    then = cache.get(key)
+    cache.delete(key)
+    return True if now == then else False
 
-    @PerformanceMonitored
-    def __check_redis():
-        # Set and retrieve the current timestamp to demonstrate that redis is reachable and operational.
-        try:
-            key = f'health_check_{UUID()}'
-            now = datetime.now().isoformat()
-            cache.set(key, now)
-            then = cache.get(key)
-            cache.delete(key)
-            return True if now == then else False
-        except Exception:
-            return False
-
-    @PerformanceMonitored
-    def __check_postgres():
+
+def _check_postgres():
+    # Checks run on long-lived worker threads, so drop a connection the database has since closed on us
+    close_old_connections()
+    User.objects.first()
+    return True
+
+
+HEALTH_CHECKS = {
+    'keycloak': _check_keycloak,
+    'stalwart': _check_stalwart,
+    'redis': _check_redis,
+    'database': _check_postgres,
+}
+
+_health_check_executor = ThreadPoolExecutor(max_workers=len(HEALTH_CHECKS), thread_name_prefix='health-check')
+# Checks still running from a previous round, which are waited on again rather than piling up duplicates behind a
+# hung dependency.
+_running_checks: dict[str, Future] = {}
+# Only one round runs at a time, concurrent probes wait for it and share its result.
+_health_lock = threading.Lock()
+_cached_health: tuple[float, dict] | None = None
+
+
+def _run_check(name: str, check) -> tuple[bool, float]:
+    start = time.perf_counter()
+    try:
+        healthy = bool(check())
+    except Exception as ex:
+        logging.warning(f'Health check for {name} failed: {ex}')
+        healthy = False
+    duration = time.perf_counter() - start
+    HEALTH_CHECK_DURATION.labels(dependency=name, healthy=str(healthy).lower()).observe(duration)
+    return healthy, duration
+
+
+def _run_health_checks() -> dict:
+    """Run every dependency check concurrently, treating any still running after
+    HEALTH_CHECK_TIMEOUT_IN_SECONDS as unhealthy."""
+    start = time.perf_counter()
+    deadline = start + settings.HEALTH_CHECK_TIMEOUT_IN_SECONDS
+
+    futures = {}
+    for name, check in HEALTH_CHECKS.items():
+        future = _running_checks.get(name)
+        if future is None or future.done():
+            future = _health_check_executor.submit(_run_check, name, check)
+            _running_checks[name] = future
+        futures[name] = future
+
+    connection_stats = {}
+    for name, future in futures.items():
         try:
-            User.objects.first()
-            return True
-        except Exception:
-            return False
-
-    keycloak_health, keycloak_duration = __check_keycloak()
-    stalwart_health, stalwart_duration = __check_stalwart()
-    redis_health, redis_duration = __check_redis()
-    postgres_health, postgres_duration = __check_postgres()
-    total_duration = keycloak_duration + stalwart_duration + redis_duration + postgres_duration
-    accounts_health = all([keycloak_health, stalwart_health, redis_health, postgres_health])
-
-    connection_stats = {
-        'keycloak': {'healthy': keycloak_health, 'duration': keycloak_duration},
-        'stalwart': {'healthy': stalwart_health, 'duration': stalwart_duration},
-        'redis': {'healthy': redis_health, 'duration': redis_duration},
-        'database': {'healthy': postgres_health, 'duration': postgres_duration},
-        'accounts': {'healthy': accounts_health, 'duration': total_duration},
+            healthy, duration = future.result(timeout=max(deadline - time.perf_counter(), 0))
+        except FutureTimeoutError:
+            logging.warning(f'Health check for {name} timed out')
+            healthy, duration = False, time.perf_counter() - start
+        connection_stats[name] = {'healthy': healthy, 'duration': duration}
+
+    connection_stats['accounts'] = {
+        'healthy': all(stats['healthy'] for stats in connection_stats.values()),
+        'duration': time.perf_counter() - start,
     }
+    return connection_stats
+
+
+def get_health_stats() -> dict:
+    """Return the dependency health results, re-running the checks at most every HEALTH_CHECK_CACHE_TTL_IN_SECONDS.
+
+    The results are cached in process rather than in redis, since redis is one of the dependencies being checked."""
+    global _cached_health
+
+    with _health_lock:
+        if _cached_health and _cached_health[0] > time.monotonic():
+            return _cached_health[1]
+
+        connection_stats = _run_health_checks()
+        _cached_health = (time.monotonic() + settings.HEALTH_CHECK_CACHE_TTL_IN_SECONDS, connection_stats)
+        return connection_stats
+
+
+def health_check(request: HttpRequest):
+    """Prove the service is responsive."""
+    return JsonResponse(get_health_stats())
+
+
+def health_live(request: HttpRequest):
+    """Liveness probe, only proves the process is serving requests and never touches a dependency."""
+    return JsonResponse({'healthy': True})
+
+
+def health_ready(request: HttpRequest):
+    """Readiness probe, same results as ``health_check`` but responds with a 503 if any dependency is unhealthy."""
+    connection_stats = get_health_stats()
+    return JsonResponse(connection_stats, status=200 if connection_stats['accounts']['healthy'] else 503)
+
+
+def _is_metrics_scraper(request: HttpRequest) -> bool:
+    token = settings.METRICS_AUTH_TOKEN
+    if not token:
+        return settings.IS_DEV
+
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), token.encode())
+
+
+def metrics(request: HttpRequest):
+    """Expose Prometheus metrics for scraping, from every worker process when running in multiprocess mode.
+
+    Only served to requests bearing METRICS_AUTH_TOKEN, since the metrics reveal traffic and dependency health."""
+    if not _is_metrics_scraper(request):
+        return HttpResponseForbidden()
 
-    return JsonResponse(connection_stats)
+    return HttpResponse(generate_latest(get_metrics_registry()), content_type=CONTENT_TYPE_LATEST)
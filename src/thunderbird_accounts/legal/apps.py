@@ -5,3 +5,9 @@ class LegalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'thunderbird_accounts.legal'
     verbose_name = 'Legal'
+
+    def ready(self):
+        # Import here so Django finishes app loading before signal registration.
+        from thunderbird_accounts.legal.signals import register_legal_docs_cache_handlers
+
+        register_legal_docs_cache_handlers()
@@ -0,0 +1,138 @@
+"""Cached bundle of the current legal documents.
+
+The current documents and their rendered HTML only change when ``convert_legal_docs`` regenerates the HTML or an
+admin saves a ``LegalDocument``, yet every ``get_current_legal_docs`` request used to query them and render each
+template. The documents' metadata and HTML are cached per locale along with an ETag of their content. Entries are keyed
+by a hash of the legal HTML files this process serves and by a cache version that ``invalidate_legal_docs_cache`` bumps
+whenever a document is saved or deleted, which drops every locale at once. Entries expire after
+LEGAL_DOCS_CACHE_TTL_IN_SECONDS either way, so replaced ones don't linger.
+
+Keying by the files means that during a rolling deploy, pods still running the previous image keep to their own entries
+rather than caching old HTML where the new pods look. The cache is warmed on deploy with ``manage.py warm_legal_docs``.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import uuid
+from pathlib import Path
+
+import sentry_sdk
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+
+from thunderbird_accounts.legal.models import LegalDocument
+
+
+def _version_key() -> str:
+    return f'{settings.LEGAL_DOCS_CACHE_KEY}:version'
+
+
+def _bundle_key(version: str, locale: str) -> str:
+    return f'{settings.LEGAL_DOCS_CACHE_KEY}:{version}:{_legal_files_hash()}:{locale}'
+
+
+def _legal_templates_path() -> Path:
+    return Path(apps.get_app_config('legal').path, 'templates')
+
+
+@functools.cache
+def _legal_files_hash() -> str:
+    """Hash the legal HTML files on disk, which only change with a new image or ``convert_legal_docs``."""
+    legal_templates_path = _legal_templates_path()
+    files_hash = hashlib.sha256()
+    for path in sorted(legal_templates_path.rglob('*.html')):
+        files_hash.update(str(path.relative_to(legal_templates_path)).encode())
+        files_hash.update(path.read_bytes())
+    return files_hash.hexdigest()[:16]
+
+
+def _read_legal_content(content_path: str, locale: str) -> str:
+    """Read pre-rendered HTML for a legal document.
+
+    Unsupported locales use ``settings.DEFAULT_LANGUAGE``. If the requested
+    locale file is missing but the default-language file exists in the same
+    directory, that file is returned instead.
+    """
+    if locale not in settings.SUPPORTED_LEGAL_LANGUAGES:
+        locale = settings.DEFAULT_LANGUAGE
+
+    legal_templates_path = _legal_templates_path()
+
+    doc_path = Path(legal_templates_path, content_path, f'{locale}.html').resolve()
+    default_path = Path(legal_templates_path, content_path, f'{settings.DEFAULT_LANGUAGE}.html').resolve()
+
+    if not doc_path.is_relative_to(legal_templates_path) or not default_path.is_relative_to(legal_templates_path):
+        sentry_sdk.set_context(
+            'legal_content_paths',
+            {
+                'doc_path': str(doc_path),
+                'default_path': str(default_path),
+            },
+        )
+        logging.error('directory traversal attack!')
+        return ''
+
+    try:
+        return get_template(str(doc_path)).render()
+    except TemplateDoesNotExist as ex:
+        logging.error(f'Legal content file not found: {ex}. Looked for it in: {ex.tried}')
+        return get_template(str(default_path)).render()
+
+
+def build_legal_docs_bundle(locale: str) -> dict:
+    """Return the current legal documents with their HTML for a locale, and an ETag of the lot."""
+    documents = [
+        {
+            'uuid': str(doc.uuid),
+            'document_type': doc.document_type,
+            'version': doc.version,
+            'content': _read_legal_content(doc.content_path, locale),
+        }
+        for doc in LegalDocument.objects.filter(is_current=True)
+    ]
+    etag = hashlib.sha256(json.dumps(documents, sort_keys=True).encode()).hexdigest()
+    return {'documents': documents, 'etag': etag}
+
+
+def get_legal_docs_bundle(locale: str) -> dict:
+    """Return the current legal documents bundle for a locale, from the cache when LEGAL_DOCS_CACHE_ENABLED."""
+    if not settings.LEGAL_DOCS_CACHE_ENABLED:
+        return build_legal_docs_bundle(locale)
+
+    # Unsupported locales all render the default language, so they share its entry
+    if locale not in settings.SUPPORTED_LEGAL_LANGUAGES:
+        locale = settings.DEFAULT_LANGUAGE
+
+    version = cache.get(_version_key())
+    if version is None:
+        version = invalidate_legal_docs_cache()
+
+    key = _bundle_key(version, locale)
+    bundle = cache.get(key)
+    if bundle is None:
+        bundle = build_legal_docs_bundle(locale)
+        cache.set(key, bundle, settings.LEGAL_DOCS_CACHE_TTL_IN_SECONDS)
+
+    return bundle
+
+
+def invalidate_legal_docs_cache() -> str:
+    """Drop every locale's cached bundle by moving to a new cache version, and return that version."""
+    # The HTML files may have just been regenerated
+    _legal_files_hash.cache_clear()
+    version = uuid.uuid4().hex
+    cache.set(_version_key(), version, settings.LEGAL_DOCS_CACHE_TTL_IN_SECONDS)
+    return version
+
+
+def warm_legal_docs_cache() -> list[str]:
+    """Rebuild the cached bundle for every supported locale, returning the locales warmed."""
+    invalidate_legal_docs_cache()
+    for locale in settings.SUPPORTED_LEGAL_LANGUAGES:
+        get_legal_docs_bundle(locale)
+    return list(settings.SUPPORTED_LEGAL_LANGUAGES)
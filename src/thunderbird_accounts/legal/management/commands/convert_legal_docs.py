@@ -13,6 +13,8 @@ import markdown
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
+from thunderbird_accounts.legal.documents import invalidate_legal_docs_cache
+
 
 class Command(BaseCommand):
     """
@@ -58,3 +60,6 @@ class Command(BaseCommand):
 
             rel_path = md_file.relative_to(settings.ASSETS_ROOT)
             self.stdout.write(self.style.SUCCESS(f'Converted {rel_path} -> {html_file.name}'))
+
+        # Serve the regenerated HTML instead of what's cached
+        invalidate_legal_docs_cache()
@@ -0,0 +1,30 @@
+"""
+Rebuilds the cached current legal documents for every supported locale.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from thunderbird_accounts.legal.documents import warm_legal_docs_cache
+
+
+class Command(BaseCommand):
+    """
+    Usage:
+
+    .. code-block:: shell
+
+        python manage.py warm_legal_docs
+
+    """
+
+    help = 'Rebuilds the cached current legal documents for every supported locale.'
+
+    def handle(self, *args, **options):
+        if not settings.LEGAL_DOCS_CACHE_ENABLED:
+            self.stdout.write(self.style.WARNING('LEGAL_DOCS_CACHE_ENABLED is not set, skipping.'))
+            return
+
+        locales = warm_legal_docs_cache()
+
+        self.stdout.write(self.style.SUCCESS(f'Cached the current legal documents for {", ".join(locales)}.'))
@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+
+def remove_duplicate_acceptances(apps, schema_editor):
+    """Keep the first acceptance of each document per user, so the unique constraint can be added."""
+    LegalDocumentResponse = apps.get_model('legal', 'LegalDocumentResponse')
+
+    seen = set()
+    duplicate_ids = []
+    responses = (
+        LegalDocumentResponse.objects.filter(action='accepted')
+        .order_by('created_at')
+        .values_list('uuid', 'user_id', 'document_id')
+    )
+    for response_id, user_id, document_id in responses.iterator():
+        if (user_id, document_id) in seen:
+            duplicate_ids.append(response_id)
+        else:
+            seen.add((user_id, document_id))
+
+    LegalDocumentResponse.objects.filter(uuid__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('legal', '0002_seed_initial_documents'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_acceptances, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='legaldocumentresponse',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('action', 'accepted')),
+                fields=('user', 'document'),
+                name='unique_accepted_response',
+            ),
+        ),
+    ]
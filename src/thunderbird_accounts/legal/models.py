@@ -69,6 +69,14 @@ class LegalDocumentResponse(BaseModel):
     )
 
     class Meta:
+        constraints = [
+            # Declines are recorded every time, but a document only needs accepting once.
+            models.UniqueConstraint(
+                fields=['user', 'document'],
+                condition=models.Q(action='accepted'),
+                name='unique_accepted_response',
+            ),
+        ]
         indexes = [
             *BaseModel.Meta.indexes,
             models.Index(fields=['user', 'document']),
@@ -0,0 +1,199 @@
+"""Write-behind buffer for legal document acceptances.
+
+Publishing a new TOS or privacy notice has every active user accept it at their next login, at roughly the same time.
+With LEGAL_RESPONSE_WRITE_BEHIND_ENABLED, acceptances are pushed to a buffer in the cache (Redis outside of tests)
+instead of the database, and the ``flush_legal_responses`` task writes them in batches every
+LEGAL_RESPONSE_WRITE_BEHIND_FLUSH_INTERVAL_IN_SECONDS. Until then each buffered acceptance is also marked as pending
+for its user, and ``get_accepted_document_ids`` counts it as accepted so the user isn't asked again. A buffered
+response's ``created_at`` is when its batch was written, at most a flush interval after the user accepted.
+
+The buffer is a run of numbered slots: writers claim the next slot with ``cache.incr`` and store their rows in it, and
+the flush works forward from the last slot it wrote. A slot that has been claimed but is still empty is waited for
+once, then skipped, so a writer that died in between can't stall the buffer. Skipped slots are checked again on each
+flush and written if their rows have turned up since, until LEGAL_RESPONSE_WRITE_BEHIND_PENDING_TTL_IN_SECONDS after
+they were skipped, when they are given up on.
+
+Acceptances of users or documents deleted before the flush are dropped. Declines are rare, so they are always written
+straight away.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from thunderbird_accounts.authentication.models import User
+from thunderbird_accounts.legal.models import LegalDocument, LegalDocumentResponse
+
+
+def _key(name: str) -> str:
+    return f'{settings.LEGAL_RESPONSE_WRITE_BEHIND_CACHE_KEY}:{name}'
+
+
+def _slot_key(slot: int) -> str:
+    return _key(f'slot:{slot}')
+
+
+def _pending_key(user_id, document_id) -> str:
+    return _key(f'pending:{user_id}:{document_id}')
+
+
+def is_write_behind_enabled() -> bool:
+    return settings.LEGAL_RESPONSE_WRITE_BEHIND_ENABLED
+
+
+def get_accepted_document_ids(user, document_ids) -> set[str]:
+    """Return which of these documents the user has accepted, including acceptances still in the buffer."""
+    document_ids = [str(document_id) for document_id in document_ids]
+
+    accepted = {
+        str(document_id)
+        for document_id in LegalDocumentResponse.objects.filter(
+            user=user,
+            document_id__in=document_ids,
+            action=LegalDocumentResponse.Action.ACCEPTED,
+        ).values_list('document_id', flat=True)
+    }
+
+    if is_write_behind_enabled():
+        pending = cache.get_many([_pending_key(user.pk, document_id) for document_id in document_ids])
+        accepted |= {document_id for document_id in document_ids if _pending_key(user.pk, document_id) in pending}
+
+    return accepted
+
+
+def buffer_acceptances(responses: list[LegalDocumentResponse]):
+    """Queue unsaved ACCEPTED responses for the next flush, stamping them with the time they were accepted for the
+    caller's response."""
+    if not responses:
+        return
+
+    accepted_at = timezone.now()
+    for response in responses:
+        response.created_at = accepted_at
+        response.updated_at = accepted_at
+
+    rows = [
+        {
+            'uuid': response.uuid,
+            'user_id': response.user_id,
+            'document_id': response.document_id,
+            'action': response.action,
+            'source_context': response.source_context,
+        }
+        for response in responses
+    ]
+
+    cache.add(_key('tail'), 0, None)
+    slot = cache.incr(_key('tail'))
+    cache.set(_slot_key(slot), rows, None)
+    cache.set_many(
+        {_pending_key(row['user_id'], row['document_id']): True for row in rows},
+        settings.LEGAL_RESPONSE_WRITE_BEHIND_PENDING_TTL_IN_SECONDS,
+    )
+
+
+def flush_buffered_acceptances() -> int:
+    """Write buffered acceptances to the database in batches, returning how many were written.
+
+    Only one flush runs at a time; a call made while another is running returns 0."""
+    if not cache.add(_key('flush_lock'), True, settings.LEGAL_RESPONSE_WRITE_BEHIND_FLUSH_LOCK_TIMEOUT_IN_SECONDS):
+        return 0
+
+    try:
+        return _flush()
+    finally:
+        cache.delete(_key('flush_lock'))
+
+
+def _write_slots(slots: list[int], entries: dict) -> int:
+    """Write the rows of these filled slots and drop them from the buffer, returning how many rows were written."""
+    rows = [row for slot in slots for row in entries[_slot_key(slot)]]
+
+    # A user or document can be deleted before the flush, and one foreign key error would fail the whole batch
+    user_ids = set(User.objects.filter(pk__in={row['user_id'] for row in rows}).values_list('pk', flat=True))
+    document_ids = set(
+        LegalDocument.objects.filter(pk__in={row['document_id'] for row in rows}).values_list('pk', flat=True)
+    )
+    valid_rows = [row for row in rows if row['user_id'] in user_ids and row['document_id'] in document_ids]
+    if len(valid_rows) < len(rows):
+        logging.warning(
+            f'flush_buffered_acceptances: dropping {len(rows) - len(valid_rows)} acceptances of deleted users or '
+            f'documents'
+        )
+
+    # The unique constraint on acceptances drops any that were also written directly
+    LegalDocumentResponse.objects.bulk_create(
+        [LegalDocumentResponse(**row) for row in valid_rows],
+        ignore_conflicts=True,
+    )
+    cache.delete_many(
+        [_slot_key(slot) for slot in slots] + [_pending_key(row['user_id'], row['document_id']) for row in rows]
+    )
+    return len(valid_rows)
+
+
+def _flush_skipped() -> int:
+    """Write skipped slots whose rows have turned up since, and give up on those that have been empty too long."""
+    skipped = cache.get(_key('skipped'), {})
+    if not skipped:
+        return 0
+
+    entries = cache.get_many([_slot_key(slot) for slot in skipped])
+    filled = [slot for slot in skipped if _slot_key(slot) in entries]
+    written = _write_slots(filled, entries) if filled else 0
+
+    given_up_before = time.time() - settings.LEGAL_RESPONSE_WRITE_BEHIND_PENDING_TTL_IN_SECONDS
+    given_up = [slot for slot, skipped_at in skipped.items() if slot not in filled and skipped_at < given_up_before]
+    if given_up:
+        logging.error(f'flush_buffered_acceptances: slots {given_up} were never filled, giving up on them')
+        # In case a writer stores its rows after all
+        cache.delete_many([_slot_key(slot) for slot in given_up])
+
+    cache.set(
+        _key('skipped'),
+        {slot: skipped_at for slot, skipped_at in skipped.items() if slot not in filled and slot not in given_up},
+        None,
+    )
+    return written
+
+
+def _flush() -> int:
+    written = _flush_skipped()
+    head = cache.get(_key('head'), 0)
+    tail = cache.get(_key('tail'), 0)
+
+    while head < tail:
+        slots = range(head + 1, min(tail, head + settings.LEGAL_RESPONSE_WRITE_BEHIND_BATCH_SIZE) + 1)
+        entries = cache.get_many([_slot_key(slot) for slot in slots])
+
+        # Stop at the first claimed slot whose writer hasn't stored its rows yet
+        ready = []
+        for slot in slots:
+            if _slot_key(slot) not in entries:
+                break
+            ready.append(slot)
+
+        if not ready:
+            if cache.get(_key('stalled')) != head + 1:
+                cache.set(_key('stalled'), head + 1, None)
+                break
+
+            logging.warning(f'flush_buffered_acceptances: slot {head + 1} is still empty, skipping it')
+            head += 1
+            skipped = cache.get(_key('skipped'), {})
+            skipped[head] = time.time()
+            cache.set(_key('skipped'), skipped, None)
+            cache.set(_key('head'), head, None)
+            continue
+
+        written += _write_slots(ready, entries)
+        head = ready[-1]
+        cache.set(_key('head'), head, None)
+
+        if len(ready) < len(slots):
+            break
+
+    return written
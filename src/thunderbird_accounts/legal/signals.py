@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+
+from thunderbird_accounts.legal.documents import invalidate_legal_docs_cache
+
+
+def legal_document_changed(sender, instance, **kwargs):
+    invalidate_legal_docs_cache()
+
+
+def register_legal_docs_cache_handlers():
+    from thunderbird_accounts.legal.models import LegalDocument
+
+    post_save.connect(
+        legal_document_changed,
+        sender=LegalDocument,
+        dispatch_uid='thunderbird_accounts.legal.legal_document_saved',
+    )
+    post_delete.connect(
+        legal_document_changed,
+        sender=LegalDocument,
+        dispatch_uid='thunderbird_accounts.legal.legal_document_deleted',
+    )
@@ -0,0 +1,15 @@
+from celery import shared_task
+
+from thunderbird_accounts.core.types import TaskReturnStatus
+from thunderbird_accounts.legal.responses import flush_buffered_acceptances
+
+
+@shared_task(bind=True)
+def flush_legal_responses(self):
+    """Write the legal document acceptances buffered in write-behind mode to the database."""
+    written = flush_buffered_acceptances()
+
+    return {
+        'task_status': TaskReturnStatus.SUCCESS,
+        'written': written,
+    }
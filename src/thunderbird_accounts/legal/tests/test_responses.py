@@ -0,0 +1,184 @@
+import json
+import uuid
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, Client as RequestClient, override_settings
+from django.urls import reverse
+
+from thunderbird_accounts.authentication.models import User
+from thunderbird_accounts.core.tests.utils import oidc_force_login
+from thunderbird_accounts.legal.models import LegalDocument, LegalDocumentResponse
+from thunderbird_accounts.legal.responses import (
+    buffer_acceptances,
+    flush_buffered_acceptances,
+    get_accepted_document_ids,
+)
+from thunderbird_accounts.subscription.models import Subscription
+
+
+@override_settings(LEGAL_RESPONSE_WRITE_BEHIND_ENABLED=True)
+class WriteBehindAcceptanceTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        LegalDocument.objects.all().delete()
+        self.client = RequestClient()
+        self.user = User.objects.create(username=f'writebehind@{settings.PRIMARY_EMAIL_DOMAIN}', oidc_id='wb-1')
+        self.tos = LegalDocument.objects.create(
+            document_type=LegalDocument.DocumentType.TOS,
+            version='2.0',
+            is_current=True,
+            content_path='tos/v2.0',
+        )
+        self.privacy = LegalDocument.objects.create(
+            document_type=LegalDocument.DocumentType.PRIVACY,
+            version='2.0',
+            is_current=True,
+            content_path='privacy/v2.0',
+        )
+        self.document_ids = [self.tos.pk, self.privacy.pk]
+        oidc_force_login(self.client, self.user)
+
+    def tearDown(self):
+        cache.clear()
+        super().tearDown()
+
+    def _accept(self):
+        payload = json.dumps({'source_context': 'sign-up'})
+        return self.client.post(reverse('legal_accept'), data=payload, content_type='application/json')
+
+    def test_acceptances_are_buffered_until_flushed(self):
+        response = self._accept()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['responses']), 2)
+
+        self.assertFalse(LegalDocumentResponse.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            get_accepted_document_ids(self.user, self.document_ids), {str(self.tos.pk), str(self.privacy.pk)}
+        )
+
+        self.assertEqual(flush_buffered_acceptances(), 2)
+
+        responses = LegalDocumentResponse.objects.filter(user=self.user, action=LegalDocumentResponse.Action.ACCEPTED)
+        self.assertEqual(responses.count(), 2)
+        self.assertEqual(set(responses.values_list('source_context', flat=True)), {'sign-up'})
+        self.assertEqual(flush_buffered_acceptances(), 0)
+
+    @patch('thunderbird_accounts.legal.documents._read_legal_content', return_value='<h1>Content</h1>')
+    def test_buffered_acceptances_are_not_asked_for_again(self, mock_read):
+        self._accept()
+
+        response = self._accept()
+        self.assertEqual(json.loads(response.content)['responses'], [])
+
+        response = self.client.get(reverse('legal_current'))
+        self.assertTrue(all(doc['accepted'] for doc in json.loads(response.content)['documents']))
+
+        flush_buffered_acceptances()
+        self.assertEqual(LegalDocumentResponse.objects.filter(user=self.user).count(), 2)
+
+    def test_flush_skips_acceptances_already_written(self):
+        self._accept()
+        LegalDocumentResponse.objects.create(
+            user=self.user,
+            document=self.tos,
+            action=LegalDocumentResponse.Action.ACCEPTED,
+        )
+
+        flush_buffered_acceptances()
+
+        self.assertEqual(LegalDocumentResponse.objects.filter(user=self.user, document=self.tos).count(), 1)
+        self.assertEqual(LegalDocumentResponse.objects.filter(user=self.user, document=self.privacy).count(), 1)
+
+    def test_flush_writes_in_batches(self):
+        users = [
+            User.objects.create(username=f'writebehind{i}@{settings.PRIMARY_EMAIL_DOMAIN}', oidc_id=f'wb-batch-{i}')
+            for i in range(3)
+        ]
+        for user in users:
+            buffer_acceptances(
+                [
+                    LegalDocumentResponse(user=user, document=self.tos, action=LegalDocumentResponse.Action.ACCEPTED),
+                ]
+            )
+
+        # 2 batches x (1 user lookup + 1 document lookup + 1 insert)
+        with override_settings(LEGAL_RESPONSE_WRITE_BEHIND_BATCH_SIZE=2):
+            with self.assertNumQueries(6):
+                self.assertEqual(flush_buffered_acceptances(), 3)
+
+    def test_flush_waits_for_then_skips_an_empty_slot(self):
+        # A writer claimed slot 1 but never stored its rows
+        cache.add(f'{settings.LEGAL_RESPONSE_WRITE_BEHIND_CACHE_KEY}:tail', 0, None)
+        cache.incr(f'{settings.LEGAL_RESPONSE_WRITE_BEHIND_CACHE_KEY}:tail')
+        self._accept()
+
+        self.assertEqual(flush_buffered_acceptances(), 0)
+        self.assertEqual(flush_buffered_acceptances(), 2)
+        self.assertEqual(LegalDocumentResponse.objects.filter(user=self.user).count(), 2)
+
+    def test_flush_writes_a_skipped_slot_filled_later(self):
+        cache.add(f'{settings.LEGAL_RESPONSE_WRITE_BEHIND_CACHE_KEY}:tail', 0, None)
+        cache.incr(f'{settings.LEGAL_RESPONSE_WRITE_BEHIND_CACHE_KEY}:tail')
+        flush_buffered_acceptances()
+        flush_buffered_acceptances()
+
+        # The writer of slot 1 stores its rows after the flush has moved past it
+        cache.set(
+            f'{settings.LEGAL_RESPONSE_WRITE_BEHIND_CACHE_KEY}:slot:1',
+            [
+                {
+                    'uuid': uuid.uuid4(),
+                    'user_id': self.user.pk,
+                    'document_id': self.tos.pk,
+                    'action': LegalDocumentResponse.Action.ACCEPTED,
+                    'source_context': 'sign-up',
+                }
+            ],
+            None,
+        )
+
+        self.assertEqual(flush_buffered_acceptances(), 1)
+        self.assertTrue(LegalDocumentResponse.objects.filter(user=self.user, document=self.tos).exists())
+        self.assertIsNone(cache.get(f'{settings.LEGAL_RESPONSE_WRITE_BEHIND_CACHE_KEY}:slot:1'))
+        self.assertEqual(flush_buffered_acceptances(), 0)
+
+    def test_flush_gives_up_on_a_skipped_slot_that_stays_empty(self):
+        cache.add(f'{settings.LEGAL_RESPONSE_WRITE_BEHIND_CACHE_KEY}:tail', 0, None)
+        cache.incr(f'{settings.LEGAL_RESPONSE_WRITE_BEHIND_CACHE_KEY}:tail')
+        flush_buffered_acceptances()
+        flush_buffered_acceptances()
+
+        with override_settings(LEGAL_RESPONSE_WRITE_BEHIND_PENDING_TTL_IN_SECONDS=-1):
+            with self.assertLogs(level='ERROR'):
+                flush_buffered_acceptances()
+
+        self.assertEqual(cache.get(f'{settings.LEGAL_RESPONSE_WRITE_BEHIND_CACHE_KEY}:skipped'), {})
+
+    def test_flush_drops_acceptances_of_deleted_users(self):
+        deleted_user = User.objects.create(username=f'deleted@{settings.PRIMARY_EMAIL_DOMAIN}', oidc_id='wb-deleted')
+        buffer_acceptances(
+            [LegalDocumentResponse(user=deleted_user, document=self.tos, action=LegalDocumentResponse.Action.ACCEPTED)]
+        )
+        self._accept()
+        deleted_user.delete()
+
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(flush_buffered_acceptances(), 2)
+
+        self.assertEqual(LegalDocumentResponse.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(flush_buffered_acceptances(), 0)
+
+    def test_declines_are_written_directly(self):
+        # Give user an active subscription so decline doesn't delete user
+        Subscription.objects.create(user=self.user, status=Subscription.StatusValues.ACTIVE)
+
+        payload = json.dumps({'source_context': 'dashboard'})
+        self.client.post(reverse('legal_decline'), data=payload, content_type='application/json')
+
+        self.assertEqual(
+            LegalDocumentResponse.objects.filter(user=self.user, action=LegalDocumentResponse.Action.DECLINED).count(),
+            2,
+        )
@@ -4,13 +4,17 @@ import json
 from unittest.mock import patch
 
 from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase, Client as RequestClient, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from thunderbird_accounts.authentication.models import User
 from thunderbird_accounts.core.tests.utils import oidc_force_login
 from thunderbird_accounts.legal.models import LegalDocument, LegalDocumentResponse
-from thunderbird_accounts.legal.views import _read_legal_content
+from thunderbird_accounts.legal import documents
+from thunderbird_accounts.legal.documents import _read_legal_content
 from thunderbird_accounts.mail.models import Account, Email
 from thunderbird_accounts.subscription.models import Subscription
 
@@ -72,7 +76,7 @@ class GetCurrentLegalDocsTestCase(LegalDocCleanSlateTestCase):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, 302)
 
-    @patch('thunderbird_accounts.legal.views._read_legal_content', return_value='<h1>Mock content</h1>')
+    @patch('thunderbird_accounts.legal.documents._read_legal_content', return_value='<h1>Mock content</h1>')
     def test_returns_current_docs_with_accepted_status(self, mock_read):
         oidc_force_login(self.client, self.user)
 
@@ -110,7 +114,7 @@ class GetCurrentLegalDocsTestCase(LegalDocCleanSlateTestCase):
         self.assertEqual(tos_doc['content'], '<h1>Mock content</h1>')
         self.assertEqual(tos_doc['version'], '2.0')
 
-    @patch('thunderbird_accounts.legal.views._read_legal_content', return_value='')
+    @patch('thunderbird_accounts.legal.documents._read_legal_content', return_value='')
     def test_returns_empty_list_when_no_current_docs(self, mock_read):
         oidc_force_login(self.client, self.user)
 
@@ -126,7 +130,7 @@ class GetCurrentLegalDocsTestCase(LegalDocCleanSlateTestCase):
         data = json.loads(response.content)
         self.assertEqual(data['documents'], [])
 
-    @patch('thunderbird_accounts.legal.views._read_legal_content', return_value='<h1>Content</h1>')
+    @patch('thunderbird_accounts.legal.documents._read_legal_content', return_value='<h1>Content</h1>')
     def test_passes_locale_param(self, mock_read):
         oidc_force_login(self.client, self.user)
 
@@ -140,7 +144,7 @@ class GetCurrentLegalDocsTestCase(LegalDocCleanSlateTestCase):
         self.client.get(self.url + '?locale=de')
         mock_read.assert_called_with('tos/v2.0', 'de')
 
-    @patch('thunderbird_accounts.legal.views._read_legal_content', return_value='<h1>Content</h1>')
+    @patch('thunderbird_accounts.legal.documents._read_legal_content', return_value='<h1>Content</h1>')
     def test_defaults_locale_to_en(self, mock_read):
         oidc_force_login(self.client, self.user)
 
@@ -159,7 +163,7 @@ class GetCurrentLegalDocsTestCase(LegalDocCleanSlateTestCase):
         response = self.client.post(self.url, data='{}', content_type='application/json')
         self.assertEqual(response.status_code, 405)
 
-    @patch('thunderbird_accounts.legal.views._read_legal_content', return_value='<h1>Content</h1>')
+    @patch('thunderbird_accounts.legal.documents._read_legal_content', return_value='<h1>Content</h1>')
     def test_declined_doc_not_counted_as_accepted(self, mock_read):
         oidc_force_login(self.client, self.user)
 
@@ -182,6 +186,129 @@ class GetCurrentLegalDocsTestCase(LegalDocCleanSlateTestCase):
         self.assertFalse(tos_doc['accepted'])
 
 
+@override_settings(LEGAL_DOCS_CACHE_ENABLED=True)
+class CachedLegalDocsTestCase(LegalDocCleanSlateTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = RequestClient()
+        self.user = User.objects.create(username=f'legalcache@{settings.PRIMARY_EMAIL_DOMAIN}', oidc_id='legal-cache')
+        self.url = reverse('legal_current')
+        self.tos = LegalDocument.objects.create(
+            document_type=LegalDocument.DocumentType.TOS,
+            version='2.0',
+            is_current=True,
+            content_path='tos/v2.0',
+        )
+        oidc_force_login(self.client, self.user)
+
+    def tearDown(self):
+        cache.clear()
+        super().tearDown()
+
+    @patch('thunderbird_accounts.legal.documents._read_legal_content', return_value='<h1>Content</h1>')
+    def test_renders_documents_once(self, mock_read):
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+
+        self.assertEqual(mock_read.call_count, 1)
+        self.assertEqual(json.loads(first.content), json.loads(second.content))
+
+    @patch('thunderbird_accounts.legal.documents._read_legal_content', return_value='<h1>Content</h1>')
+    def test_unsupported_locales_share_the_default_entry(self, mock_read):
+        self.client.get(self.url)
+        self.client.get(self.url + '?locale=not-a-language')
+
+        self.assertEqual(mock_read.call_count, 1)
+
+    @patch('thunderbird_accounts.legal.documents._read_legal_content', return_value='<h1>Content</h1>')
+    def test_revalidates_with_etag(self, mock_read):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    @patch('thunderbird_accounts.legal.documents._read_legal_content', return_value='<h1>Content</h1>')
+    def test_etag_changes_when_user_accepts(self, mock_read):
+        etag = self.client.get(self.url)['ETag']
+
+        LegalDocumentResponse.objects.create(
+            user=self.user,
+            document=self.tos,
+            action=LegalDocumentResponse.Action.ACCEPTED,
+        )
+
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(json.loads(response.content)['documents'][0]['accepted'])
+
+    @patch('thunderbird_accounts.legal.documents._read_legal_content', return_value='<h1>Content</h1>')
+    def test_saving_a_document_invalidates_the_cache(self, mock_read):
+        etag = self.client.get(self.url)['ETag']
+
+        LegalDocument.objects.create(
+            document_type=LegalDocument.DocumentType.TOS,
+            version='3.0',
+            is_current=True,
+            content_path='tos/v3.0',
+        )
+
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        docs = json.loads(response.content)['documents']
+        self.assertEqual([doc['version'] for doc in docs], ['3.0'])
+
+    @patch('thunderbird_accounts.legal.documents._read_legal_content', return_value='<h1>Content</h1>')
+    def test_deleting_a_document_invalidates_the_cache(self, mock_read):
+        self.client.get(self.url)
+
+        self.tos.delete()
+
+        response = self.client.get(self.url)
+        self.assertEqual(json.loads(response.content)['documents'], [])
+
+    @patch('thunderbird_accounts.legal.documents._read_legal_content')
+    def test_processes_with_other_html_use_their_own_entries(self, mock_read):
+        # e.g. pods still running the previous image during a rolling deploy
+        with patch('thunderbird_accounts.legal.documents._legal_files_hash', return_value='old-files'):
+            mock_read.return_value = '<h1>Old content</h1>'
+            self.client.get(self.url)
+
+        with patch('thunderbird_accounts.legal.documents._legal_files_hash', return_value='new-files'):
+            mock_read.return_value = '<h1>New content</h1>'
+            response = self.client.get(self.url)
+
+            self.assertEqual(json.loads(response.content)['documents'][0]['content'], '<h1>New content</h1>')
+
+        with patch('thunderbird_accounts.legal.documents._legal_files_hash', return_value='old-files'):
+            response = self.client.get(self.url)
+
+            self.assertEqual(json.loads(response.content)['documents'][0]['content'], '<h1>Old content</h1>')
+
+    @patch('thunderbird_accounts.legal.documents._read_legal_content', return_value='<h1>Content</h1>')
+    def test_entries_expire(self, mock_read):
+        with patch.object(cache, 'set', wraps=cache.set) as mock_set:
+            self.client.get(self.url)
+
+        self.assertTrue(mock_set.call_args_list)
+        for call in mock_set.call_args_list:
+            self.assertEqual(call.args[2], settings.LEGAL_DOCS_CACHE_TTL_IN_SECONDS)
+
+    def test_files_hash_follows_the_html_on_disk(self):
+        files_hash = documents._legal_files_hash()
+
+        with patch.object(Path, 'read_bytes', return_value=b'<h1>Regenerated</h1>'):
+            documents.invalidate_legal_docs_cache()
+            self.assertNotEqual(documents._legal_files_hash(), files_hash)
+
+        documents.invalidate_legal_docs_cache()
+        self.assertEqual(documents._legal_files_hash(), files_hash)
+
+
 class AcceptLegalDocsTestCase(LegalDocCleanSlateTestCase):
     def setUp(self):
         super().setUp()
@@ -288,6 +415,54 @@ class AcceptLegalDocsTestCase(LegalDocCleanSlateTestCase):
             2,
         )
 
+    def test_records_responses_in_one_insert(self):
+        oidc_force_login(self.client, self.user)
+
+        for document_type in LegalDocument.DocumentType:
+            LegalDocument.objects.create(
+                document_type=document_type,
+                version='2.0',
+                is_current=True,
+                content_path=f'{document_type}/v2.0',
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data='{}', content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        inserts = [
+            query
+            for query in queries
+            if query['sql'].startswith('INSERT') and LegalDocumentResponse._meta.db_table in query['sql']
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(LegalDocumentResponse.objects.filter(user=self.user).count(), 2)
+
+    def test_concurrent_accept_does_not_duplicate_responses(self):
+        oidc_force_login(self.client, self.user)
+
+        tos = LegalDocument.objects.create(
+            document_type=LegalDocument.DocumentType.TOS,
+            version='2.0',
+            is_current=True,
+            content_path='tos/v2.0',
+        )
+        LegalDocumentResponse.objects.create(
+            user=self.user,
+            document=tos,
+            action=LegalDocumentResponse.Action.ACCEPTED,
+        )
+
+        # Another request recorded the acceptance after this one checked for it
+        with patch('thunderbird_accounts.legal.views.get_accepted_document_ids', return_value=set()):
+            response = self.client.post(self.url, data='{}', content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(
+            LegalDocumentResponse.objects.filter(user=self.user, action=LegalDocumentResponse.Action.ACCEPTED).count(),
+            1,
+        )
+
     def test_decline_still_creates_duplicate_responses(self):
         """Decline responses are always recorded for audit purposes."""
         oidc_force_login(self.client, self.user)
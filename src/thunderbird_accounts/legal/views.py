@@ -1,54 +1,23 @@
-import sentry_sdk
-from django.apps import apps
-from django.template import TemplateDoesNotExist
-from django.template.loader import get_template
+import hashlib
 import json
-import logging
-from pathlib import Path
 
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import logout as django_logout
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.http import require_http_methods
 
 from thunderbird_accounts.authentication.utils import delete_user_data
+from thunderbird_accounts.legal.documents import get_legal_docs_bundle
 from thunderbird_accounts.legal.models import LegalDocument, LegalDocumentResponse
-
-
-def _read_legal_content(content_path: str, locale: str) -> str:
-    """Read pre-rendered HTML for a legal document.
-
-    Unsupported locales use ``settings.DEFAULT_LANGUAGE``. If the requested
-    locale file is missing but the default-language file exists in the same
-    directory, that file is returned instead.
-    """
-    if locale not in settings.SUPPORTED_LEGAL_LANGUAGES:
-        locale = settings.DEFAULT_LANGUAGE
-
-    legal_templates_path = Path(apps.get_app_config('legal').path, 'templates')
-
-    doc_path = Path(legal_templates_path, content_path, f'{locale}.html').resolve()
-    default_path = Path(legal_templates_path, content_path, f'{settings.DEFAULT_LANGUAGE}.html').resolve()
-
-    if not doc_path.is_relative_to(legal_templates_path) or not default_path.is_relative_to(legal_templates_path):
-        sentry_sdk.set_context(
-            'legal_content_paths',
-            {
-                'doc_path': str(doc_path),
-                'default_path': str(default_path),
-            },
-        )
-        logging.error('directory traversal attack!')
-        return ''
-
-    try:
-        return get_template(str(doc_path)).render()
-    except TemplateDoesNotExist as ex:
-        logging.error(f'Legal content file not found: {ex}. Looked for it in: {ex.tried}')
-        return get_template(str(default_path)).render()
+from thunderbird_accounts.legal.responses import (
+    buffer_acceptances,
+    get_accepted_document_ids,
+    is_write_behind_enabled,
+)
 
 
 def _record_response(request, action: str) -> JsonResponse:
@@ -56,42 +25,46 @@ def _record_response(request, action: str) -> JsonResponse:
 
     For acceptance, skips documents that the user has already accepted
     but we still want to record the decline action as many times as they declined.
+    Acceptances go through the write-behind buffer when it's enabled.
     """
     data = json.loads(request.body)
     source_context = data.get('source_context', '')
 
-    current_docs = LegalDocument.objects.filter(is_current=True)
+    current_docs = list(LegalDocument.objects.filter(is_current=True))
 
     if action == LegalDocumentResponse.Action.ACCEPTED:
-        already_accepted_ids = set(
-            LegalDocumentResponse.objects.filter(
-                user=request.user,
-                document__in=current_docs,
-                action=LegalDocumentResponse.Action.ACCEPTED,
-            ).values_list('document_id', flat=True)
-        )
-    else:
-        already_accepted_ids = set()
+        already_accepted_ids = get_accepted_document_ids(request.user, [doc.pk for doc in current_docs])
+        current_docs = [doc for doc in current_docs if str(doc.pk) not in already_accepted_ids]
 
-    created = []
-    for doc in current_docs:
-        if doc.pk in already_accepted_ids:
-            continue
-        response = LegalDocumentResponse.objects.create(
+    responses = [
+        LegalDocumentResponse(
             user=request.user,
             document=doc,
             action=action,
             source_context=source_context,
         )
-        created.append(
-            {
-                'document_type': doc.document_type,
-                'version': doc.version,
-                'action': response.action,
-                'responded_at': response.created_at.isoformat(),
-            }
+        for doc in current_docs
+    ]
+
+    if action == LegalDocumentResponse.Action.ACCEPTED and is_write_behind_enabled():
+        buffer_acceptances(responses)
+    else:
+        # A concurrent request may have recorded the same acceptance, the unique constraint drops the duplicate
+        LegalDocumentResponse.objects.bulk_create(
+            responses,
+            ignore_conflicts=action == LegalDocumentResponse.Action.ACCEPTED,
         )
 
+    created = [
+        {
+            'document_type': response.document.document_type,
+            'version': response.document.version,
+            'action': response.action,
+            'responded_at': response.created_at.isoformat(),
+        }
+        for response in responses
+    ]
+
     return JsonResponse({'responses': created})
 
 
@@ -99,33 +72,29 @@ def _record_response(request, action: str) -> JsonResponse:
 @require_http_methods(['GET'])
 def get_current_legal_docs(request):
     """Returns current TOS and Privacy documents with their pre-rendered HTML content
-    and whether the authenticated user has accepted them."""
-    current_docs = LegalDocument.objects.filter(is_current=True)
+    and whether the authenticated user has accepted them.
+
+    The documents come from the cached per-locale bundle, so only the acceptance lookup
+    hits the database. Clients can revalidate with If-None-Match and get a 304 back."""
     locale = request.GET.get('locale', settings.DEFAULT_LANGUAGE)
+    bundle = get_legal_docs_bundle(locale)
 
     accepted_doc_ids = set()
     if request.user.is_authenticated:
-        accepted_doc_ids = set(
-            LegalDocumentResponse.objects.filter(
-                user=request.user,
-                document__in=current_docs,
-                action=LegalDocumentResponse.Action.ACCEPTED,
-            ).values_list('document_id', flat=True)
-        )
+        accepted_doc_ids = get_accepted_document_ids(request.user, [doc['uuid'] for doc in bundle['documents']])
 
-    docs_data = []
-    for doc in current_docs:
-        docs_data.append(
-            {
-                'uuid': str(doc.uuid),
-                'document_type': doc.document_type,
-                'version': doc.version,
-                'content': _read_legal_content(doc.content_path, locale),
-                'accepted': doc.uuid in accepted_doc_ids,
-            }
-        )
+    # The ETag covers the user's acceptances too, so accepting the documents invalidates it
+    etag_source = ':'.join([bundle['etag'], *sorted(accepted_doc_ids)])
+    etag = f'"{hashlib.sha256(etag_source.encode()).hexdigest()}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        docs_data = [{**doc, 'accepted': doc['uuid'] in accepted_doc_ids} for doc in bundle['documents']]
+        response = JsonResponse({'documents': docs_data})
 
-    return JsonResponse({'documents': docs_data})
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @login_required
@@ -0,0 +1,52 @@
+"""Reuse of Appointment's CalDAV app password.
+
+Appointment may call ``appointment_caldav_setup`` every time it reconnects, and issuing a new app password means a
+deliberately slow hash plus a Stalwart write. With APPOINTMENT_CALDAV_REUSE_TTL_IN_SECONDS and a Fernet key in
+APPOINTMENT_CALDAV_REUSE_ENCRYPTION_KEY (see ``manage.py generate_key``) the issued password is kept in the cache,
+encrypted, for the TTL, and handed out again as long as Stalwart still has its secret.
+"""
+
+import hashlib
+from typing import Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _is_enabled() -> bool:
+    return bool(settings.APPOINTMENT_CALDAV_REUSE_TTL_IN_SECONDS and settings.APPOINTMENT_CALDAV_REUSE_ENCRYPTION_KEY)
+
+
+def _cache_key(primary_email: str) -> str:
+    email_hash = hashlib.sha256(primary_email.encode()).hexdigest()
+    return f'{settings.APPOINTMENT_CALDAV_REUSE_CACHE_KEY}:{email_hash}'
+
+
+def get_reusable_app_password(primary_email: str, current_secrets: list[str]) -> Optional[str]:
+    """Return the app password issued to this account earlier, if it's still one of the account's secrets."""
+    if not _is_enabled():
+        return None
+
+    cached = cache.get(_cache_key(primary_email))
+    if not cached or cached['secret'] not in current_secrets:
+        return None
+
+    try:
+        return Fernet(settings.APPOINTMENT_CALDAV_REUSE_ENCRYPTION_KEY).decrypt(cached['password']).decode()
+    except InvalidToken:
+        # Encrypted with a key that has since been rotated
+        return None
+
+
+def remember_app_password(primary_email: str, password: str, secret: str):
+    """Keep a newly issued app password, and the secret Stalwart stores for it, for reuse."""
+    if not _is_enabled():
+        return
+
+    encrypted = Fernet(settings.APPOINTMENT_CALDAV_REUSE_ENCRYPTION_KEY).encrypt(password.encode()).decode()
+    cache.set(
+        _cache_key(primary_email),
+        {'password': encrypted, 'secret': secret},
+        settings.APPOINTMENT_CALDAV_REUSE_TTL_IN_SECONDS,
+    )
@@ -4,7 +4,8 @@ from typing import Literal
 from thunderbird_accounts.mail.types.jmap import SessionResource, JMapRequest, Invocation, JMapResponse
 import enum
 import json
-import requests
+
+from thunderbird_accounts.infra.http import get_pooled_session
 
 
 class JMAPClient:
@@ -41,7 +42,7 @@ class JMAPClient:
         """Return the JMAP Session Resource as a Python dict"""
         if self.session:
             return self.session
-        r = requests.get(
+        r = get_pooled_session('stalwart').get(
             f'{self.base_url}/.well-known/jmap',
             headers={
                 'Content-Type': 'application/json',
@@ -104,7 +105,7 @@ class JMAPClient:
         if not self.api_url:
             raise RuntimeError('Session not available')
         logging.debug(f'[jmap_client.request] sending -> {(request_data.model_dump_json(exclude_none=True))}')
-        res = requests.request(
+        res = get_pooled_session('stalwart').request(
             url=self.api_url,
             method=method,
             headers={
@@ -85,6 +85,9 @@ class MailClientInterface:
     def save_app_password(self, principal_id: str, secret: str):
         raise NotImplementedError()
 
+    def replace_app_passwords(self, principal_id: str, old_secrets: list[str], secret: str):
+        raise NotImplementedError()
+
     def save_email_addresses(self, principal_id: str, emails: str | list[str]):
         raise NotImplementedError()
 
@@ -472,6 +472,22 @@ class MailClientLegacy(MailClientInterface):
             logging.error(f'[save_app_password] err: {data}')
             raise RuntimeError(data)
 
+    def replace_app_passwords(self, principal_id: str, old_secrets: list[str], secret: str):
+        """Removes ``old_secrets`` and adds ``secret`` to a principal's app passwords in a single update."""
+        response = self._update_principal(
+            principal_id,
+            [
+                *({'action': 'removeItem', 'field': 'secrets', 'value': old_secret} for old_secret in old_secrets),
+                {'action': 'addItem', 'field': 'secrets', 'value': secret},
+            ],
+        )
+        # Returns data: null on success...
+        data = response.json()
+        error = data.get('error')
+        if error:
+            logging.error(f'[replace_app_passwords] err: {data}')
+            raise RuntimeError(data)
+
     def save_email_addresses(self, principal_id: str, emails: str | list[str]):
         """Adds a new email address to a stalwart's individual principal by uuid."""
 
@@ -181,6 +181,10 @@ class EmailNotValidError(RuntimeError):
         return f'EmailNotValidError: {self.email}, {self.error_message}'
 
 
+class AppPasswordHashingBusyError(RuntimeError):
+    """Raises in utils.save_app_password when every hashing worker is busy and the queue is full"""
+
+
 class InvalidJMapResponseError(RuntimeError):
     """This is a generic pydantic response error. You should not get this, if you do there's a developer problem."""
 
@@ -1,19 +1,35 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.http import HttpRequest
 from thunderbird_accounts.mail.utils import fix_archives_folder
 
 
 class FixMissingArchivesFolderMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        self.fix_archives_folder_for_subscriber(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        # The checks below query the database and Stalwart, so they run off the event loop
+        await sync_to_async(self.fix_archives_folder_for_subscriber)(request)
+        return await self.get_response(request)
+
+    def fix_archives_folder_for_subscriber(self, request: HttpRequest):
         if request.user.is_authenticated and request.user.has_active_subscription:
             # This needs to be here for after they subscribe
             # we need their oidc access token which is only available on the request...
             self.check_if_we_need_to_fix_archives_folder(request)
 
-        return self.get_response(request)
-
     def check_if_we_need_to_fix_archives_folder(self, request: HttpRequest):
         oidc_access_token = request.session.get('oidc_access_token')
         if not oidc_access_token:
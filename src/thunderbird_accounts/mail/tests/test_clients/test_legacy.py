@@ -658,3 +658,29 @@ class TestMailClientBuildExpectedDNSRecords(SimpleTestCase):
         mx_record = next(record for record in result['dns_records'] if record['type'] == 'MX')
         self.assertEqual(mx_record['status'], 'conflict')
         self.assertEqual(mx_record['existing_values'], ['10 wrong.host.com'])
+
+
+@override_settings(STALWART_BASE_API_URL='http://stalwart.test', STALWART_API_AUTH_STRING='secret')
+class TestMailClientReplaceAppPasswords(SimpleTestCase):
+    @patch('thunderbird_accounts.mail.clients.mail_client_legacy.requests.patch')
+    def test_replaces_in_a_single_update(self, requests_patch_mock: MagicMock):
+        requests_patch_mock.return_value.json.return_value = {'data': None}
+
+        MailClient().replace_app_passwords('user@example.org', ['$app$label$old-1', '$app$label$old-2'], '$app$new')
+
+        requests_patch_mock.assert_called_once()
+        self.assertEqual(
+            requests_patch_mock.call_args.kwargs['json'],
+            [
+                {'action': 'removeItem', 'field': 'secrets', 'value': '$app$label$old-1'},
+                {'action': 'removeItem', 'field': 'secrets', 'value': '$app$label$old-2'},
+                {'action': 'addItem', 'field': 'secrets', 'value': '$app$new'},
+            ],
+        )
+
+    @patch('thunderbird_accounts.mail.clients.mail_client_legacy.requests.patch')
+    def test_error_raises(self, requests_patch_mock: MagicMock):
+        requests_patch_mock.return_value.json.return_value = {'error': 'notFound'}
+
+        with self.assertRaises(RuntimeError):
+            MailClient().replace_app_passwords('user@example.org', [], '$app$new')
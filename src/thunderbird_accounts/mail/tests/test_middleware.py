@@ -1,3 +1,4 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
 from django.contrib.auth.models import AnonymousUser
 from thunderbird_accounts.subscription.models import Subscription
 from thunderbird_accounts.mail.models import Account
@@ -293,3 +294,23 @@ class FixMissingArchivesFolderMiddlewareTestCase(TestCase):
         # Ensure account verified_archive_folder is still false
         account.refresh_from_db()
         self.assertFalse(account.verified_archive_folder)
+
+    @patch('thunderbird_accounts.mail.middleware.fix_archives_folder')
+    async def test_async_get_response(self, fix_archives_folder_mock: MagicMock, tiny_jmap_mock: MagicMock):
+        """Under ASGI the middleware is async itself, and still fixes the archives folder of a subscriber"""
+        user = await User.objects.acreate(username='test@example.org', email='test@example.com')
+        account = await Account.objects.acreate(name=user.username, user=user, verified_archive_folder=False)
+        await Subscription.objects.acreate(
+            paddle_id='foo', paddle_customer_id='bar', status=Subscription.StatusValues.ACTIVE, user=user
+        )
+
+        async def get_response(request):
+            return 'response'
+
+        middleware = FixMissingArchivesFolderMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        fake_request = await sync_to_async(self.build_request)(user, 'abc123')
+        self.assertEqual(await middleware(fake_request), 'response')
+
+        fix_archives_folder_mock.assert_called_once_with('abc123', account)
@@ -1,8 +1,13 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from django.contrib.auth.hashers import make_password
 from django.test import TestCase
 
 from thunderbird_accounts.authentication.models import User
-from thunderbird_accounts.mail.exceptions import EmailNotValidError
-from thunderbird_accounts.mail.utils import validate_email
+from thunderbird_accounts.mail.exceptions import AppPasswordHashingBusyError, EmailNotValidError
+from thunderbird_accounts.mail.utils import save_app_password, validate_email
 
 
 class ValidateEmailTestCase(TestCase):
@@ -99,3 +104,38 @@ class ValidateEmailTestCase(TestCase):
         """The overridden minimum is still enforced."""
         with self.assertRaises(EmailNotValidError):
             validate_email(self._email(''), min_length=1)
+
+
+class SaveAppPasswordTestCase(TestCase):
+    def test_hashes_on_the_hashing_pool(self):
+        hashing_threads = []
+
+        def _make_password(*args, **kwargs):
+            hashing_threads.append(threading.current_thread().name)
+            return make_password(*args, **kwargs)
+
+        with patch('thunderbird_accounts.mail.utils.make_password', side_effect=_make_password):
+            secret = save_app_password('label', 'password')
+
+        self.assertTrue(secret.startswith('$app$label$$argon2'))
+        self.assertEqual(len(hashing_threads), 1)
+        self.assertTrue(hashing_threads[0].startswith('app-password-hash'))
+
+    def test_full_queue_is_rejected(self):
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+
+        with (
+            patch(
+                'thunderbird_accounts.mail.utils._get_hashing_pool',
+                return_value=(executor, threading.BoundedSemaphore(1)),
+            ) as mock_get_pool,
+            patch('thunderbird_accounts.mail.utils.make_password') as mock_make_password,
+        ):
+            # Every slot is taken by hashes already running or queued
+            mock_get_pool.return_value[1].acquire()
+
+            with self.assertRaises(AppPasswordHashingBusyError):
+                save_app_password('label', 'password')
+
+        mock_make_password.assert_not_called()
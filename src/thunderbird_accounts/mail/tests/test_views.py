@@ -1,11 +1,14 @@
 import datetime
-from thunderbird_accounts.mail.exceptions import DomainNotFoundError
+from thunderbird_accounts.mail.exceptions import AppPasswordHashingBusyError, DomainNotFoundError
 from django.utils.crypto import get_random_string
 from thunderbird_accounts.subscription.models import Plan, Subscription
 import json
 import requests
 from unittest.mock import patch, Mock
 
+from cryptography.fernet import Fernet
+from django.core.cache import cache
+
 from django.conf import settings
 from django.test import TestCase, Client as RequestClient, override_settings, RequestFactory
 from django.urls import reverse
@@ -14,6 +17,7 @@ from django.utils.translation import gettext_lazy as _
 from thunderbird_accounts.authentication.models import User
 from thunderbird_accounts.core.tests.utils import oidc_force_login
 from thunderbird_accounts.mail.clients import DomainVerificationErrors, StaleDNSRecordCode
+from thunderbird_accounts.mail import caldav_credentials
 from thunderbird_accounts.mail.models import Account, Domain, Email
 from thunderbird_accounts.mail.views import (
     _is_transient_backend_error,
@@ -58,6 +62,19 @@ class AppPasswordApiTestCase(TestCase):
         mock_save_app_password.assert_called_once_with(self.primary_email, 'new-password')
         mock_instance.save_app_password.assert_called_once_with(self.primary_email, new_hash)
 
+    @patch('thunderbird_accounts.mail.views.utils.save_app_password', side_effect=AppPasswordHashingBusyError())
+    @patch('thunderbird_accounts.mail.views.MailClient')
+    def test_busy_hashing_pool_keeps_existing_app_passwords(self, mock_mail_client_cls, mock_save_app_password):
+        response = self.client.post(
+            self.url,
+            data=json.dumps({'name': self.primary_email, 'password': 'new-password'}),
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(json.loads(response.content.decode())['success'])
+        mock_mail_client_cls.assert_not_called()
+
     def test_name_and_password_are_required(self):
         response = self.client.post(
             self.url,
@@ -1411,11 +1428,13 @@ class AppointmentCalDAVSetupTestCase(TestCase):
         self.assertEqual(payload['app_password'], 'random-base64-password')
 
         mock_instance.get_account.assert_called_once_with(self.user.stalwart_primary_email)
-        mock_instance.delete_app_password.assert_called_once_with(
-            self.user.stalwart_primary_email, existing_app_password
-        )
         mock_save_app_password.assert_called_once_with(label, 'random-base64-password')
-        mock_instance.save_app_password.assert_called_once_with(self.user.stalwart_primary_email, new_hash)
+        # The old password is removed and the new one added in a single update
+        mock_instance.replace_app_passwords.assert_called_once_with(
+            self.user.stalwart_primary_email, [existing_app_password], new_hash
+        )
+        mock_instance.delete_app_password.assert_not_called()
+        mock_instance.save_app_password.assert_not_called()
 
     @override_settings(APPOINTMENT_CALDAV_SECRET='test-secret-123')
     @patch('thunderbird_accounts.mail.views.secrets.token_urlsafe')
@@ -1453,9 +1472,8 @@ class AppointmentCalDAVSetupTestCase(TestCase):
         self.assertEqual(payload['app_password'], 'random-base64-password')
 
         mock_instance.get_account.assert_called_once_with(self.user.stalwart_primary_email)
-        mock_instance.delete_app_password.assert_not_called()
         mock_save_app_password.assert_called_once_with(label, 'random-base64-password')
-        mock_instance.save_app_password.assert_called_once_with(self.user.stalwart_primary_email, new_hash)
+        mock_instance.replace_app_passwords.assert_called_once_with(self.user.stalwart_primary_email, [], new_hash)
 
     @override_settings(APPOINTMENT_CALDAV_SECRET='test-secret-123')
     @patch('thunderbird_accounts.mail.views.secrets.token_urlsafe')
@@ -1492,9 +1510,8 @@ class AppointmentCalDAVSetupTestCase(TestCase):
         self.assertTrue(payload['success'])
         self.assertEqual(payload['app_password'], 'random-base64-password')
 
-        mock_instance.delete_app_password.assert_not_called()
         mock_save_app_password.assert_called_once_with(label, 'random-base64-password')
-        mock_instance.save_app_password.assert_called_once_with(self.user.stalwart_primary_email, new_hash)
+        mock_instance.replace_app_passwords.assert_called_once_with(self.user.stalwart_primary_email, [], new_hash)
 
     @override_settings(APPOINTMENT_CALDAV_SECRET='test-secret-123')
     @patch('thunderbird_accounts.mail.views.AccountsOIDCBackend')
@@ -1521,6 +1538,49 @@ class AppointmentCalDAVSetupTestCase(TestCase):
         self.assertEqual(payload['error'], _('An error has occurred while setting up the Appointment CalDAV.'))
         mock_capture_exception.assert_called_once()
 
+    @override_settings(
+        APPOINTMENT_CALDAV_SECRET='test-secret-123',
+        APPOINTMENT_CALDAV_REUSE_TTL_IN_SECONDS=300,
+        APPOINTMENT_CALDAV_REUSE_ENCRYPTION_KEY=Fernet.generate_key().decode(),
+    )
+    @patch('thunderbird_accounts.mail.views.AccountsOIDCBackend')
+    @patch('thunderbird_accounts.mail.views.utils.save_app_password')
+    @patch('thunderbird_accounts.mail.views.MailClient')
+    def test_issued_app_password_is_reused(self, mock_mail_client_cls, mock_save_app_password, mock_backend_cls):
+        """Test that a repeat call returns the app password Stalwart still has instead of issuing a new one."""
+        cache.clear()
+        label = f'{settings.APPOINTMENT_APP_PASSWORD_PREFIX}{self.user.stalwart_primary_email}'
+        issued_hash = f'$app${label}$issued-hash'
+        mock_save_app_password.return_value = issued_hash
+        mock_backend_cls.return_value.get_user_from_access_token.return_value = self.user
+        mock_instance = mock_mail_client_cls.return_value
+        mock_instance.get_account.return_value = {'secrets': []}
+
+        def setup():
+            response = self.client.post(
+                self.url,
+                data=json.dumps({'appointment-secret': 'test-secret-123', 'oidc-access-token': self.access_token}),
+                content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 200)
+            return response.json()['app_password']
+
+        issued_password = setup()
+        # Stalwart now has the issued secret
+        mock_instance.get_account.return_value = {'secrets': [issued_hash]}
+
+        self.assertEqual(setup(), issued_password)
+        mock_save_app_password.assert_called_once()
+        mock_instance.replace_app_passwords.assert_called_once()
+        # The cached password is encrypted
+        cached = cache.get(caldav_credentials._cache_key(self.user.stalwart_primary_email))
+        self.assertNotIn(issued_password, cached['password'])
+
+        # Once the secret is gone from Stalwart a new password is issued
+        mock_instance.get_account.return_value = {'secrets': []}
+        self.assertNotEqual(setup(), issued_password)
+        self.assertEqual(mock_save_app_password.call_count, 2)
+
     @override_settings(APPOINTMENT_CALDAV_SECRET='test-secret-123')
     def test_invalid_json_body(self):
         """Test that invalid JSON body returns 400 error."""
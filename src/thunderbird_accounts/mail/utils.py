@@ -1,5 +1,9 @@
 import logging
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+
 import sentry_sdk
 from typing import Optional
 from requests.exceptions import HTTPError
@@ -9,11 +13,21 @@ from django.contrib.auth.hashers import make_password, identify_hasher
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 
-from thunderbird_accounts.mail.exceptions import EmailNotValidError
+from thunderbird_accounts.infra.metrics import (
+    APP_PASSWORD_HASH_DURATION,
+    APP_PASSWORD_HASH_QUEUE_TIME,
+    APP_PASSWORD_HASHES_REJECTED,
+)
+from thunderbird_accounts.mail.exceptions import AppPasswordHashingBusyError, EmailNotValidError
 from thunderbird_accounts.authentication.models import User
 from thunderbird_accounts.mail.models import Account
 from thunderbird_accounts.mail import tasks
 
+# App passwords are hashed on this pool, see save_app_password
+_hashing_executor: ThreadPoolExecutor | None = None
+_hashing_slots: threading.BoundedSemaphore | None = None
+_hashing_lock = threading.Lock()
+
 
 def validate_email(email: str, error_message: str | None = None, min_length: int | None = None) -> bool:
     """Validates the email and local part against Django's built-in email validation.
@@ -45,9 +59,45 @@ def validate_email(email: str, error_message: str | None = None, min_length: int
     return True
 
 
+def _get_hashing_pool() -> tuple[ThreadPoolExecutor, threading.BoundedSemaphore]:
+    global _hashing_executor, _hashing_slots
+
+    if _hashing_executor is None:
+        with _hashing_lock:
+            if _hashing_executor is None:
+                _hashing_slots = threading.BoundedSemaphore(
+                    settings.APP_PASSWORD_HASHING_MAX_WORKERS + settings.APP_PASSWORD_HASHING_MAX_QUEUE
+                )
+                _hashing_executor = ThreadPoolExecutor(
+                    max_workers=settings.APP_PASSWORD_HASHING_MAX_WORKERS, thread_name_prefix='app-password-hash'
+                )
+
+    return _hashing_executor, _hashing_slots
+
+
+def _hash_app_password(password: str, queued_at: float) -> str:
+    start = time.perf_counter()
+    APP_PASSWORD_HASH_QUEUE_TIME.observe(start - queued_at)
+    try:
+        return make_password(password, hasher='argon2')
+    finally:
+        APP_PASSWORD_HASH_DURATION.observe(time.perf_counter() - start)
+
+
 def save_app_password(label, password):
-    """Hashes a given password, formats it with the label and saves it to the secret field."""
-    hashed_password = make_password(password, hasher='argon2')
+    """Hashes a given password, formats it with the label and saves it to the secret field.
+
+    Hashing is slow on purpose, so it runs on a pool of APP_PASSWORD_HASHING_MAX_WORKERS threads (argon2 releases the
+    GIL while hashing) to cap the CPU a burst of app passwords can take from the web workers. At most
+    APP_PASSWORD_HASHING_MAX_QUEUE more can wait for a worker, beyond that this raises AppPasswordHashingBusyError."""
+    executor, slots = _get_hashing_pool()
+    if not slots.acquire(blocking=False):
+        APP_PASSWORD_HASHES_REJECTED.inc()
+        raise AppPasswordHashingBusyError()
+
+    future = executor.submit(_hash_app_password, password, time.perf_counter())
+    future.add_done_callback(lambda _future: slots.release())
+    hashed_password = future.result()
     hash_algo = identify_hasher(hashed_password)
 
     # We need to strip out the leading argon2$ from the hashed value
@@ -7,6 +7,7 @@ import requests
 
 import requests.exceptions
 import sentry_sdk
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib import messages
 from django.db import IntegrityError
@@ -22,6 +23,7 @@ from django.utils.translation import gettext_lazy as _
 from django.views.generic import TemplateView
 
 from thunderbird_accounts.authentication.middleware import AccountsOIDCBackend
+from thunderbird_accounts.authentication.models import User
 from thunderbird_accounts.authentication.reserved import is_reserved
 from thunderbird_accounts.mail.clients import DomainVerificationErrors, MailClient, StaleDNSRecordCode
 from thunderbird_accounts.mail.dkim import build_customer_dkim_cname_records
@@ -29,6 +31,7 @@ from thunderbird_accounts.core.validators import normalize_custom_domain
 from thunderbird_accounts.mail.exceptions import (
     AccessTokenNotFound,
     AccountNotFoundError,
+    AppPasswordHashingBusyError,
     DomainAlreadyExistsError,
     DomainNotFoundError,
     EmailNotValidError,
@@ -42,9 +45,10 @@ from thunderbird_accounts.mail.utils import (
 
 from thunderbird_accounts.mail.models import Account, Email, Domain
 from thunderbird_accounts.mail import tasks as mail_tasks
-from thunderbird_accounts.mail import utils
+from thunderbird_accounts.mail import caldav_credentials, utils
 from thunderbird_accounts.subscription.decorators import active_subscription_required
 from thunderbird_accounts.mail.types import stalwart
+from thunderbird_accounts.infra.blocking import run_blocking
 
 
 def _critical_errors_from_stale_dns_records(stale_dns_records: list[dict]) -> list[DomainVerificationErrors]:
@@ -86,6 +90,9 @@ def app_password_set(request: HttpRequest):
         if not new_password or not label:
             return JsonResponse({'success': False, 'error': str(_('Label and password are required'))}, status=400)
 
+        # Hash the new app password first, so a busy hashing pool doesn't leave the account without one
+        new_secret = utils.save_app_password(label, new_password)
+
         stalwart_client = MailClient()
 
         email_user = stalwart_client.get_account(request.user.stalwart_primary_email)
@@ -95,11 +102,14 @@ def app_password_set(request: HttpRequest):
         for secret in filter_app_passwords(email_user.get('secrets', [])):
             stalwart_client.delete_app_password(request.user.stalwart_primary_email, secret)
 
-        # Create and save the new app password
-        new_secret = utils.save_app_password(label, new_password)
+        # Save the new app password
         stalwart_client.save_app_password(request.user.stalwart_primary_email, new_secret)
 
         return JsonResponse({'success': True, 'message': str(_('Password set successfully'))})
+    except AppPasswordHashingBusyError:
+        return JsonResponse(
+            {'success': False, 'error': str(_('The server is busy, please try again in a moment.'))}, status=503
+        )
     except AccountNotFoundError:
         return JsonResponse(
             {'success': False, 'error': str(_('Could not connect to Thundermail, please try again later.'))}, status=500
@@ -274,10 +284,89 @@ def _domain_verification_error(domain, exc) -> JsonResponse:
     )
 
 
+def _verify_domain_with_backend(domain: Domain, is_migrated: bool) -> tuple[bool, bool, dict]:
+    """Run the DNS checks for a domain and, once verified, make sure Stalwart has it with its DKIM keys.
+
+    Only talks to Stalwart and DNS, so it can run on the blocking I/O pool. The domain's fields are updated but not
+    saved, returns whether it's verified, whether it needs saving, and the verification response data."""
+    now = datetime.datetime.now(datetime.UTC)
+    stalwart_client = MailClient()
+
+    dns_check = stalwart_client.check_domain_dns(domain.name)
+    if settings.CUSTOM_DOMAINS_DO_VERIFY:
+        is_verified = dns_check['is_verified']
+        critical_errors = dns_check['critical_errors']
+        warnings = dns_check['warnings']
+    else:
+        is_verified = True
+        critical_errors = []
+        warnings = [_('Custom domain DNS verification disabled. Automatically verified domain.')]
+
+    domain.last_verification_attempt = now
+
+    dns_records = dns_check['dns_records']
+    stale_dns_records = check_stale_dns_records(domain.name)
+    stale_dns_critical_errors = _critical_errors_from_stale_dns_records(stale_dns_records)
+    for critical_error in stale_dns_critical_errors:
+        if critical_error not in critical_errors:
+            critical_errors.append(critical_error)
+
+    if stale_dns_critical_errors:
+        is_verified = False
+
+    response_data = {
+        'critical_errors': critical_errors,
+        'warnings': warnings,
+        'dns_records': dns_records,
+        'stale_dns_records': stale_dns_records,
+    }
+
+    if not is_verified:
+        domain.status = Domain.DomainStatus.FAILED
+        return False, True, response_data
+
+    # If we're verified via dns check
+    try:
+        stalwart_resp = stalwart_client.get_domain(domain.name)
+    except DomainNotFoundError:
+        stalwart_resp = None
+
+    # Only roll through these steps if we're not already verified OR stalwart doesn't have our domain
+    if domain.status == Domain.DomainStatus.VERIFIED and stalwart_resp:
+        return True, False, response_data
+
+    domain.status = Domain.DomainStatus.VERIFIED
+    domain.verified_at = now
+
+    # Fetch or create a domain on Stalwart's end, and retrieve the domain_id
+    if stalwart_resp:
+        domain_id = stalwart_resp.get('id')
+        # Now we need to enable the domain if it's not already enabled.
+        if is_migrated and not stalwart_resp.is_enabled:
+            stalwart_client.update_domain(domain.name, stalwart.DomainUpdate(is_enabled=True))
+    else:
+        domain_id = stalwart_client.create_domain(domain.name)
+
+    # Ensure missing DKIM selectors without replacing keys created at domain-add time.
+    stalwart_client.ensure_dkim(domain.name)
+
+    mail_tasks.publish_hosted_dkim_dns_records.delay(domain.name)
+    if settings.STALWART_DKIM_STAGE_MANAGEMENT_ENABLED:
+        stalwart_client.activate_pending_dkim_signatures(domain.name)
+
+    if domain_id:
+        domain.stalwart_id = domain_id
+    else:
+        logging.error(f'There was a problem saving the domain id for {domain.name} / {domain.uuid}')
+
+    domain.stalwart_created_at = datetime.datetime.now(datetime.UTC)
+    return True, True, response_data
+
+
 @login_required
 @require_http_methods(['POST'])
 @active_subscription_required
-def verify_custom_domain(request: AuthenticatedHttpRequest):
+async def verify_custom_domain(request: AuthenticatedHttpRequest):
     """Verifies a custom domain"""
     data = json.loads(request.body)
     domain_name = data.get('domain-name')
@@ -286,86 +375,17 @@ def verify_custom_domain(request: AuthenticatedHttpRequest):
 
     domain_name = domain_name.lower()
 
-    domain = request.user.domains.get(name=domain_name)
+    user = await request.auser()
+    domain = await user.domains.aget(name=domain_name)
     if not domain:
         return JsonResponse({'success': False, 'error': _('Domain not found')}, status=404)
 
-    now = datetime.datetime.now(datetime.UTC)
-
     try:
-        stalwart_client = MailClient()
-
-        dns_check = stalwart_client.check_domain_dns(domain.name)
-        if settings.CUSTOM_DOMAINS_DO_VERIFY:
-            is_verified = dns_check['is_verified']
-            critical_errors = dns_check['critical_errors']
-            warnings = dns_check['warnings']
-        else:
-            is_verified = True
-            critical_errors = []
-            warnings = [_('Custom domain DNS verification disabled. Automatically verified domain.')]
-
-        domain.last_verification_attempt = now
-
-        dns_records = dns_check['dns_records']
-        stale_dns_records = check_stale_dns_records(domain.name)
-        stale_dns_critical_errors = _critical_errors_from_stale_dns_records(stale_dns_records)
-        for critical_error in stale_dns_critical_errors:
-            if critical_error not in critical_errors:
-                critical_errors.append(critical_error)
-
-        if stale_dns_critical_errors:
-            is_verified = False
-
-        response_data = {
-            'critical_errors': critical_errors,
-            'warnings': warnings,
-            'dns_records': dns_records,
-            'stale_dns_records': stale_dns_records,
-        }
+        is_verified, changed, response_data = await run_blocking(_verify_domain_with_backend, domain, user.is_migrated)
+        if changed:
+            await domain.asave()
 
-        # If we're verified via dns check
-        if is_verified:
-            try:
-                stalwart_resp = stalwart_client.get_domain(domain_name)
-            except DomainNotFoundError:
-                stalwart_resp = None
-
-            # Only roll through these steps if we're not already verified OR stalwart doesn't have our domain
-            if domain.status != Domain.DomainStatus.VERIFIED or not stalwart_resp:
-                domain.status = Domain.DomainStatus.VERIFIED
-                domain.verified_at = now
-
-                # Fetch or create a domain on Stalwart's end, and retrieve the domain_id
-                if stalwart_resp:
-                    domain_id = stalwart_resp.get('id')
-                    # Now we need to enable the domain if it's not already enabled.
-                    if request.user.is_migrated and not stalwart_resp.is_enabled:
-                        stalwart_client.update_domain(domain_name, stalwart.DomainUpdate(is_enabled=True))
-                else:
-                    domain_id = stalwart_client.create_domain(domain_name)
-
-                # Ensure missing DKIM selectors without replacing keys created at domain-add time.
-                stalwart_client.ensure_dkim(domain_name)
-
-                mail_tasks.publish_hosted_dkim_dns_records.delay(domain_name)
-                if settings.STALWART_DKIM_STAGE_MANAGEMENT_ENABLED:
-                    stalwart_client.activate_pending_dkim_signatures(domain_name)
-
-                if domain_id:
-                    domain.stalwart_id = domain_id
-                else:
-                    logging.error(f'There was a problem saving the domain id for {domain.name} / {domain.uuid}')
-
-                domain.stalwart_created_at = datetime.datetime.now(datetime.UTC)
-                domain.save()
-
-            return JsonResponse({'success': True, **response_data})
-        else:
-            domain.status = Domain.DomainStatus.FAILED
-            domain.save()
-
-            return JsonResponse({'success': False, **response_data})
+        return JsonResponse({'success': is_verified, **response_data})
     except requests.RequestException as e:
         # For transient errors, return 503 to the frontend, warn in the logs but don't call Sentry.
         if _is_transient_backend_error(e):
@@ -375,9 +395,9 @@ def verify_custom_domain(request: AuthenticatedHttpRequest):
                 status=503,
             )
         # A non-transient backend error (e.g. a 4xx) is a genuine failure.
-        return _domain_verification_error(domain, e)
+        return await sync_to_async(_domain_verification_error)(domain, e)
     except Exception as e:
-        return _domain_verification_error(domain, e)
+        return await sync_to_async(_domain_verification_error)(domain, e)
 
 
 @login_required
@@ -457,16 +477,13 @@ def remove_custom_domain(request: AuthenticatedHttpRequest):
     return JsonResponse({'success': True})
 
 
-@login_required
-@require_http_methods(['POST'])
-@active_subscription_required
-def add_email_alias(request: HttpRequest):
-    """Adds an email alias"""
-    data = json.loads(request.body)
+def _create_local_email_alias(user: User, data: dict) -> tuple[JsonResponse | None, Email | None]:
+    """Validate a requested alias and create its local email record.
+    Returns an error response if it can't be created, otherwise the new email record."""
     email_alias = data.get('email-alias')
     domain = data.get('domain')
     is_shared_domain = domain in settings.ALLOWED_EMAIL_DOMAINS
-    is_custom_domain = domain in request.user.domains.values_list('name', flat=True) and not is_shared_domain
+    is_custom_domain = domain in user.domains.values_list('name', flat=True) and not is_shared_domain
     is_catch_all = is_custom_domain and (email_alias == '*' or email_alias == '')
 
     # We don't need to specify the asterisk for catch-all on stalwart's end.
@@ -481,42 +498,39 @@ def add_email_alias(request: HttpRequest):
         return JsonResponse(
             {'success': False, 'error': _('The + symbol is not allowed.')},
             status=400,
-        )
+        ), None
 
     if domain in settings.ALLOWED_EMAIL_DOMAINS and len(email_alias) < settings.MIN_CUSTOM_DOMAIN_ALIAS_LENGTH:
         return JsonResponse(
             {'success': False, 'error': _('Email alias must be at least 3 characters long.')},
             status=400,
-        )
+        ), None
 
     if not is_catch_all:
         # min_length=1 because the domain-specific minimum has already been checked above.
         try:
             validate_email(full_email_alias, min_length=1)
         except EmailNotValidError as ex:
-            return JsonResponse({'success': False, 'error': ex.error_message}, status=400)
+            return JsonResponse({'success': False, 'error': ex.error_message}, status=400), None
 
     if (not is_catch_all and not email_alias) or not domain:
-        return JsonResponse({'success': False, 'error': _('Email alias and domain are required.')}, status=400)
+        return JsonResponse({'success': False, 'error': _('Email alias and domain are required.')}, status=400), None
 
     if (not is_catch_all and not is_custom_domain and is_reserved(email_alias)) or is_address_taken(full_email_alias):
-        return JsonResponse({'success': False, 'error': _('You cannot use this email address.')}, status=403)
+        return JsonResponse({'success': False, 'error': _('You cannot use this email address.')}, status=403), None
 
-    if (
-        domain not in request.user.domains.values_list('name', flat=True)
-        and domain not in settings.ALLOWED_EMAIL_DOMAINS
-    ):
-        return JsonResponse({'success': False, 'error': _('Domain not found.')}, status=404)
+    if domain not in user.domains.values_list('name', flat=True) and domain not in settings.ALLOWED_EMAIL_DOMAINS:
+        return JsonResponse({'success': False, 'error': _('Domain not found.')}, status=404), None
 
     # Get the user's account
     try:
-        account = Account.objects.get(user=request.user)
+        account = Account.objects.get(user=user)
     except Account.DoesNotExist:
-        logging.error(f'Account not found for user {request.user.uuid}')
+        logging.error(f'Account not found for user {user.uuid}')
         return JsonResponse(
             {'success': False, 'error': _('There was an error retrieving your mail account.')},
             status=404,
-        )
+        ), None
 
     emails = account.email_set.filter(type=Email.EmailType.ALIAS.value).all()
     shared_domain_aliases = list(
@@ -524,11 +538,11 @@ def add_email_alias(request: HttpRequest):
     )
 
     # If it's a shared domain, add one to the count and see if we go over the plan's limit.
-    if is_shared_domain and len(shared_domain_aliases) + 1 > request.user.plan.mail_address_count:
+    if is_shared_domain and len(shared_domain_aliases) + 1 > user.plan.mail_address_count:
         return JsonResponse(
             {'success': False, 'error': _('You cannot create anymore aliases.')},
             status=400,
-        )
+        ), None
 
     # Create the email alias record locally
     try:
@@ -545,27 +559,43 @@ def add_email_alias(request: HttpRequest):
             return JsonResponse(
                 {'success': False, 'error': _('This email address is not available.')},
                 status=400,
-            )
+            ), None
     except IntegrityError:
         logging.info('Alias creation hit a local duplicate-address race')
         return JsonResponse(
             {'success': False, 'error': _('This email address is not available.')},
             status=400,
-        )
+        ), None
     except Exception as e:
         logging.error(f'Error creating email alias: {e}')
         return JsonResponse(
             {'success': False, 'error': _('An error occurred while creating the email alias. Please try again later.')},
             status=500,
-        )
+        ), None
+
+    return None, email_obj
+
+
+@login_required
+@require_http_methods(['POST'])
+@active_subscription_required
+async def add_email_alias(request: HttpRequest):
+    """Adds an email alias"""
+    data = json.loads(request.body)
+    user = await request.auser()
+
+    error_response, email_obj = await sync_to_async(_create_local_email_alias)(user, data)
+    if error_response:
+        return error_response
 
     # Create the email alias in Stalwart
     try:
-        stalwart_client = MailClient()
-        stalwart_client.save_email_addresses(request.user.stalwart_primary_email, full_email_alias)
+        primary_email = await sync_to_async(getattr)(user, 'stalwart_primary_email')
+        stalwart_client = await run_blocking(MailClient)
+        await run_blocking(stalwart_client.save_email_addresses, primary_email, email_obj.address)
     except Exception as e:
         # If Stalwart creation fails, delete the local Email object
-        email_obj.delete()
+        await email_obj.adelete()
 
         logging.error(f'Error adding email alias: {e}')
         return JsonResponse(
@@ -631,9 +661,33 @@ def remove_email_alias(request: HttpRequest):
     return JsonResponse({'success': True})
 
 
+def _get_appointment_app_password(primary_email: str, label: str) -> str:
+    """Return the Appointment CalDAV app password for a Stalwart account, replacing any previous ones with a new
+    password unless one can be reused. Only talks to Stalwart, so it can run on the blocking I/O pool."""
+    stalwart_client = MailClient()
+    email_user = stalwart_client.get_account(primary_email)
+
+    expected_prefix = f'$app${label}$'
+    existing_secrets = [secret for secret in email_user.get('secrets', []) if secret.startswith(expected_prefix)]
+
+    base64_password = caldav_credentials.get_reusable_app_password(primary_email, existing_secrets)
+    if base64_password:
+        return base64_password
+
+    # Generate a random base64 password, hash it for Stalwart
+    # storage, and return the base64 password to the caller for CalDAV auth.
+    base64_password = secrets.token_urlsafe(64)
+    app_password_hash = utils.save_app_password(label, base64_password)
+    # Remove any existing app password for this label and add the new one in the same update.
+    stalwart_client.replace_app_passwords(primary_email, existing_secrets, app_password_hash)
+    caldav_credentials.remember_app_password(primary_email, base64_password, app_password_hash)
+
+    return base64_password
+
+
 @csrf_exempt
 @require_http_methods(['POST'])
-def appointment_caldav_setup(request: HttpRequest):
+async def appointment_caldav_setup(request: HttpRequest):
     """Auto-setup for CalDAV for Appointment.
     This is meant to be called by Appointment's backend only.
     Receives an OIDC token, retrieves the user's Stalwart account
@@ -673,7 +727,7 @@ def appointment_caldav_setup(request: HttpRequest):
     # Validate the access token against the OIDC provider to identify the user
     try:
         oidc_backend = AccountsOIDCBackend(None)
-        user = oidc_backend.get_user_from_access_token(access_token)
+        user = await sync_to_async(oidc_backend.get_user_from_access_token)(access_token)
     except Exception as ex:
         sentry_sdk.capture_exception(ex)
         error_response.status_code = 401
@@ -684,12 +738,12 @@ def appointment_caldav_setup(request: HttpRequest):
         error_response.status_code = 404
         return error_response
 
-    if not user.has_active_subscription:
+    if not await sync_to_async(getattr)(user, 'has_active_subscription'):
         logging.error('User does not have an active subscription during Appointment CalDAV setup')
         error_response.status_code = 400
         return error_response
 
-    primary_email = user.stalwart_primary_email
+    primary_email = await sync_to_async(getattr)(user, 'stalwart_primary_email')
     if not primary_email:
         logging.info(f'Primary Stalwart email not found during Appointment CalDAV setup for user {user.uuid}')
         return JsonResponse(
@@ -705,24 +759,12 @@ def appointment_caldav_setup(request: HttpRequest):
     label = f'{settings.APPOINTMENT_APP_PASSWORD_PREFIX}{primary_email}'
 
     try:
-        stalwart_client = MailClient()
-        email_user = stalwart_client.get_account(primary_email)
-
-        # Remove any existing app password for this label so we can
-        # replace it with a fresh one.
-        expected_prefix = f'$app${label}$'
-        for secret in email_user.get('secrets', []):
-            if secret.startswith(expected_prefix):
-                stalwart_client.delete_app_password(primary_email, secret)
-
-        # Generate a random base64 password, hash it for Stalwart
-        # storage, and return the base64 password to the caller for CalDAV auth.
-        base64_password = secrets.token_urlsafe(64)
-        app_password_hash = utils.save_app_password(label, base64_password)
-        stalwart_client.save_app_password(primary_email, app_password_hash)
-
+        base64_password = await run_blocking(_get_appointment_app_password, primary_email, label)
         return JsonResponse({'success': True, 'app_password': base64_password})
-
+    except AppPasswordHashingBusyError:
+        logging.warning('App password hashing queue full during Appointment CalDAV setup')
+        error_response.status_code = 503
+        return error_response
     except Exception as ex:
         sentry_sdk.capture_exception(ex)
         error_response.status_code = 500
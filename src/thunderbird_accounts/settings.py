@@ -102,8 +102,13 @@ LOGIN_REDIRECT_URL = 'vue_app'
 LOGIN_CODE_SECRET = os.getenv('LOGIN_CODE_SECRET')
 LOGIN_MAX_AGE_IN_SECONDS = 60 * 3
 
+# Allow list membership cache (see authentication.utils.is_email_in_allow_list). Results are invalidated through
+# AllowListEntry/User signals, so the Redis TTL can be long; the in-process copy is only kept briefly.
+IS_IN_ALLOW_LIST_CACHE_ENABLED: bool = os.getenv('IS_IN_ALLOW_LIST_CACHE_ENABLED', 'True') == 'True' and not IS_TEST
 IS_IN_ALLOW_LIST_CACHE_KEY = 'is_in_allow_list'
 IS_IN_ALLOW_LIST_CACHE_MAX_AGE_IN_SECONDS = 60 * 60 * 24
+IS_IN_ALLOW_LIST_L1_CACHE_MAX_AGE_IN_SECONDS = 10
+IS_IN_ALLOW_LIST_L1_CACHE_MAX_ENTRIES = 2048
 
 USE_ALLOW_LIST: bool = os.getenv('USE_ALLOW_LIST') == 'True'
 
@@ -125,6 +130,21 @@ PADDLE_API_KEY: str = os.getenv('PADDLE_API_KEY')
 PADDLE_VENDOR_SITE: str = (
     'https://sandbox-vendors.paddle.com' if PADDLE_ENV == 'sandbox' else 'https://vendors.paddle.com'
 )
+# Customer portal links are authenticated and short-lived on Paddle's side, so they're only reused briefly. Localized
+# subscription prices only change with the subscription's items, address or discount, which the subscription webhooks
+# carry, so the Paddle lookup is skipped while those are unchanged; the TTL is a backstop.
+PADDLE_CACHE_ENABLED: bool = os.getenv('PADDLE_CACHE_ENABLED', 'True') == 'True' and not IS_TEST
+PADDLE_PORTAL_LINK_CACHE_KEY = 'paddle_portal_link'
+PADDLE_PORTAL_LINK_CACHE_TTL_IN_SECONDS = int(os.getenv('PADDLE_PORTAL_LINK_CACHE_TTL_IN_SECONDS', 60 * 10))
+PADDLE_LOCALIZED_PRICE_CACHE_KEY = 'paddle_localized_price'
+PADDLE_LOCALIZED_PRICE_CACHE_TTL_IN_SECONDS = int(
+    os.getenv('PADDLE_LOCALIZED_PRICE_CACHE_TTL_IN_SECONDS', 60 * 60 * 24)
+)
+# The public plan and pricing info on the sign-up and subscription pages, cached until a Plan, Product or Price changes
+# or for at most the TTL
+VISIBLE_PLAN_INFO_CACHE_ENABLED: bool = os.getenv('VISIBLE_PLAN_INFO_CACHE_ENABLED', 'True') == 'True' and not IS_TEST
+VISIBLE_PLAN_INFO_CACHE_KEY = 'visible_plan_info'
+VISIBLE_PLAN_INFO_CACHE_TTL_IN_SECONDS = int(os.getenv('VISIBLE_PLAN_INFO_CACHE_TTL_IN_SECONDS', 60 * 60))
 
 # Zendesk integration
 ZENDESK_SUBDOMAIN: str = os.getenv('ZENDESK_SUBDOMAIN')
@@ -133,8 +153,31 @@ ZENDESK_API_TOKEN: str = os.getenv('ZENDESK_API_TOKEN')
 ZENDESK_FORM_ID: str = os.getenv('ZENDESK_FORM_ID')
 ZENDESK_FORM_BROWSER_FIELD_ID: str = os.getenv('ZENDESK_FORM_BROWSER_FIELD_ID')
 ZENDESK_FORM_OS_FIELD_ID: str = os.getenv('ZENDESK_FORM_OS_FIELD_ID')
+# Contact form attachments are uploaded to Zendesk in parallel, over a pooled session shared by all Zendesk calls
+ZENDESK_UPLOAD_MAX_WORKERS = 4
+ZENDESK_HTTP_POOL_MAXSIZE = 10
+# The contact form's ticket field schema is served from cache and refreshed in the background once older than the TTL
+ZENDESK_TICKET_FIELDS_CACHE_ENABLED: bool = (
+    os.getenv('ZENDESK_TICKET_FIELDS_CACHE_ENABLED', 'True') == 'True' and not IS_TEST
+)
+ZENDESK_TICKET_FIELDS_CACHE_KEY = 'zendesk_ticket_fields'
+ZENDESK_TICKET_FIELDS_CACHE_TTL_IN_SECONDS = int(os.getenv('ZENDESK_TICKET_FIELDS_CACHE_TTL_IN_SECONDS', 60 * 15))
+ZENDESK_TICKET_FIELDS_REFRESH_LOCK_TIMEOUT_IN_SECONDS = 60
+
+# Support customer lookups fetch live Stalwart quota alongside the database work and give up after this long,
+# returning the rest of the summary with the quota marked partial.
+SUPPORT_CUSTOMER_STALWART_TIMEOUT_IN_SECONDS = float(os.getenv('SUPPORT_CUSTOMER_STALWART_TIMEOUT_IN_SECONDS', '3'))
+SUPPORT_CUSTOMER_STALWART_MAX_WORKERS = 4
+SUPPORT_CUSTOMER_CACHE_ENABLED: bool = os.getenv('SUPPORT_CUSTOMER_CACHE_ENABLED', 'True') == 'True' and not IS_TEST
+SUPPORT_CUSTOMER_CACHE_KEY = 'support_customer'
+SUPPORT_CUSTOMER_CACHE_TTL_IN_SECONDS = int(os.getenv('SUPPORT_CUSTOMER_CACHE_TTL_IN_SECONDS', '60'))
 
 ALLOWED_HOSTS = [host for host in os.getenv('ALLOWED_HOSTS', '').split(',') if host]
+# This machine's own IPs are added to ALLOWED_HOSTS by SetHostIPInAllowedHostsMiddleware, and re-resolved on this
+# interval (0 to only do so at startup and on SIGHUP).
+HOST_ADDRESSES_REFRESH_INTERVAL_IN_SECONDS = (
+    0 if IS_TEST else int(os.getenv('HOST_ADDRESSES_REFRESH_INTERVAL_IN_SECONDS', '300'))
+)
 
 # Settings for CSRF cookie.
 CSRF_COOKIE_SECURE: bool = os.getenv('CSRF_SECURE') == 'True'
@@ -157,6 +200,7 @@ INSTALLED_APPS = [
     'thunderbird_accounts.support',
     'thunderbird_accounts.core',
     'thunderbird_accounts.telemetry',
+    'thunderbird_accounts.infra',
     'thunderbird_accounts.admin.AccountsAdminConfig',  # Instead of 'django.contrib.admin'
     # Django
     'django.contrib.auth',
@@ -176,6 +220,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'thunderbird_accounts.authentication.middleware.SetHostIPInAllowedHostsMiddleware',
+    # Only active with QUERY_BUDGET_ENABLED
+    'thunderbird_accounts.infra.middleware.QueryBudgetMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'servestatic.middleware.ServeStaticMiddleware',
@@ -425,6 +471,33 @@ if AUTH_SCHEME == 'oidc':
     )
 
     OIDC_RENEW_ID_TOKEN_EXPIRY_SECONDS = os.getenv('OIDC_RENEW_ID_TOKEN_EXPIRY_SECONDS', 60 * 15)
+
+    # Bearer token userinfo is cached until the token expires or for at most this long, which is also how long a
+    # token revoked in Keycloak keeps working. 0 disables the cache.
+    OIDC_TOKEN_CACHE_MAX_TTL_IN_SECONDS = 0 if IS_TEST else int(os.getenv('OIDC_TOKEN_CACHE_MAX_TTL_IN_SECONDS', '300'))
+    OIDC_TOKEN_CACHE_KEY = 'oidc_token'
+    # Verify access tokens against the realm's JWKS instead of asking Keycloak, revocation is then never noticed
+    OIDC_VERIFY_ACCESS_TOKEN_LOCALLY = os.getenv('OIDC_VERIFY_ACCESS_TOKEN_LOCALLY', '').lower() == 'true'
+    OIDC_JWKS_CACHE_TTL_IN_SECONDS = int(os.getenv('OIDC_JWKS_CACHE_TTL_IN_SECONDS', '3600'))
+    # Locally verified access tokens must come from this issuer (the realm URL without a trailing slash), and be
+    # issued to one of these clients (their azp). Defaults to our own client, add e.g. Appointment's as needed.
+    OIDC_OP_ISSUER = os.getenv('OIDC_ISSUER') or (
+        KEYCLOAK_REALM_ENDPOINT.rstrip('/') if KEYCLOAK_REALM_ENDPOINT else None
+    )
+    OIDC_ACCESS_TOKEN_ALLOWED_CLIENTS = [
+        client.strip()
+        for client in os.getenv('OIDC_ACCESS_TOKEN_ALLOWED_CLIENTS', OIDC_RP_CLIENT_ID or '').split(',')
+        if client.strip()
+    ]
+
+    # Sessions refresh their tokens this long before they expire. Only one refresh per refresh token runs at a time,
+    # concurrent requests wait for it and reuse its tokens for the result TTL.
+    OIDC_REFRESH_LEEWAY_IN_SECONDS = int(os.getenv('OIDC_REFRESH_LEEWAY_IN_SECONDS', '60'))
+    OIDC_REFRESH_SINGLE_FLIGHT_ENABLED: bool = not IS_TEST
+    OIDC_REFRESH_CACHE_KEY = 'oidc_refresh'
+    OIDC_REFRESH_LOCK_TIMEOUT_IN_SECONDS = 10
+    OIDC_REFRESH_WAIT_IN_SECONDS = 5
+    OIDC_REFRESH_RESULT_TTL_IN_SECONDS = 30
 else:
     OIDC_RP_CLIENT_ID = None
     OIDC_RP_CLIENT_SECRET = None
@@ -433,6 +506,11 @@ else:
     OIDC_OP_TOKEN_ENDPOINT = None
     OIDC_OP_USER_ENDPOINT = None
     OIDC_OP_JWKS_ENDPOINT = None
+    OIDC_TOKEN_CACHE_MAX_TTL_IN_SECONDS = 0
+    OIDC_VERIFY_ACCESS_TOKEN_LOCALLY = False
+    OIDC_OP_ISSUER = None
+    OIDC_ACCESS_TOKEN_ALLOWED_CLIENTS = []
+    OIDC_REFRESH_SINGLE_FLIGHT_ENABLED = False
 
 STALWART_ARCHIVES_FOLDER_NAME = 'Archives'
 STALWART_BASE_JMAP_URL = os.getenv('STALWART_BASE_JMAP_URL')
@@ -488,6 +566,12 @@ DEFAULT_LANGUAGE = 'en'
 
 SUPPORTED_LEGAL_LANGUAGES = ['en']
 
+# Current legal documents and their rendered HTML, cached per locale until a LegalDocument or the HTML changes, or for
+# at most the TTL
+LEGAL_DOCS_CACHE_ENABLED: bool = os.getenv('LEGAL_DOCS_CACHE_ENABLED', 'True') == 'True' and not IS_TEST
+LEGAL_DOCS_CACHE_KEY = 'legal_docs'
+LEGAL_DOCS_CACHE_TTL_IN_SECONDS = int(os.getenv('LEGAL_DOCS_CACHE_TTL_IN_SECONDS', 60 * 60 * 24))
+
 TIME_ZONE = 'UTC'
 
 USE_I18N = True
@@ -612,6 +696,16 @@ MFA_ACCESS_TOKEN_EXPIRY_LEEWAY_SECONDS = 30
 MFA_KEYCLOAK_ACR_VALUE = '2'
 MFA_DEFAULT_NEXT_PATH = '/manage-mfa'
 
+# Allow list bulk import: rows are validated and inserted this many at a time, and imports with more rows
+# than the threshold are handed off to a Celery task with a progress page instead of running in the request.
+ALLOW_LIST_IMPORT_CHUNK_SIZE = 1000
+ALLOW_LIST_IMPORT_ASYNC_THRESHOLD = 2000
+# Rows of background imports are handed to the task through the cache, in chunks of ALLOW_LIST_IMPORT_CHUNK_SIZE.
+ALLOW_LIST_IMPORT_CACHE_KEY = 'allow_list_import'
+ALLOW_LIST_IMPORT_CACHE_TTL_IN_SECONDS = 60 * 60 * 24
+# Cap on the dupe/error messages kept in a background import's result.
+ALLOW_LIST_IMPORT_MAX_MESSAGES = 100
+
 # Shared Celery task options for any task that submits to PostHog, so all tasks
 # have the same behaviour and error handling.
 POSTHOG_TASK_KWARGS = {
@@ -621,6 +715,13 @@ POSTHOG_TASK_KWARGS = {
     'max_retries': 6,
 }
 
+# purge_incomplete_signups selects candidates in chunks of this size and fans them out to worker tasks, each of
+# which deletes from Keycloak/Stalwart with at most this many concurrent requests.
+PURGE_INCOMPLETE_SIGNUPS_CHUNK_SIZE = 100
+PURGE_INCOMPLETE_SIGNUPS_KEYCLOAK_CONCURRENCY = 4
+PURGE_INCOMPLETE_SIGNUPS_CHECKPOINT_CACHE_KEY = 'purge_incomplete_signups:checkpoint'
+PURGE_INCOMPLETE_SIGNUPS_CHECKPOINT_TTL = 60 * 60 * 12
+
 CELERY_BEAT_SCHEDULE = {
     'purge-incomplete-signups': {
         'task': 'thunderbird_accounts.authentication.tasks.purge_incomplete_signups',
@@ -635,6 +736,25 @@ CELERY_BEAT_SCHEDULE = {
     },
 }
 
+# Buffer legal document acceptances in the cache and write them in batches, for launch spikes after publishing a new
+# document. See legal.responses.
+LEGAL_RESPONSE_WRITE_BEHIND_ENABLED: bool = os.getenv('LEGAL_RESPONSE_WRITE_BEHIND_ENABLED', 'False') == 'True'
+LEGAL_RESPONSE_WRITE_BEHIND_CACHE_KEY = 'legal_responses'
+LEGAL_RESPONSE_WRITE_BEHIND_FLUSH_INTERVAL_IN_SECONDS = int(
+    os.getenv('LEGAL_RESPONSE_WRITE_BEHIND_FLUSH_INTERVAL_IN_SECONDS', '10')
+)
+LEGAL_RESPONSE_WRITE_BEHIND_FLUSH_LOCK_TIMEOUT_IN_SECONDS = 60 * 5
+# Buffer slots written per INSERT; each slot holds one user's acceptances
+LEGAL_RESPONSE_WRITE_BEHIND_BATCH_SIZE = int(os.getenv('LEGAL_RESPONSE_WRITE_BEHIND_BATCH_SIZE', '500'))
+# Buffered acceptances count as accepted for this long, it should comfortably outlive the flush interval
+LEGAL_RESPONSE_WRITE_BEHIND_PENDING_TTL_IN_SECONDS = 60 * 60
+
+if LEGAL_RESPONSE_WRITE_BEHIND_ENABLED:
+    CELERY_BEAT_SCHEDULE['flush-legal-responses'] = {
+        'task': 'thunderbird_accounts.legal.tasks.flush_legal_responses',
+        'schedule': LEGAL_RESPONSE_WRITE_BEHIND_FLUSH_INTERVAL_IN_SECONDS,
+    }
+
 if POSTHOG_API_KEY:
     CELERY_BEAT_SCHEDULE['poll-keycloak-events'] = {
         'task': 'thunderbird_accounts.telemetry.tasks.poll_keycloak_events',
@@ -653,6 +773,36 @@ sentry_sdk.set_context(
     },
 )
 
+# Health checks run concurrently, a dependency that hasn't answered within the timeout is reported unhealthy. Results
+# are reused for the cache TTL so frequent load balancer probes don't each hit every dependency.
+HEALTH_CHECK_TIMEOUT_IN_SECONDS = float(os.getenv('HEALTH_CHECK_TIMEOUT_IN_SECONDS', '5'))
+HEALTH_CHECK_CACHE_TTL_IN_SECONDS = float(os.getenv('HEALTH_CHECK_CACHE_TTL_IN_SECONDS', '5'))
+
+# Async views run their blocking Stalwart, Keycloak and DNS calls on a pool of this many threads per process, see
+# infra.blocking. The Stalwart JMAP and Keycloak admin clients keep up to OUTBOUND_HTTP_POOL_MAXSIZE connections open.
+BLOCKING_IO_MAX_WORKERS = int(os.getenv('BLOCKING_IO_MAX_WORKERS', '32'))
+OUTBOUND_HTTP_POOL_MAXSIZE = int(os.getenv('OUTBOUND_HTTP_POOL_MAXSIZE', '20'))
+
+# Count database queries per request / Celery task, reporting N+1s and views or tasks (by url name or task name)
+# that go over their budget here. Always on in tests, where going over budget fails the test.
+QUERY_BUDGET_ENABLED: bool = os.getenv('QUERY_BUDGET_ENABLED', 'False') == 'True' or IS_TEST
+QUERY_BUDGET_RAISE: bool = IS_TEST
+QUERY_BUDGET_REPEATED_QUERY_THRESHOLD = int(os.getenv('QUERY_BUDGET_REPEATED_QUERY_THRESHOLD', '5'))
+QUERY_BUDGETS: dict[str, int] = {
+    'add_email_alias': 20,
+    'api_sign_up': 12,
+    'legal_accept': 10,
+    'legal_decline': 25,
+    'paddle_completed': 12,
+    'thunderbird_accounts.subscription.tasks.update_thundermail_quota': 10,
+}
+
+# Celery workers serve their Prometheus metrics on this port (web workers use /metrics). Set PROMETHEUS_MULTIPROC_DIR
+# to a shared empty directory to aggregate metrics across worker processes.
+WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', '0')) or None
+# Scrapers of the web workers' /metrics must send this as a bearer token. Without one the endpoint is only open in dev.
+METRICS_AUTH_TOKEN = os.getenv('METRICS_AUTH_TOKEN')
+
 # Cors
 CORS_PREFLIGHT_MAX_AGE = 0  # For debugging purposes
 CORS_ALLOWED_ORIGINS = [host for host in os.getenv('CORS_ALLOWED_ORIGINS', '').split(',') if host]
@@ -679,12 +829,23 @@ USE_MAILCHIMP = bool(MAILCHIMP_API_KEY)  # If we don't have an api key disable m
 
 ABANDONED_CART_TAG_HOURS = int(os.getenv('ABANDONED_CART_TAG_HOURS', '1'))
 ABANDONED_CART_MAILCHIMP_TAG = os.getenv('ABANDONED_CART_MAILCHIMP_TAG', 'abandoned_cart')
+# Members sent to Mailchimp per batch subscribe / tag request (Mailchimp caps these at 500)
+ABANDONED_CART_MAILCHIMP_BATCH_SIZE = int(os.getenv('ABANDONED_CART_MAILCHIMP_BATCH_SIZE', '500'))
+
+# How long a mirrored Mailchimp member's tags are trusted without being re-confirmed. This should outlive the
+# interval between sync-mailchimp-member-mirror runs so reconciled entries never go stale.
+MAILCHIMP_MEMBER_MIRROR_MAX_AGE_IN_SECONDS = int(os.getenv('MAILCHIMP_MEMBER_MIRROR_MAX_AGE_IN_SECONDS', 60 * 60 * 26))
+MAILCHIMP_MEMBER_MIRROR_SYNC_PAGE_SIZE = 1000
 
 if USE_MAILCHIMP:
     CELERY_BEAT_SCHEDULE['tag-abandoned-cart-mailchimp'] = {
         'task': 'thunderbird_accounts.authentication.tasks.tag_abandoned_cart_in_mailchimp',
         'schedule': crontab(minute=0),
     }
+    CELERY_BEAT_SCHEDULE['sync-mailchimp-member-mirror'] = {
+        'task': 'thunderbird_accounts.subscription.tasks.sync_mailchimp_member_mirror',
+        'schedule': crontab(hour=3, minute=30),
+    }
 
 # While they currently line up, we need to ensure that is consistent.
 # https://mailchimp.com/help/view-and-edit-contact-languages/#Language_codes
@@ -696,8 +857,18 @@ ACCOUNTS_TO_MAILCHIMP_LANGUAGES = {
 # For private stalwart communication
 VERIFY_PRIVATE_LINK_SSL = True if os.getenv('VERIFY_PRIVATE_LINK_SSL', 'true').lower() == 'true' else False
 
+# App passwords are hashed on a pool of this many threads per process, with at most APP_PASSWORD_HASHING_MAX_QUEUE
+# more waiting their turn before further requests are turned away.
+APP_PASSWORD_HASHING_MAX_WORKERS = int(os.getenv('APP_PASSWORD_HASHING_MAX_WORKERS', '2'))
+APP_PASSWORD_HASHING_MAX_QUEUE = int(os.getenv('APP_PASSWORD_HASHING_MAX_QUEUE', '20'))
+
 # For Appointment's CalDAV auto-setup
 APPOINTMENT_APP_PASSWORD_PREFIX: str = 'appointment-caldav-setup-'
+# Hand the same CalDAV app password back to Appointment for this long, instead of issuing a new one on every setup
+# call. Needs a Fernet key (see `manage.py generate_key`) to encrypt it in the cache, and is off when either is unset.
+APPOINTMENT_CALDAV_REUSE_TTL_IN_SECONDS = int(os.getenv('APPOINTMENT_CALDAV_REUSE_TTL_IN_SECONDS', '0'))
+APPOINTMENT_CALDAV_REUSE_ENCRYPTION_KEY: str = os.getenv('APPOINTMENT_CALDAV_REUSE_ENCRYPTION_KEY')
+APPOINTMENT_CALDAV_REUSE_CACHE_KEY = 'appointment_caldav'
 
 # Max seconds for each DNS lookup when checking stale records
 STALE_DNS_LOOKUP_LIFETIME: float = 2.0
@@ -5,3 +5,9 @@ class SubscriptionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'thunderbird_accounts.subscription'
     verbose_name = 'Subscription'
+
+    def ready(self):
+        # Import here so Django finishes app loading before signal registration.
+        from thunderbird_accounts.subscription.signals import register_visible_plan_info_cache_handlers
+
+        register_visible_plan_info_cache_handlers()
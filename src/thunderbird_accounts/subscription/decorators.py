@@ -1,5 +1,7 @@
+import threading
 from functools import wraps
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.conf import settings
 from django.http import HttpResponseRedirect, JsonResponse
 from django.urls import reverse
@@ -13,20 +15,31 @@ except ImportError:
     Environment = None
 
 
+_paddle_clients = threading.local()
+
+
 def init_paddle():
+    """Return a Paddle Client for the current thread, reusing it across requests and tasks so its connections to
+    Paddle stay open. Clients aren't shared between threads as the SDK sets per-request headers on its session."""
+    if not settings.PADDLE_API_KEY or not Client:
+        return None
+
+    config = (Client, settings.PADDLE_API_KEY, settings.PADDLE_ENV)
+    if getattr(_paddle_clients, 'config', None) == config:
+        return _paddle_clients.client
+
     if Options:
         options = Options(Environment.SANDBOX if settings.PADDLE_ENV == 'sandbox' else Environment.PRODUCTION)
     else:
         options = None
 
-    if not settings.PADDLE_API_KEY or not Client:
-        return None
-
-    return Client(settings.PADDLE_API_KEY, options=options)
+    _paddle_clients.client = Client(settings.PADDLE_API_KEY, options=options)
+    _paddle_clients.config = config
+    return _paddle_clients.client
 
 
 def inject_paddle(func):
-    """Inject an initialized Paddle Client into a function as ``paddle``.
+    """Inject this thread's Paddle Client into a function as ``paddle``.
     If the paddle python sdk is not installed this will return None."""
 
     def _inject_paddle(*args, **kwargs):
@@ -34,6 +47,9 @@ def inject_paddle(func):
 
         return func(*args, **kwargs)
 
+    if iscoroutinefunction(func):
+        markcoroutinefunction(_inject_paddle)
+
     return _inject_paddle
 
 
@@ -41,11 +57,7 @@ def active_subscription_required(function=None, *, error_message=None, response_
     """Require an authenticated user with an active subscription."""
 
     def decorator(view_func):
-        @wraps(view_func)
-        def _view_wrapper(request, *args, **kwargs):
-            if getattr(request.user, 'has_active_subscription', False):
-                return view_func(request, *args, **kwargs)
-
+        def _denied_response(request):
             if _wants_json_response(request):
                 message = error_message or _('An active subscription is required.')
                 data = response_data if response_data is not None else {'success': False, 'error': str(message)}
@@ -53,6 +65,25 @@ def active_subscription_required(function=None, *, error_message=None, response_
 
             return HttpResponseRedirect(reverse('vue_app'))
 
+        if iscoroutinefunction(view_func):
+
+            @wraps(view_func)
+            async def _view_wrapper(request, *args, **kwargs):
+                user = await request.auser()
+                if await sync_to_async(getattr)(user, 'has_active_subscription', False):
+                    return await view_func(request, *args, **kwargs)
+
+                return _denied_response(request)
+
+        else:
+
+            @wraps(view_func)
+            def _view_wrapper(request, *args, **kwargs):
+                if getattr(request.user, 'has_active_subscription', False):
+                    return view_func(request, *args, **kwargs)
+
+                return _denied_response(request)
+
         return _view_wrapper
 
     if function:
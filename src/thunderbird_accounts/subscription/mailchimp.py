@@ -1,13 +1,24 @@
 import base64
 import hashlib
 import logging
+from datetime import timedelta
+from typing import Iterator
 
 import requests
 import sentry_sdk
 from django.conf import settings
+from django.utils import timezone
 from requests.exceptions import JSONDecodeError
 
 from thunderbird_accounts.celery.exceptions import TaskFailed
+from thunderbird_accounts.subscription.models import MailchimpMember
+
+# Mailchimp caps batch subscribe and static segment requests at 500 members each.
+# https://mailchimp.com/developer/marketing/api/lists/batch-subscribe-or-unsubscribe/
+MAILCHIMP_MAX_BATCH_MEMBERS = 500
+
+# Returned per member by batch subscribe when update_existing is off and the member is already on the list.
+MAILCHIMP_CONTACT_EXISTS_ERROR_CODE = 'ERROR_CONTACT_EXISTS'
 
 
 def _get_response_error_details(ex: requests.exceptions.RequestException) -> dict:
@@ -21,6 +32,58 @@ def _get_response_status_code(ex: requests.exceptions.RequestException) -> int |
     return ex.response.status_code if ex.response is not None else None
 
 
+def _get_task_failed(ex: requests.exceptions.RequestException, error_context: dict | None = None) -> TaskFailed:
+    # Error details reference: https://mailchimp.com/developer/marketing/docs/errors/#error-glossary
+    error_details = _get_response_error_details(ex)
+    return TaskFailed(
+        'mailchimp error',
+        {
+            **(error_context or {}),
+            'error_msg_title': error_details.get('title', 'N/A'),
+            'error_msg_detail': error_details.get('detail', 'N/A'),
+            'error_msg_type': error_details.get('type', 'N/A'),
+            'error_status_code': _get_response_status_code(ex),
+        },
+    )
+
+
+def hash_email(email: str) -> str:
+    """Mailchimp's member id for an email address."""
+    md5_hasher = hashlib.new('md5')
+    md5_hasher.update(email.lower().encode())
+    return md5_hasher.hexdigest()
+
+
+def get_mirrored_members(email_hashes: list[str]) -> dict[str, MailchimpMember]:
+    """Return the mirror entries for the given email hashes that have been synced recently enough to trust."""
+    synced_after = timezone.now() - timedelta(seconds=settings.MAILCHIMP_MEMBER_MIRROR_MAX_AGE_IN_SECONDS)
+    members = MailchimpMember.objects.filter(email_hash__in=email_hashes, last_synced_at__gte=synced_after)
+    return {member.email_hash: member for member in members}
+
+
+def mirror_members(members: dict[str, dict]) -> None:
+    """Insert or update mirror entries, keyed by email hash, with their ``status`` and ``tags``."""
+    if not members:
+        return
+
+    now = timezone.now()
+    MailchimpMember.objects.bulk_create(
+        [
+            MailchimpMember(
+                email_hash=email_hash,
+                status=member.get('status'),
+                tags=sorted(set(member.get('tags') or [])),
+                last_synced_at=now,
+                updated_at=now,
+            )
+            for email_hash, member in members.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['email_hash'],
+        update_fields=['status', 'tags', 'last_synced_at', 'updated_at'],
+    )
+
+
 class MailchimpClient:
     """Thin client for the Mailchimp Marketing API v3 list endpoints."""
 
@@ -31,11 +94,11 @@ class MailchimpClient:
 
     @staticmethod
     def _hash_email(email: str) -> str:
-        md5_hasher = hashlib.new('md5')
-        md5_hasher.update(email.lower().encode())
-        return md5_hasher.hexdigest()
+        return hash_email(email)
 
-    def _api_query(self, method: str, api_endpoint: str, data: dict | None = None) -> requests.Response:
+    def _api_query(
+        self, method: str, api_endpoint: str, data: dict | None = None, params: dict | None = None
+    ) -> requests.Response:
         """Execute a request against the Mailchimp list API."""
         api_url = f'https://{settings.MAILCHIMP_DC}.api.mailchimp.com/3.0/lists/{settings.MAILCHIMP_LIST_ID}'
         response: requests.Response = requests.request(
@@ -43,6 +106,7 @@ class MailchimpClient:
             url=f'{api_url}{api_endpoint}',
             headers={'Authorization': f'Basic {self._basic_auth}'},
             json=data,
+            params=params,
         )
         response.raise_for_status()
         return response
@@ -55,25 +119,37 @@ class MailchimpClient:
         language: str,
         error_context: dict | None = None,
     ) -> None:
-        """Add a list member or apply a tag if they are already subscribed."""
+        """Add a list member or apply a tag if they are already subscribed.
+
+        The local member mirror is checked first, so members already known to have the tag cost no requests
+        and members known to be on the list skip the lookup."""
         hashed_email = self._hash_email(email)
+        mirrored = get_mirrored_members([hashed_email]).get(hashed_email)
+
+        if mirrored and tag in mirrored.tags:
+            return
 
         # Check if the user is on the list, and if they are then update their tags array with our new one.
         try:
-            response = self._api_query('get', f'/members/{hashed_email}')
+            if mirrored:
+                status, tags = mirrored.status, set(mirrored.tags)
+            else:
+                response = self._api_query('get', f'/members/{hashed_email}')
 
-            data = response.json() or {}
-            tags = {t.get('name'): True for t in data.get('tags', [])}
+                data = response.json() or {}
+                status, tags = data.get('status'), {t.get('name') for t in data.get('tags', [])}
 
-            # They're already in the mailing list with the assigned tag, so don't do anything.
-            if tags.get(tag):
-                return
+                # They're already in the mailing list with the assigned tag, so don't do anything.
+                if tag in tags:
+                    mirror_members({hashed_email: {'status': status, 'tags': tags}})
+                    return
 
             self._api_query(
                 'post',
                 f'/members/{hashed_email}/tags',
                 data={'tags': [{'name': tag, 'status': 'active'}]},
             )
+            mirror_members({hashed_email: {'status': status, 'tags': tags | {tag}}})
             return
 
         except requests.exceptions.RequestException as ex:
@@ -97,22 +173,14 @@ class MailchimpClient:
                     'tags': [tag],
                 },
             )
+            mirror_members({hashed_email: {'status': 'subscribed', 'tags': [tag]}})
         except requests.exceptions.RequestException as ex:
             # Error details reference: https://mailchimp.com/developer/marketing/docs/errors/#error-glossary
             error_details = _get_response_error_details(ex)
             sentry_sdk.set_context('mailchimp_error', error_details)
             sentry_sdk.capture_exception(ex)
 
-            raise TaskFailed(
-                'mailchimp error',
-                {
-                    **(error_context or {}),
-                    'error_msg_title': error_details.get('title', 'N/A'),
-                    'error_msg_detail': error_details.get('detail', 'N/A'),
-                    'error_msg_type': error_details.get('type', 'N/A'),
-                    'error_status_code': _get_response_status_code(ex),
-                },
-            )
+            raise _get_task_failed(ex, error_context)
 
     def remove_tag_from_member(
         self,
@@ -132,9 +200,10 @@ class MailchimpClient:
         try:
             response = self._api_query('get', f'/members/{hashed_email}')
             data = response.json() or {}
-            tags = {t.get('name'): True for t in data.get('tags', [])}
+            tags = {t.get('name') for t in data.get('tags', [])}
 
-            if not tags.get(tag):
+            if tag not in tags:
+                mirror_members({hashed_email: {'status': data.get('status'), 'tags': tags}})
                 return
 
         except requests.exceptions.RequestException:
@@ -147,6 +216,7 @@ class MailchimpClient:
                 f'/members/{hashed_email}/tags',
                 data={'tags': [{'name': tag, 'status': 'inactive'}]},
             )
+            mirror_members({hashed_email: {'status': data.get('status'), 'tags': tags - {tag}}})
         except requests.exceptions.RequestException as ex:
             try:
                 error_details = ex.response.json()
@@ -156,3 +226,80 @@ class MailchimpClient:
             sentry_sdk.set_context('mailchimp_remove_tag_error', {**(error_context or {}), **error_details})
             sentry_sdk.capture_exception(ex)
             logging.warning(f'MailchimpClient.remove_tag_from_member: failed to remove tag "{tag}" from {email}: {ex}')
+
+    def batch_subscribe(self, members: list[dict], *, error_context: dict | None = None) -> dict:
+        """Subscribe up to MAILCHIMP_MAX_BATCH_MEMBERS new members in a single request.
+
+        Existing members are left untouched (update_existing is off) and come back in the response's
+        ``errors`` with MAILCHIMP_CONTACT_EXISTS_ERROR_CODE. Raises TaskFailed if the request as a whole fails.
+        """
+        try:
+            response = self._api_query('post', '', data={'members': members, 'update_existing': False})
+        except requests.exceptions.RequestException as ex:
+            sentry_sdk.set_context('mailchimp_error', _get_response_error_details(ex))
+            sentry_sdk.capture_exception(ex)
+            raise _get_task_failed(ex, error_context)
+
+        return response.json() or {}
+
+    def get_or_create_tag_id(self, tag: str) -> int:
+        """Return the static segment id backing a tag, creating the tag if it doesn't exist yet."""
+        try:
+            response = self._api_query('get', '/tag-search', params={'name': tag})
+            for found in (response.json() or {}).get('tags', []):
+                if found.get('name') == tag:
+                    return found['id']
+
+            response = self._api_query('post', '/segments', data={'name': tag, 'static_segment': []})
+            return response.json()['id']
+        except requests.exceptions.RequestException as ex:
+            sentry_sdk.set_context('mailchimp_error', _get_response_error_details(ex))
+            sentry_sdk.capture_exception(ex)
+            raise _get_task_failed(ex, {'tag': tag})
+
+    def add_members_to_tag(self, tag_id: int, emails: list[str], *, error_context: dict | None = None) -> dict:
+        """Apply a tag to up to MAILCHIMP_MAX_BATCH_MEMBERS existing list members in a single request.
+
+        Raises TaskFailed if the request as a whole fails.
+        """
+        try:
+            response = self._api_query('post', f'/segments/{tag_id}', data={'members_to_add': emails})
+        except requests.exceptions.RequestException as ex:
+            sentry_sdk.set_context('mailchimp_error', _get_response_error_details(ex))
+            sentry_sdk.capture_exception(ex)
+            raise _get_task_failed(ex, error_context)
+
+        return response.json() or {}
+
+    def iter_members(self, page_size: int = 1000) -> Iterator[list[dict]]:
+        """Page through every list member, yielding each page's members with their id, status and tags.
+
+        Raises TaskFailed if a page can't be fetched.
+        """
+        offset = 0
+        while True:
+            try:
+                response = self._api_query(
+                    'get',
+                    '/members',
+                    params={
+                        'count': page_size,
+                        'offset': offset,
+                        'fields': 'members.id,members.status,members.tags,total_items',
+                    },
+                )
+            except requests.exceptions.RequestException as ex:
+                sentry_sdk.set_context('mailchimp_error', _get_response_error_details(ex))
+                sentry_sdk.capture_exception(ex)
+                raise _get_task_failed(ex, {'offset': offset})
+
+            data = response.json() or {}
+            members = data.get('members') or []
+            if not members:
+                return
+
+            yield members
+
+            offset += len(members)
+            if offset >= data.get('total_items', 0):
+                return
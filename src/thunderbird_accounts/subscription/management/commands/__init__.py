@@ -3,6 +3,7 @@ import enum
 import logging
 
 from thunderbird_accounts.subscription.decorators import inject_paddle
+from thunderbird_accounts.subscription.utils import invalidate_visible_plan_info_cache
 
 try:
     from paddle_billing import Client
@@ -89,6 +90,10 @@ class PaddleCommand:
             model.objects.filter(uuid=item.uuid).update(**model_data, webhook_updated_at=occurred_at)
             updated += 1
 
+        # Queryset updates don't send post_save, which is what normally drops the cached plan info
+        if updated:
+            invalidate_visible_plan_info_cache()
+
         if verbosity > 0:
             self.stdout.write(self.style.SUCCESS(f'Finished retrieving Paddle {model_name}:'))
             self.stdout.write(self.style.SUCCESS(f'* {retrieved} {model_name} objects retrieved from Paddle API.'))
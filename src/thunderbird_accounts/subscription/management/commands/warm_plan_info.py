@@ -0,0 +1,37 @@
+"""
+Rebuilds the cached plan and pricing info shown on the sign-up and subscription pages.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from thunderbird_accounts.subscription.utils import get_visible_plan_info, invalidate_visible_plan_info_cache
+
+
+class Command(BaseCommand):
+    """
+    Usage:
+
+    .. code-block:: shell
+
+        python manage.py warm_plan_info
+
+    """
+
+    help = 'Rebuilds the cached plan and pricing info shown on the sign-up and subscription pages.'
+
+    def handle(self, *args, **options):
+        if not settings.VISIBLE_PLAN_INFO_CACHE_ENABLED:
+            self.stdout.write(self.style.WARNING('VISIBLE_PLAN_INFO_CACHE_ENABLED is not set, skipping.'))
+            return
+
+        invalidate_visible_plan_info_cache()
+        plan_info = get_visible_plan_info()
+
+        if not plan_info:
+            self.stdout.write(self.style.WARNING('No plan is visible on the subscription page.'))
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Cached plan info for {plan_info["name"]} with {len(plan_info["prices"])} prices.')
+        )
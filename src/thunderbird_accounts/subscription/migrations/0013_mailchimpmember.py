@@ -0,0 +1,30 @@
+# Generated by Django 6.1.2 on 2026-10-19 18:41
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0012_alter_price_billing_cycle_frequency_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailchimpMember',
+            fields=[
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('email_hash', models.CharField(max_length=32, unique=True)),
+                ('status', models.CharField(max_length=32, null=True)),
+                ('tags', models.JSONField(default=list)),
+                ('last_synced_at', models.DateTimeField()),
+            ],
+            options={
+                'abstract': False,
+                'indexes': [models.Index(fields=['uuid'], name='subscriptio_uuid_805035_idx'), models.Index(fields=['created_at'], name='subscriptio_created_5016f4_idx'), models.Index(fields=['updated_at'], name='subscriptio_updated_6528cc_idx'), models.Index(fields=['last_synced_at'], name='subscriptio_last_sy_3dc1b1_idx')],
+            },
+        ),
+    ]
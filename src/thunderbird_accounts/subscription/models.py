@@ -423,3 +423,30 @@ class Transaction(BaseModel):
             models.Index(fields=['revised_at']),
             models.Index(fields=['webhook_updated_at']),
         ]
+
+
+class MailchimpMember(BaseModel):
+    """Local mirror of a Mailchimp list member's status and tags.
+
+    Updated after every successful Mailchimp call and reconciled against the list by
+    sync_mailchimp_member_mirror, so we can skip requests that wouldn't change anything.
+
+    :param email_hash: Mailchimp's member id (md5 of the lowercased email address)
+    :param status: Mailchimp list status (subscribed, unsubscribed, cleaned, etc.), null if unknown
+    :param tags: Tag names the member is known to have
+    :param last_synced_at: Datetime the entry was last confirmed against Mailchimp
+    """
+
+    email_hash = models.CharField(max_length=32, unique=True)
+    status = models.CharField(max_length=32, null=True)
+    tags = models.JSONField(default=list)
+    last_synced_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'MailchimpMember [{self.uuid}] {self.email_hash} - ({self.status})'
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            *BaseModel.Meta.indexes,
+            models.Index(fields=['last_synced_at']),
+        ]
@@ -0,0 +1,82 @@
+"""Caching of Paddle API results.
+
+Customer portal links are reused for PADDLE_PORTAL_LINK_CACHE_TTL_IN_SECONDS rather than creating a portal session on
+every visit to the subscription page, and dropped when one of the customer's subscriptions changes.
+
+Every subscription webhook used to queue ``retrieve_and_update_localized_subscription_price``, which makes two or three
+Paddle calls. The localized price only depends on the subscription's customer, address, discount and prices, so the
+task records a fingerprint of those when it succeeds, and webhooks that leave them unchanged don't queue it again.
+"""
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+try:
+    from paddle_billing import Client
+    from paddle_billing.Resources.CustomerPortalSessions.Operations import CreateCustomerPortalSession
+except ImportError:
+    Client = None
+    CreateCustomerPortalSession = None
+
+
+def _portal_link_key(customer_id: str) -> str:
+    return f'{settings.PADDLE_PORTAL_LINK_CACHE_KEY}:{customer_id}'
+
+
+def _localized_price_key(subscription_uuid) -> str:
+    return f'{settings.PADDLE_LOCALIZED_PRICE_CACHE_KEY}:{subscription_uuid}'
+
+
+def get_portal_link(paddle: Client, customer_id: str) -> str:
+    """Return the customer portal overview link for a Paddle customer, creating a portal session if needed."""
+    if settings.PADDLE_CACHE_ENABLED:
+        url = cache.get(_portal_link_key(customer_id))
+        if url:
+            return url
+
+    customer_session = paddle.customer_portal_sessions.create(customer_id, CreateCustomerPortalSession())
+    url = customer_session.urls.general.overview
+
+    if settings.PADDLE_CACHE_ENABLED:
+        cache.set(_portal_link_key(customer_id), url, settings.PADDLE_PORTAL_LINK_CACHE_TTL_IN_SECONDS)
+
+    return url
+
+
+def invalidate_portal_link(customer_id: str | None):
+    if customer_id:
+        cache.delete(_portal_link_key(customer_id))
+
+
+def localized_price_fingerprint(event_data: dict) -> str:
+    """Hash the parts of a subscription webhook's data that decide its localized price."""
+    prices = sorted(
+        (item.get('price') or {} for item in event_data.get('items', [])),
+        key=lambda price: price.get('id') or '',
+    )
+    relevant = {
+        'customer_id': event_data.get('customer_id'),
+        'address_id': event_data.get('address_id'),
+        'discount': event_data.get('discount'),
+        'prices': prices,
+    }
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def is_localized_price_stale(subscription_uuid, fingerprint: str) -> bool:
+    """Whether the subscription's localized price needs fetching from Paddle again."""
+    if not settings.PADDLE_CACHE_ENABLED:
+        return True
+
+    return cache.get(_localized_price_key(subscription_uuid)) != fingerprint
+
+
+def remember_localized_price(subscription_uuid, fingerprint: str):
+    """Record that the localized price was fetched for the subscription as described by ``fingerprint``."""
+    if settings.PADDLE_CACHE_ENABLED:
+        cache.set(
+            _localized_price_key(subscription_uuid), fingerprint, settings.PADDLE_LOCALIZED_PRICE_CACHE_TTL_IN_SECONDS
+        )
@@ -0,0 +1,56 @@
+from django.db.models.signals import post_delete, post_init, post_save
+
+from thunderbird_accounts.subscription.utils import invalidate_visible_plan_info_cache
+
+# Fields of each model that build_visible_plan_info looks at. Paddle webhooks save Prices on every subscription event,
+# mostly without changing any of these.
+_VISIBLE_PLAN_INFO_FIELDS = {
+    'plan': ('name', 'visible_on_subscription_page', 'product_id'),
+    'product': ('description',),
+    'price': ('paddle_id', 'status', 'product_id'),
+}
+
+
+def _visible_plan_info_values(instance) -> tuple:
+    # Read from __dict__ so deferred fields don't trigger a query.
+    return tuple(instance.__dict__.get(field) for field in _VISIBLE_PLAN_INFO_FIELDS[instance._meta.model_name])
+
+
+def remember_visible_plan_info_values(sender, instance, **kwargs):
+    instance._visible_plan_info_values = _visible_plan_info_values(instance)
+
+
+def plan_info_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    fields = _VISIBLE_PLAN_INFO_FIELDS[instance._meta.model_name]
+    if update_fields is not None and not set(update_fields) & set(fields):
+        return
+
+    if created or getattr(instance, '_visible_plan_info_values', None) != _visible_plan_info_values(instance):
+        invalidate_visible_plan_info_cache()
+    remember_visible_plan_info_values(sender, instance)
+
+
+def plan_info_deleted(sender, instance, **kwargs):
+    invalidate_visible_plan_info_cache()
+
+
+def register_visible_plan_info_cache_handlers():
+    from thunderbird_accounts.subscription.models import Plan, Price, Product
+
+    for model in (Plan, Price, Product):
+        name = model._meta.model_name
+        post_init.connect(
+            remember_visible_plan_info_values,
+            sender=model,
+            dispatch_uid=f'thunderbird_accounts.subscription.remember_{name}_plan_info_values',
+        )
+        post_save.connect(
+            plan_info_saved,
+            sender=model,
+            dispatch_uid=f'thunderbird_accounts.subscription.{name}_saved',
+        )
+        post_delete.connect(
+            plan_info_deleted,
+            sender=model,
+            dispatch_uid=f'thunderbird_accounts.subscription.{name}_deleted',
+        )
@@ -8,12 +8,27 @@ from celery import shared_task
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.signing import Signer, BadSignature
+from django.utils import timezone
 
 from thunderbird_accounts.authentication.models import User
-from thunderbird_accounts.subscription.mailchimp import MailchimpClient
-from thunderbird_accounts.subscription.models import Transaction, Subscription, SubscriptionItem, Price, Product, Plan
+from thunderbird_accounts.subscription.mailchimp import MailchimpClient, mirror_members
+from thunderbird_accounts.subscription.models import (
+    MailchimpMember,
+    Transaction,
+    Subscription,
+    SubscriptionItem,
+    Price,
+    Product,
+    Plan,
+)
 from thunderbird_accounts.subscription.utils import activate_subscription_features
 from thunderbird_accounts.subscription.decorators import inject_paddle, init_paddle
+from thunderbird_accounts.subscription.paddle_cache import (
+    invalidate_portal_link,
+    is_localized_price_stale,
+    localized_price_fingerprint,
+    remember_localized_price,
+)
 from thunderbird_accounts.core.types import TaskReturnStatus
 from thunderbird_accounts.celery.exceptions import TaskFailed
 
@@ -370,8 +385,15 @@ def paddle_subscription_event(self, event_data: dict, occurred_at: datetime.date
             defaults={'quantity': quantity},
         )
 
-    # Queue up the price update for now.
-    retrieve_and_update_localized_subscription_price.delay(subscription_uuid=str(subscription.uuid))
+    # The customer's portal session may describe the subscription as it was
+    invalidate_portal_link(customer_id)
+
+    # Queue up the price update, unless nothing it depends on has changed since the last one.
+    fingerprint = localized_price_fingerprint(event_data)
+    if is_localized_price_stale(subscription.uuid, fingerprint):
+        retrieve_and_update_localized_subscription_price.delay(
+            subscription_uuid=str(subscription.uuid), fingerprint=fingerprint
+        )
 
     return {
         'paddle_id': paddle_id,
@@ -543,10 +565,50 @@ def add_subscriber_to_mailchimp_list(self, user_uuid):
     }
 
 
+@shared_task(bind=True)
+def sync_mailchimp_member_mirror(self):
+    """Reconcile the local MailchimpMember mirror against every member of the Mailchimp list.
+
+    Members that are no longer on the list are dropped from the mirror."""
+    if not settings.USE_MAILCHIMP:
+        return {
+            'task_status': 'skipped',
+            'synced': 0,
+            'removed': 0,
+        }
+
+    started_at = timezone.now()
+    synced = 0
+    for members in MailchimpClient().iter_members(page_size=settings.MAILCHIMP_MEMBER_MIRROR_SYNC_PAGE_SIZE):
+        mirror_members(
+            {
+                member['id']: {
+                    'status': member.get('status'),
+                    'tags': [tag.get('name') for tag in member.get('tags') or []],
+                }
+                for member in members
+            }
+        )
+        synced += len(members)
+
+    removed, _ = MailchimpMember.objects.filter(last_synced_at__lt=started_at).delete()
+
+    result = {
+        'task_status': TaskReturnStatus.SUCCESS,
+        'synced': synced,
+        'removed': removed,
+    }
+    logging.info(f'sync_mailchimp_member_mirror: {result}')
+    return result
+
+
 @shared_task(bind=True, retry_backoff=True, retry_backoff_max=60 * 60, max_retries=10)
 @inject_paddle
-def retrieve_and_update_localized_subscription_price(self, subscription_uuid, paddle: Client):
-    """Since Stalwart only checks the db we have to manually propagate a plan change across the user's accounts."""
+def retrieve_and_update_localized_subscription_price(self, subscription_uuid, paddle: Client, fingerprint=None):
+    """Since Stalwart only checks the db we have to manually propagate a plan change across the user's accounts.
+
+    ``fingerprint`` is the subscription webhook's :any:`localized_price_fingerprint`, recorded once the prices are
+    stored so later webhooks with the same one skip this task."""
 
     try:
         subscription: Subscription = Subscription.objects.get(pk=subscription_uuid)
@@ -619,6 +681,9 @@ def retrieve_and_update_localized_subscription_price(self, subscription_uuid, pa
             'reason': 'Failed to retrieve and store discount / localized prices.',
         }
 
+    if fingerprint:
+        remember_localized_price(subscription_uuid, fingerprint)
+
     return {
         'subscription_uuid': subscription_uuid,
         'task_status': TaskReturnStatus.SUCCESS,
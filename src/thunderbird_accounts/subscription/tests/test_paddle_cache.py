@@ -0,0 +1,143 @@
+import threading
+from unittest.mock import patch, MagicMock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, Client as RequestClient, override_settings
+from django.urls import reverse
+
+from thunderbird_accounts.authentication.models import User
+from thunderbird_accounts.core.tests.utils import oidc_force_login
+from thunderbird_accounts.core.types import TaskReturnStatus
+from thunderbird_accounts.subscription import tasks
+from thunderbird_accounts.subscription.decorators import init_paddle
+from thunderbird_accounts.subscription.models import Subscription
+from thunderbird_accounts.subscription.paddle_cache import (
+    invalidate_portal_link,
+    is_localized_price_stale,
+    localized_price_fingerprint,
+    remember_localized_price,
+)
+
+
+class InitPaddleTestCase(TestCase):
+    def test_reuses_client_within_a_thread(self):
+        self.assertIs(init_paddle(), init_paddle())
+
+    def test_threads_get_their_own_client(self):
+        other = {}
+        thread = threading.Thread(target=lambda: other.setdefault('client', init_paddle()))
+        thread.start()
+        thread.join()
+
+        self.assertIsNotNone(other['client'])
+        self.assertIsNot(other['client'], init_paddle())
+
+    def test_new_client_when_settings_change(self):
+        client = init_paddle()
+        with override_settings(PADDLE_API_KEY='another-key'):
+            self.assertIsNot(init_paddle(), client)
+
+    @override_settings(PADDLE_API_KEY=None)
+    def test_no_client_without_api_key(self):
+        self.assertIsNone(init_paddle())
+
+
+@override_settings(PADDLE_CACHE_ENABLED=True)
+class PortalLinkCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = RequestClient()
+        self.user = User.objects.create(username=f'test@{settings.PRIMARY_EMAIL_DOMAIN}', oidc_id='1234')
+        Subscription.objects.create(
+            paddle_id='sub_1', paddle_customer_id='ctm_1', user=self.user, status=Subscription.StatusValues.ACTIVE
+        )
+        oidc_force_login(self.client, self.user)
+
+        self.paddle = MagicMock()
+        self.paddle.customer_portal_sessions.create.return_value.urls.general.overview = 'https://portal/1'
+        patcher = patch('thunderbird_accounts.subscription.decorators.init_paddle', return_value=self.paddle)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        cache.clear()
+
+    def _get_link(self):
+        return self.client.post(reverse('paddle_portal'), HTTP_ACCEPT='application/json').json()['url']
+
+    def test_reuses_portal_link(self):
+        self.assertEqual(self._get_link(), 'https://portal/1')
+        self.assertEqual(self._get_link(), 'https://portal/1')
+
+        self.paddle.customer_portal_sessions.create.assert_called_once()
+        self.assertEqual(self.paddle.customer_portal_sessions.create.call_args.args[0], 'ctm_1')
+
+    def test_invalidated_portal_link_is_recreated(self):
+        self._get_link()
+
+        invalidate_portal_link('ctm_1')
+        self.paddle.customer_portal_sessions.create.return_value.urls.general.overview = 'https://portal/2'
+
+        self.assertEqual(self._get_link(), 'https://portal/2')
+        self.assertEqual(self.paddle.customer_portal_sessions.create.call_count, 2)
+
+
+@override_settings(PADDLE_CACHE_ENABLED=True)
+class LocalizedPriceCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.event_data = {
+            'id': 'sub_1',
+            'customer_id': 'ctm_1',
+            'address_id': 'add_1',
+            'discount': None,
+            'next_billed_at': '2026-01-01T00:00:00Z',
+            'items': [
+                {'price': {'id': 'pri_2', 'unit_price_overrides': []}},
+                {'price': {'id': 'pri_1', 'unit_price_overrides': []}},
+            ],
+        }
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_fingerprint_ignores_unrelated_changes(self):
+        fingerprint = localized_price_fingerprint(self.event_data)
+
+        self.event_data['next_billed_at'] = '2027-01-01T00:00:00Z'
+        self.event_data['items'].reverse()
+
+        self.assertEqual(localized_price_fingerprint(self.event_data), fingerprint)
+
+    def test_fingerprint_changes_with_pricing_inputs(self):
+        fingerprint = localized_price_fingerprint(self.event_data)
+
+        for key, value in (('address_id', 'add_2'), ('discount', {'id': 'dsc_1'})):
+            with self.subTest(key=key):
+                self.assertNotEqual(localized_price_fingerprint({**self.event_data, key: value}), fingerprint)
+
+        self.event_data['items'][0]['price']['unit_price_overrides'] = [{'country_codes': ['DE']}]
+        self.assertNotEqual(localized_price_fingerprint(self.event_data), fingerprint)
+
+    def test_stale_until_remembered(self):
+        fingerprint = localized_price_fingerprint(self.event_data)
+        self.assertTrue(is_localized_price_stale('sub-uuid', fingerprint))
+
+        remember_localized_price('sub-uuid', fingerprint)
+
+        self.assertFalse(is_localized_price_stale('sub-uuid', fingerprint))
+        self.assertTrue(is_localized_price_stale('sub-uuid', 'something-else'))
+
+    @patch('thunderbird_accounts.subscription.decorators.init_paddle')
+    def test_task_remembers_fingerprint(self, mock_init_paddle: MagicMock):
+        user = User.objects.create(username=f'test@{settings.PRIMARY_EMAIL_DOMAIN}', oidc_id='1234')
+        subscription = Subscription.objects.create(paddle_id='sub_1', user=user)
+        paddle_subscription = mock_init_paddle.return_value.subscriptions.get.return_value
+        paddle_subscription.discount = None
+        paddle_subscription.items = []
+
+        results = tasks.retrieve_and_update_localized_subscription_price.run(str(subscription.uuid), fingerprint='abc')
+
+        self.assertEqual(results['task_status'], TaskReturnStatus.SUCCESS)
+        self.assertFalse(is_localized_price_stale(str(subscription.uuid), 'abc'))
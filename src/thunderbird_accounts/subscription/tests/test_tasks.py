@@ -14,7 +14,8 @@ from rest_framework.test import APIClient, APITestCase as DRF_APITestCase
 from thunderbird_accounts.authentication.models import User
 from thunderbird_accounts.mail.models import Account, Email
 from thunderbird_accounts.subscription import tasks, models
-from thunderbird_accounts.subscription.mailchimp import MailchimpClient
+from thunderbird_accounts.subscription.models import MailchimpMember
+from thunderbird_accounts.subscription.mailchimp import MailchimpClient, hash_email, mirror_members
 from thunderbird_accounts.mail import models as mail_models
 from thunderbird_accounts.core.exceptions import UnexpectedBehaviour
 from thunderbird_accounts.core.tests.utils import (
@@ -1301,3 +1302,168 @@ class RemoveTagFromMailchimpMemberTestCase(TestCase):
 
         self.assertEqual(request_mock.call_count, 2)
         capture_exception_mock.assert_called_once()
+
+
+class MailchimpBatchTestCase(TestCase):
+    """Unit tests for the MailchimpClient batch endpoints."""
+
+    @staticmethod
+    def _response(status_code: int, data: dict | None = None) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = json.dumps(data or {}).encode()
+        return response
+
+    @patch('requests.request')
+    def test_batch_subscribe_posts_to_list(self, request_mock: MagicMock):
+        members = [{'email_address': 'user@example.com', 'status': 'subscribed'}]
+        request_mock.return_value = self._response(200, {'errors': [], 'total_created': 1})
+
+        result = MailchimpClient().batch_subscribe(members)
+
+        self.assertEqual(result['total_created'], 1)
+        self.assertEqual(request_mock.call_count, 1)
+        self.assertEqual(request_mock.call_args[1]['method'], 'POST')
+        self.assertTrue(request_mock.call_args[1]['url'].endswith(f'/lists/{settings.MAILCHIMP_LIST_ID}'))
+        self.assertEqual(request_mock.call_args[1]['json'], {'members': members, 'update_existing': False})
+
+    @patch('sentry_sdk.capture_exception')
+    @patch('requests.request')
+    def test_batch_subscribe_failure_raises(self, request_mock: MagicMock, capture_exception_mock: MagicMock):
+        request_mock.return_value = self._response(500, {'title': 'Internal Server Error'})
+
+        with self.assertRaises(TaskFailed) as ex:
+            MailchimpClient().batch_subscribe([], error_context={'member_count': 0})
+
+        self.assertEqual(ex.exception.other['error_status_code'], 500)
+        self.assertEqual(ex.exception.other['member_count'], 0)
+        capture_exception_mock.assert_called_once()
+
+    @patch('requests.request')
+    def test_get_or_create_tag_id_uses_existing_tag(self, request_mock: MagicMock):
+        request_mock.return_value = self._response(200, {'tags': [{'id': 7, 'name': 'abandoned_cart'}]})
+
+        self.assertEqual(MailchimpClient().get_or_create_tag_id('abandoned_cart'), 7)
+        self.assertEqual(request_mock.call_count, 1)
+        self.assertEqual(request_mock.call_args[1]['params'], {'name': 'abandoned_cart'})
+
+    @patch('requests.request')
+    def test_get_or_create_tag_id_creates_missing_tag(self, request_mock: MagicMock):
+        request_mock.side_effect = [
+            self._response(200, {'tags': [{'id': 3, 'name': 'abandoned_cart_old'}]}),
+            self._response(200, {'id': 9, 'name': 'abandoned_cart'}),
+        ]
+
+        self.assertEqual(MailchimpClient().get_or_create_tag_id('abandoned_cart'), 9)
+        create_request = request_mock.call_args_list[1]
+        self.assertTrue(create_request[1]['url'].endswith('/segments'))
+        self.assertEqual(create_request[1]['json'], {'name': 'abandoned_cart', 'static_segment': []})
+
+    @patch('requests.request')
+    def test_add_members_to_tag(self, request_mock: MagicMock):
+        request_mock.return_value = self._response(200, {'total_added': 2, 'errors': []})
+
+        result = MailchimpClient().add_members_to_tag(9, ['a@example.com', 'b@example.com'])
+
+        self.assertEqual(result['total_added'], 2)
+        self.assertTrue(request_mock.call_args[1]['url'].endswith('/segments/9'))
+        self.assertEqual(request_mock.call_args[1]['json'], {'members_to_add': ['a@example.com', 'b@example.com']})
+
+
+class MailchimpMemberMirrorTestCase(TestCase):
+    """Unit tests for the local Mailchimp member mirror."""
+
+    email = 'user@example.com'
+    tag = 'welcome'
+
+    @staticmethod
+    def _response(status_code: int, data: dict | None = None) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = json.dumps(data or {}).encode()
+        return response
+
+    @patch('requests.request')
+    def test_add_or_tag_member_skips_members_tagged_in_mirror(self, request_mock: MagicMock):
+        mirror_members({hash_email(self.email): {'status': 'subscribed', 'tags': [self.tag]}})
+
+        MailchimpClient().add_or_tag_member(self.email, self.tag, language='en')
+
+        request_mock.assert_not_called()
+
+    @patch('requests.request')
+    def test_add_or_tag_member_skips_lookup_for_mirrored_members(self, request_mock: MagicMock):
+        mirror_members({hash_email(self.email): {'status': 'subscribed', 'tags': ['new_user']}})
+        request_mock.return_value = self._response(204)
+
+        MailchimpClient().add_or_tag_member(self.email, self.tag, language='en')
+
+        self.assertEqual(request_mock.call_count, 1)
+        self.assertEqual(request_mock.call_args[1]['method'], 'POST')
+        self.assertTrue(request_mock.call_args[1]['url'].endswith('/tags'))
+        self.assertEqual(MailchimpMember.objects.get().tags, ['new_user', self.tag])
+
+    @patch('requests.request')
+    def test_add_or_tag_member_ignores_stale_mirror(self, request_mock: MagicMock):
+        mirror_members({hash_email(self.email): {'status': 'subscribed', 'tags': [self.tag]}})
+        MailchimpMember.objects.update(
+            last_synced_at=datetime.datetime.now(datetime.UTC)
+            - datetime.timedelta(seconds=settings.MAILCHIMP_MEMBER_MIRROR_MAX_AGE_IN_SECONDS + 1)
+        )
+        request_mock.return_value = self._response(200, {'status': 'subscribed', 'tags': [{'name': self.tag}]})
+
+        MailchimpClient().add_or_tag_member(self.email, self.tag, language='en')
+
+        self.assertEqual(request_mock.call_count, 1)
+        self.assertEqual(request_mock.call_args[1]['method'], 'GET')
+
+    @patch('requests.request')
+    def test_add_or_tag_member_records_new_members(self, request_mock: MagicMock):
+        request_mock.side_effect = [self._response(404), self._response(200)]
+
+        MailchimpClient().add_or_tag_member(self.email, self.tag, language='en')
+
+        member = MailchimpMember.objects.get(email_hash=hash_email(self.email))
+        self.assertEqual(member.status, 'subscribed')
+        self.assertEqual(member.tags, [self.tag])
+
+    @patch('requests.request')
+    def test_remove_tag_from_member_updates_mirror(self, request_mock: MagicMock):
+        mirror_members({hash_email(self.email): {'status': 'subscribed', 'tags': [self.tag, 'new_user']}})
+        request_mock.side_effect = [
+            self._response(200, {'status': 'subscribed', 'tags': [{'name': self.tag}, {'name': 'new_user'}]}),
+            self._response(204),
+        ]
+
+        MailchimpClient().remove_tag_from_member(self.email, self.tag)
+
+        self.assertEqual(MailchimpMember.objects.get().tags, ['new_user'])
+
+    @override_settings(USE_MAILCHIMP=True, MAILCHIMP_MEMBER_MIRROR_SYNC_PAGE_SIZE=2)
+    @patch('requests.request')
+    def test_sync_mailchimp_member_mirror(self, request_mock: MagicMock):
+        mirror_members({'gone': {'status': 'subscribed', 'tags': [self.tag]}})
+        MailchimpMember.objects.update(last_synced_at=datetime.datetime(2020, 1, 1, tzinfo=datetime.UTC))
+        request_mock.side_effect = [
+            self._response(
+                200,
+                {
+                    'members': [
+                        {'id': 'a', 'status': 'subscribed', 'tags': [{'id': 1, 'name': self.tag}]},
+                        {'id': 'b', 'status': 'unsubscribed', 'tags': []},
+                    ],
+                    'total_items': 3,
+                },
+            ),
+            self._response(200, {'members': [{'id': 'c', 'status': 'cleaned', 'tags': []}], 'total_items': 3}),
+        ]
+
+        result = tasks.sync_mailchimp_member_mirror.apply().get()
+
+        self.assertEqual(result['synced'], 3)
+        self.assertEqual(result['removed'], 1)
+        self.assertEqual(request_mock.call_args_list[1][1]['params']['offset'], 2)
+        self.assertEqual(
+            dict(MailchimpMember.objects.values_list('email_hash', 'status')),
+            {'a': 'subscribed', 'b': 'unsubscribed', 'c': 'cleaned'},
+        )
@@ -1,10 +1,15 @@
 from unittest.mock import patch, Mock
-from thunderbird_accounts.subscription.utils import activate_subscription_features
+from thunderbird_accounts.subscription.utils import activate_subscription_features, get_visible_plan_info
 import datetime
 from thunderbird_accounts.subscription.models import Plan, Product, Subscription, Transaction, SubscriptionItem, Price
 from django.conf import settings
 from thunderbird_accounts.authentication.models import User
-from django.test import TestCase
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
 
 
 class TestActivationSubscriptionFeatures(TestCase):
@@ -89,3 +94,104 @@ class TestActivationSubscriptionFeatures(TestCase):
                     app_password=None,
                     quota=self.plan.mail_storage_bytes,
                 )
+
+
+@override_settings(VISIBLE_PLAN_INFO_CACHE_ENABLED=True)
+class TestVisiblePlanInfoCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            paddle_id='prod_1234',
+            name='Test Pro',
+            description='Mail for pros',
+            product_type=Product.TypeValues.STANDARD,
+            status=Product.StatusValues.ACTIVE,
+        )
+        self.plan = Plan.objects.create(name='Test Plan', product=self.product, visible_on_subscription_page=True)
+        self.price = Price.objects.create(
+            paddle_id='pri_1',
+            name='Yearly',
+            amount='12000',
+            currency='USD',
+            price_type=Price.TypeValues.STANDARD,
+            status=Price.StatusValues.ACTIVE,
+            billing_cycle_interval=Price.IntervalValues.YEAR,
+            product=self.product,
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_cached_plan_info_takes_no_queries(self):
+        plan_info = get_visible_plan_info()
+        self.assertEqual(plan_info, {'name': 'Test Plan', 'description': 'Mail for pros', 'prices': ['pri_1']})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_visible_plan_info(), plan_info)
+
+    def test_no_visible_plan_is_cached(self):
+        self.plan.visible_on_subscription_page = False
+        self.plan.save()
+
+        self.assertIsNone(get_visible_plan_info())
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_visible_plan_info())
+
+    def test_invalidated_by_plan_product_and_price_changes(self):
+        get_visible_plan_info()
+
+        self.plan.name = 'Renamed Plan'
+        self.plan.save()
+        self.assertEqual(get_visible_plan_info()['name'], 'Renamed Plan')
+
+        self.product.description = 'Mail for everyone'
+        self.product.save()
+        self.assertEqual(get_visible_plan_info()['description'], 'Mail for everyone')
+
+        Price.objects.create(
+            paddle_id='pri_2',
+            name='Monthly',
+            amount='1200',
+            currency='USD',
+            price_type=Price.TypeValues.STANDARD,
+            status=Price.StatusValues.ACTIVE,
+            billing_cycle_interval=Price.IntervalValues.MONTH,
+            product=self.product,
+        )
+        self.assertCountEqual(get_visible_plan_info()['prices'], ['pri_1', 'pri_2'])
+
+        self.price.delete()
+        self.assertEqual(get_visible_plan_info()['prices'], ['pri_2'])
+
+    def test_unchanged_price_webhook_keeps_cache(self):
+        get_visible_plan_info()
+
+        # Paddle webhooks save the subscription's price on every event, usually with nothing but the timestamp changed
+        Price.objects.update_or_create(
+            paddle_id='pri_1',
+            defaults={'status': Price.StatusValues.ACTIVE, 'webhook_updated_at': timezone.now()},
+        )
+        self.plan.mail_storage_bytes = 1024
+        self.plan.save()
+
+        with self.assertNumQueries(0):
+            get_visible_plan_info()
+
+        Price.objects.update_or_create(paddle_id='pri_1', defaults={'status': Price.StatusValues.ARCHIVED})
+        self.assertEqual(get_visible_plan_info()['prices'], [])
+
+    def test_entries_expire(self):
+        with patch.object(cache, 'set', wraps=cache.set) as mock_set:
+            get_visible_plan_info()
+
+        self.assertTrue(mock_set.call_args_list)
+        for call in mock_set.call_args_list:
+            self.assertEqual(call.args[2], settings.VISIBLE_PLAN_INFO_CACHE_TTL_IN_SECONDS)
+
+    def test_warm_plan_info_command(self):
+        stdout = StringIO()
+        call_command('warm_plan_info', stdout=stdout)
+
+        self.assertIn('Test Plan', stdout.getvalue())
+        with self.assertNumQueries(0):
+            get_visible_plan_info()
@@ -1,4 +1,5 @@
-from thunderbird_accounts.subscription.models import Transaction
+from thunderbird_accounts.mail.models import Account, Email
+from thunderbird_accounts.subscription.models import Plan, Price, Product, Subscription, SubscriptionItem, Transaction
 import json
 from unittest.mock import patch, MagicMock
 
@@ -287,3 +288,59 @@ class ActiveSubscriptionRequiredViewTestCase(TestCase):
 
         self.assertEqual(response.status_code, 404)
         self.assertEqual(response.json(), {'success': False, 'error': 'No active subscription found'})
+
+
+class SubscriptionPlanInfoTestCase(TestCase):
+    def setUp(self):
+        self.client = RequestClient()
+        product = Product.objects.create(
+            paddle_id='pro_1', name='Pro', description='Mail for pros', status=Product.StatusValues.ACTIVE
+        )
+        price = Price.objects.create(
+            paddle_id='pri_1',
+            name='Yearly',
+            amount='12000',
+            currency='USD',
+            price_type=Price.TypeValues.STANDARD,
+            status=Price.StatusValues.ACTIVE,
+            billing_cycle_interval=Price.IntervalValues.YEAR,
+            product=product,
+        )
+        plan = Plan.objects.create(
+            name='Pro', mail_address_count=10, mail_domain_count=3, send_storage_bytes=100, product=product
+        )
+        self.user = User.objects.create(username=f'test@{settings.PRIMARY_EMAIL_DOMAIN}', oidc_id='1234', plan=plan)
+        subscription = Subscription.objects.create(
+            paddle_id='sub_1', user=self.user, status=Subscription.StatusValues.ACTIVE
+        )
+        SubscriptionItem.objects.create(
+            paddle_price_id='pri_1', subscription=subscription, price=price, product=product
+        )
+        account = Account.objects.create(name=self.user.username, user=self.user)
+        Email.objects.create(address=self.user.username, account=account, type=Email.EmailType.PRIMARY.value)
+        oidc_force_login(self.client, self.user)
+
+    @patch('thunderbird_accounts.subscription.views.MailClient')
+    def test_plan_info_includes_stalwart_quota(self, mock_mail_client_cls: MagicMock):
+        mock_mail_client_cls.return_value.get_account.return_value = {'quota': 500, 'usedQuota': 42}
+
+        response = self.client.post(reverse('subscription_plan_info'), HTTP_ACCEPT='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        subscription = response.json()['subscription']
+        self.assertEqual(subscription['name'], 'Pro')
+        self.assertEqual(subscription['description'], 'Mail for pros')
+        self.assertEqual(subscription['features']['mailStorage'], 500)
+        self.assertEqual(subscription['features']['emailAddresses'], 10)
+        self.assertEqual(subscription['usedQuota'], 42)
+        self.assertEqual(subscription['period'], Price.IntervalValues.YEAR)
+        mock_mail_client_cls.return_value.get_account.assert_called_once_with(self.user.username)
+
+    @patch('thunderbird_accounts.subscription.views.MailClient')
+    def test_plan_info_fails_without_stalwart_quota(self, mock_mail_client_cls: MagicMock):
+        mock_mail_client_cls.return_value.get_account.side_effect = ConnectionError('Stalwart is down')
+
+        response = self.client.post(reverse('subscription_plan_info'), HTTP_ACCEPT='application/json')
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json(), {'success': False, 'error': 'Error getting mail storage used quota'})
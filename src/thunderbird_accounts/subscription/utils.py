@@ -1,3 +1,7 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction as dj_transaction
 from thunderbird_accounts.authentication.clients import KeycloakClient
 from thunderbird_accounts.authentication.models import User
@@ -5,9 +9,18 @@ from thunderbird_accounts.mail.utils import create_stalwart_account, update_quot
 from thunderbird_accounts.subscription.models import Plan, Price
 
 
-def get_visible_plan_info() -> dict | None:
+def _visible_plan_info_version_key() -> str:
+    return f'{settings.VISIBLE_PLAN_INFO_CACHE_KEY}:version'
+
+
+def build_visible_plan_info() -> dict | None:
     """Return the first subscription-page plan with active prices for frontend display."""
-    plan = Plan.objects.filter(visible_on_subscription_page=True).exclude(product_id__isnull=True).first()
+    plan = (
+        Plan.objects.filter(visible_on_subscription_page=True)
+        .exclude(product_id__isnull=True)
+        .select_related('product')
+        .first()
+    )
 
     if not plan:
         return None
@@ -21,6 +34,38 @@ def get_visible_plan_info() -> dict | None:
     }
 
 
+def get_visible_plan_info() -> dict | None:
+    """Return :any:`build_visible_plan_info`, from the cache when VISIBLE_PLAN_INFO_CACHE_ENABLED.
+
+    The cache entry lives under a version that :any:`invalidate_visible_plan_info_cache` replaces whenever a Plan,
+    Product or Price field it's built from changes, so a request that was building it from the old rows can't store
+    them over the new ones. Entries expire after VISIBLE_PLAN_INFO_CACHE_TTL_IN_SECONDS regardless, which also covers
+    changes made without model signals (e.g. ``QuerySet.update``).
+    """
+    if not settings.VISIBLE_PLAN_INFO_CACHE_ENABLED:
+        return build_visible_plan_info()
+
+    version = cache.get(_visible_plan_info_version_key())
+    if version is None:
+        version = invalidate_visible_plan_info_cache()
+
+    key = f'{settings.VISIBLE_PLAN_INFO_CACHE_KEY}:{version}'
+    # Wrapped so that having no visible plan is cached too
+    cached = cache.get(key)
+    if cached is None:
+        cached = {'plan_info': build_visible_plan_info()}
+        cache.set(key, cached, settings.VISIBLE_PLAN_INFO_CACHE_TTL_IN_SECONDS)
+
+    return cached['plan_info']
+
+
+def invalidate_visible_plan_info_cache() -> str:
+    """Move the visible plan info cache to a new version, and return that version."""
+    version = uuid.uuid4().hex
+    cache.set(_visible_plan_info_version_key(), version, settings.VISIBLE_PLAN_INFO_CACHE_TTL_IN_SECONDS)
+    return version
+
+
 def sync_plan_to_keycloak(user: User):
     """Sync the user's plan information according to the state of user.has_active_subscription.
     If they don't have an active subscription then they're not subscribed and can't access their services. Note that
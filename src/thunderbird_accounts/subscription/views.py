@@ -2,6 +2,7 @@ import datetime
 import json
 import logging
 import sentry_sdk
+from asgiref.sync import sync_to_async
 
 from django.db import transaction as dj_transaction
 from django.conf import settings
@@ -13,7 +14,6 @@ from django.core.signing import Signer
 from django.template.response import TemplateResponse
 
 from paddle_billing import Client
-from paddle_billing.Resources.CustomerPortalSessions.Operations import CreateCustomerPortalSession
 from paddle_billing.Notifications.Entities.Shared.PaymentMethodType import PaymentMethodType
 
 from rest_framework.decorators import api_view, authentication_classes
@@ -25,7 +25,9 @@ from thunderbird_accounts.authentication.permissions import IsValidPaddleWebhook
 from thunderbird_accounts.subscription import tasks
 from thunderbird_accounts.subscription.decorators import active_subscription_required, inject_paddle
 from thunderbird_accounts.subscription.models import Plan, Price, Subscription, Transaction
+from thunderbird_accounts.subscription.paddle_cache import get_portal_link
 from thunderbird_accounts.core.exceptions import UnexpectedBehaviour
+from thunderbird_accounts.infra.blocking import run_blocking
 
 # We only need this here right now
 SESSION_PADDLE_TRANSACTION_ID = 'paddle_txid'
@@ -190,10 +192,7 @@ def paddle_transaction_complete(request: HttpRequest, paddle: Client):
 @inject_paddle
 def get_paddle_portal_link(request: Request, paddle: Client):
     subscription = request.user.subscription_set.filter(status=Subscription.StatusValues.ACTIVE).first()
-    customer_session = paddle.customer_portal_sessions.create(
-        subscription.paddle_customer_id, CreateCustomerPortalSession()
-    )
-    return JsonResponse({'url': customer_session.urls.general.overview})
+    return JsonResponse({'url': get_portal_link(paddle, subscription.paddle_customer_id)})
 
 
 @api_view(['POST'])
@@ -241,63 +240,71 @@ def handle_paddle_webhook(request: Request):
     return response
 
 
-@login_required
-@require_http_methods(['POST'])
-@active_subscription_required(error_message='No active subscription found', status=404)
-@inject_paddle
-def get_subscription_plan_info(request: Request, paddle: Client):
-    """Returns the user's current subscription information including plan details, pricing, and features."""
+def _get_subscription_plan_details(user: User) -> tuple[JsonResponse | None, dict | None]:
+    """Look up the user's active subscription and plan for ``get_subscription_plan_info``.
+    Returns an error response if they're incomplete, otherwise the plan details without the Stalwart quota."""
 
     # Get the user's active subscription
-    subscription: Subscription = request.user.subscription_set.filter(status=Subscription.StatusValues.ACTIVE).first()
+    subscription: Subscription = user.subscription_set.filter(status=Subscription.StatusValues.ACTIVE).first()
 
     if not subscription:
-        return JsonResponse({'success': False, 'error': 'No active subscription found'}, status=404)
+        return JsonResponse({'success': False, 'error': 'No active subscription found'}, status=404), None
 
     # Get the subscription item (contains the product and price information)
     subscription_item = subscription.subscriptionitem_set.first()
 
     if not subscription_item or not subscription_item.product or not subscription_item.price:
-        return JsonResponse({'success': False, 'error': 'Subscription information incomplete'}, status=500)
+        return JsonResponse({'success': False, 'error': 'Subscription information incomplete'}, status=500), None
 
     # Get the plan from the user
-    plan = request.user.plan
+    plan = user.plan
 
     if not plan:
-        return JsonResponse({'success': False, 'error': 'Plan not found for user'}, status=500)
+        return JsonResponse({'success': False, 'error': 'Plan not found for user'}, status=500), None
 
-    price = subscription.current_billing_period_discounted_amount
-    currency = subscription.current_billing_period_currency
-
-    # Used quota comes from Stalwart and it is optional
-    used_quota = None
-
-    try:
-        stalwart_client = MailClient()
-        account = stalwart_client.get_account(request.user.stalwart_primary_email)
-        quota = account.get('quota', 0)
-        used_quota = account.get('usedQuota', 0)
-    except Exception as e:
-        logging.error(f'Error getting used quota: {e}')
-        return JsonResponse({'success': False, 'error': 'Error getting mail storage used quota'}, status=500)
-
-    # Build the response
-    subscription_info = {
+    return None, {
         'name': plan.name,
         'description': subscription_item.product.description or '',
         'features': {
-            'mailStorage': quota,  # The mail storage quota source of truth is Stalwart
             'sendStorage': plan.send_storage_bytes,
             'emailAddresses': plan.mail_address_count,
             'domains': plan.mail_domain_count,
         },
         'autoRenewal': subscription.next_billed_at,
-        'usedQuota': used_quota,
-        'price': price,
-        'currency': currency,
+        'price': subscription.current_billing_period_discounted_amount,
+        'currency': subscription.current_billing_period_currency,
         'period': subscription.subscriptionitem_set.first().price.billing_cycle_interval
         if subscription.subscriptionitem_set.count() > 0
         else 'year',
     }
 
+
+def _get_stalwart_quota(primary_email: str) -> tuple[int, int]:
+    """Return the Stalwart account's quota and used quota."""
+    account = MailClient().get_account(primary_email)
+    return account.get('quota', 0), account.get('usedQuota', 0)
+
+
+@login_required
+@require_http_methods(['POST'])
+@active_subscription_required(error_message='No active subscription found', status=404)
+async def get_subscription_plan_info(request: Request):
+    """Returns the user's current subscription information including plan details, pricing, and features."""
+    user = await request.auser()
+    error_response, subscription_info = await sync_to_async(_get_subscription_plan_details)(user)
+    if error_response:
+        return error_response
+
+    # Used quota comes from Stalwart and it is optional
+    try:
+        primary_email = await sync_to_async(getattr)(user, 'stalwart_primary_email')
+        quota, used_quota = await run_blocking(_get_stalwart_quota, primary_email)
+    except Exception as e:
+        logging.error(f'Error getting used quota: {e}')
+        return JsonResponse({'success': False, 'error': 'Error getting mail storage used quota'}, status=500)
+
+    # The mail storage quota source of truth is Stalwart
+    subscription_info['features'] = {'mailStorage': quota, **subscription_info['features']}
+    subscription_info['usedQuota'] = used_quota
+
     return JsonResponse({'success': True, 'subscription': subscription_info})
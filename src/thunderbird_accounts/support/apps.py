@@ -9,5 +9,7 @@ class SupportConfig(AppConfig):
     def ready(self):
         # Import here so Django finishes app loading before signal registration.
         from thunderbird_accounts.support.cors import register_cors_handlers
+        from thunderbird_accounts.support.signals import register_support_customer_cache_handlers
 
         register_cors_handlers()
+        register_support_customer_cache_handlers()
@@ -4,15 +4,30 @@ This module powers the authenticated support customer endpoint used by support
 tools such as Zendesk. It deliberately builds the response in permission-gated
 sections so a staff viewer only receives the customer data their Django model
 permissions allow them to see.
+
+The live Stalwart lookup runs on a worker thread while the database sections are
+built, and is abandoned after SUPPORT_CUSTOMER_STALWART_TIMEOUT_IN_SECONDS so a
+slow mail server only costs the quota section (reported under ``partial``).
+
+Complete summaries are cached for SUPPORT_CUSTOMER_CACHE_TTL_IN_SECONDS per
+customer email and viewer permission set, since agents look the same customer up
+repeatedly while working a ticket. Changes to the customer's records invalidate
+their entries (see ``register_support_customer_cache_handlers``), and callers can
+pass ``refresh`` to bypass the cache.
 """
 
+import hashlib
 import logging
-from collections import defaultdict
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime
 from urllib.parse import urljoin
 
 from django.conf import settings
-from django.db.models import Q
+from django.core.cache import cache
+from django.db.models import BigIntegerField, Q, Sum
+from django.db.models.functions import Cast
 from django.urls import reverse
 from mozilla_django_oidc.contrib.drf import OIDCAuthentication
 from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes
@@ -29,20 +44,95 @@ from thunderbird_accounts.mail.models import Email
 from thunderbird_accounts.mail.utils import filter_app_passwords
 from thunderbird_accounts.subscription.models import Subscription, Transaction
 
-
-def get_customer_support_data(email: str | None, viewer: User | None = None) -> dict:
-    """Return a permission-filtered support summary for the customer email."""
+# Shared rather than per-request so a request can walk away from a slow Stalwart call at the deadline
+# without waiting for it on executor shutdown.
+_stalwart_executor = ThreadPoolExecutor(
+    max_workers=settings.SUPPORT_CUSTOMER_STALWART_MAX_WORKERS,
+    thread_name_prefix='support-stalwart',
+)
+
+# Every permission that changes what the summary contains, a viewer's subset of these is part of the cache key.
+SUPPORT_CUSTOMER_VIEW_PERMISSIONS = (
+    'authentication.view_allowlistentry',
+    'authentication.view_user',
+    'legal.view_legaldocument',
+    'legal.view_legaldocumentresponse',
+    'mail.view_account',
+    'mail.view_domain',
+    'mail.view_email',
+    'subscription.view_plan',
+    'subscription.view_subscription',
+    'subscription.view_transaction',
+)
+
+
+def get_customer_support_data(email: str | None, viewer: User | None = None, refresh: bool = False) -> dict:
+    """Return a permission-filtered support summary for the customer email.
+
+    Pass ``refresh`` to skip any cached summary and rebuild it."""
     normalized_email = (email or '').strip().lower()
 
     if not normalized_email or viewer is None or not viewer.is_active or not viewer.is_staff:
         return {'error': 'Customer is not available.'}
 
+    cache_key = _summary_cache_key(normalized_email, viewer)
+    if settings.SUPPORT_CUSTOMER_CACHE_ENABLED and not refresh:
+        cached = cache.get(cache_key)
+        if cached and cached['user_version'] == _customer_cache_version(cached['user_id']):
+            return cached['data']
+
     match = _find_customer_match(normalized_email)
     if match['ambiguous']:
         return {'error': 'This email matches multiple users'}
 
     user = match['user']
-    allow_list_entry = match['allow_list_entry']
+    # Read the version before building so an invalidation that lands mid-build isn't lost.
+    user_version = _customer_cache_version(user.pk) if user else None
+    data = _build_customer_support_data(user, match['allow_list_entry'], viewer)
+
+    if settings.SUPPORT_CUSTOMER_CACHE_ENABLED and not data['partial']:
+        cache.set(
+            cache_key,
+            {'user_id': user.pk if user else None, 'user_version': user_version, 'data': data},
+            settings.SUPPORT_CUSTOMER_CACHE_TTL_IN_SECONDS,
+        )
+
+    return data
+
+
+def invalidate_customer_support_cache(user_id) -> None:
+    """Drop every cached support summary for a customer."""
+    if not settings.SUPPORT_CUSTOMER_CACHE_ENABLED or user_id is None:
+        return
+
+    cache.set(
+        f'{settings.SUPPORT_CUSTOMER_CACHE_KEY}:version:{user_id}',
+        time.time_ns(),
+        settings.SUPPORT_CUSTOMER_CACHE_TTL_IN_SECONDS,
+    )
+
+
+def _customer_cache_version(user_id) -> int | None:
+    """The customer's current cache version, summaries cached under an older one are stale."""
+    if user_id is None:
+        return None
+
+    key = f'{settings.SUPPORT_CUSTOMER_CACHE_KEY}:version:{user_id}'
+    # Only needs to outlive the summaries cached under it, an expired version just reads as a new one.
+    cache.add(key, time.time_ns(), settings.SUPPORT_CUSTOMER_CACHE_TTL_IN_SECONDS)
+    return cache.get(key)
+
+
+def _summary_cache_key(email: str, viewer: User) -> str:
+    permissions = ','.join(
+        permission for permission in SUPPORT_CUSTOMER_VIEW_PERMISSIONS if viewer.has_perm(permission)
+    )
+    digest = hashlib.sha256(f'{email}|{permissions}'.encode()).hexdigest()
+    return f'{settings.SUPPORT_CUSTOMER_CACHE_KEY}:summary:{digest}'
+
+
+def _build_customer_support_data(user: User | None, allow_list_entry: AllowListEntry | None, viewer: User) -> dict:
+    """Build the permission-gated summary sections for a matched customer."""
     found = False
     links = {}
     subscription = None
@@ -50,6 +140,7 @@ def get_customer_support_data(email: str | None, viewer: User | None = None) ->
     quota = None
     legal = None
     allow_list = None
+    partial = []
 
     if allow_list_entry and viewer.has_perm('authentication.view_allowlistentry'):
         allow_list = {
@@ -87,10 +178,10 @@ def get_customer_support_data(email: str | None, viewer: User | None = None) ->
             if primary_email is None and can_view_profile:
                 primary_email = user.username or user.email
 
-            stalwart_data = _get_stalwart_data(primary_email, bool(active_subscription))
-            quota = _build_quota(stalwart_data, account)
+            # Kick off the live Stalwart lookup first and build the database sections while it runs.
+            stalwart_future = _submit_stalwart_data(primary_email, bool(active_subscription))
 
-            profile = _build_profile(user, account, primary_email, bool(stalwart_data['app_password_set']), viewer)
+            profile = _build_profile(user, account, primary_email, False, viewer)
             links['user_admin'] = get_absolute_url(reverse('admin:authentication_user_change', args=[user.pk]))
 
             if viewer.has_perm('legal.view_legaldocumentresponse') and viewer.has_perm('legal.view_legaldocument'):
@@ -122,6 +213,15 @@ def get_customer_support_data(email: str | None, viewer: User | None = None) ->
                 links.update(_build_subscription_links(user, sub_record))
                 found = True
 
+        if can_view_profile:
+            stalwart_data = _wait_for_stalwart_data(stalwart_future, primary_email)
+            if stalwart_data is None:
+                partial.append('quota')
+                stalwart_data = _empty_stalwart_data()
+
+            quota = _build_quota(stalwart_data, account)
+            profile['app_password_set'] = bool(stalwart_data['app_password_set'])
+
     return {
         'found': found,
         'profile': profile,
@@ -130,6 +230,7 @@ def get_customer_support_data(email: str | None, viewer: User | None = None) ->
         'legal': legal,
         'allow_list': allow_list,
         'links': links,
+        'partial': partial,
         'error': None,
     }
 
@@ -267,9 +368,13 @@ def _build_quota(stalwart_data: dict, account) -> dict | None:
     }
 
 
+def _empty_stalwart_data() -> dict:
+    return {'used_bytes': None, 'limit_bytes': None, 'app_password_set': None}
+
+
 def _get_stalwart_data(primary_email: str | None, has_active_subscription: bool) -> dict | None:
-    """Fetch live quota and app-password state for active subscribers."""
-    stalwart_data = {'used_bytes': None, 'limit_bytes': None, 'app_password_set': None}
+    """Fetch live quota and app-password state for active subscribers. Returns None if Stalwart couldn't be read."""
+    stalwart_data = _empty_stalwart_data()
 
     if has_active_subscription:
         try:
@@ -279,23 +384,50 @@ def _get_stalwart_data(primary_email: str | None, has_active_subscription: bool)
             stalwart_data['app_password_set'] = bool(filter_app_passwords(stalwart_account.get('secrets', [])))
         except Exception as exc:
             logging.info('Unable to retrieve support customer quota for %s: %s', primary_email, exc)
+            return None
 
     return stalwart_data
 
 
+def _submit_stalwart_data(primary_email: str | None, has_active_subscription: bool) -> Future | None:
+    """Start fetching Stalwart data in the background, or return None when there's nothing to fetch."""
+    if not has_active_subscription:
+        return None
+
+    return _stalwart_executor.submit(_get_stalwart_data, primary_email, has_active_subscription)
+
+
+def _wait_for_stalwart_data(future: Future | None, primary_email: str | None) -> dict | None:
+    """Wait for a background Stalwart fetch until the deadline. Returns None if it failed or didn't finish in time."""
+    if future is None:
+        return _empty_stalwart_data()
+
+    try:
+        return future.result(timeout=settings.SUPPORT_CUSTOMER_STALWART_TIMEOUT_IN_SECONDS)
+    except FutureTimeoutError:
+        future.cancel()
+        logging.warning(
+            'Timed out after %ss retrieving support customer quota for %s',
+            settings.SUPPORT_CUSTOMER_STALWART_TIMEOUT_IN_SECONDS,
+            primary_email,
+        )
+        return None
+
+
 def _get_total_spend(user: User) -> list[dict]:
     """Sum paid and completed Paddle transactions by currency."""
-    totals = defaultdict(int)
-    transactions = Transaction.objects.filter(
-        subscription__user=user,
-        status__in=[Transaction.StatusValues.PAID, Transaction.StatusValues.COMPLETED],
+    totals = (
+        Transaction.objects.filter(
+            subscription__user=user,
+            status__in=[Transaction.StatusValues.PAID, Transaction.StatusValues.COMPLETED],
+        )
+        .values('currency')
+        .annotate(amount=Sum(Cast('total', BigIntegerField())))
+        .order_by('currency')
     )
 
-    for transaction in transactions:
-        totals[transaction.currency] += int(transaction.total)
-
     # FIXME: Support is getting the incorrect value, we should just pull directly from Paddle instead.
-    return [{'currency': currency, 'amount': f'{amount / 100:.2f}'} for currency, amount in sorted(totals.items())]
+    return [{'currency': total['currency'], 'amount': f'{total["amount"] / 100:.2f}'} for total in totals]
 
 
 def _build_subscription_links(user: User, active_subscription: Subscription | None) -> dict:
@@ -343,5 +475,6 @@ def support_customer_api(request: Request):
         get_customer_support_data(
             request.data.get('email'),
             request.user,
+            refresh=str(request.data.get('refresh', '')).lower() in ('1', 'true'),
         )
     )
@@ -0,0 +1,37 @@
+"""
+Fetches the Zendesk ticket form schema and stores it in the contact form cache.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from thunderbird_accounts.support.ticket_fields import refresh_contact_fields
+
+
+class Command(BaseCommand):
+    """
+    Usage:
+
+    .. code-block:: shell
+
+        python manage.py warm_contact_fields
+
+    """
+
+    help = 'Fetches the Zendesk ticket form schema and stores it in the contact form cache.'
+
+    def handle(self, *args, **options):
+        if not settings.ZENDESK_FORM_ID:
+            self.stdout.write(self.style.WARNING('ZENDESK_FORM_ID is not set, skipping.'))
+            return
+
+        result = refresh_contact_fields()
+
+        # Don't fail the deploy over this, a cold cache is filled on the first contact form request.
+        if not result['success']:
+            self.stderr.write(self.style.ERROR(f'Could not fetch ticket fields: {result.get("error")}'))
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Cached {len(result["data"]["ticket_fields"])} contact form ticket fields.')
+        )
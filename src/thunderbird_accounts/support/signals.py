@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+
+from thunderbird_accounts.support.customer import invalidate_customer_support_cache
+
+
+def _user_id_from_user(instance):
+    return instance.pk
+
+
+def _user_id_from_owner(instance):
+    return instance.user_id
+
+
+def _user_id_from_subscription(instance):
+    from thunderbird_accounts.subscription.models import Subscription
+
+    if not instance.subscription_id:
+        return None
+    return Subscription.objects.filter(pk=instance.subscription_id).values_list('user_id', flat=True).first()
+
+
+def _user_id_from_account(instance):
+    from thunderbird_accounts.mail.models import Account
+
+    if not instance.account_id:
+        return None
+    return Account.objects.filter(pk=instance.account_id).values_list('user_id', flat=True).first()
+
+
+def _make_handler(get_user_id):
+    def customer_changed(sender, instance, **kwargs):
+        # Skip the owner lookups entirely when there's nothing to invalidate.
+        if settings.SUPPORT_CUSTOMER_CACHE_ENABLED:
+            invalidate_customer_support_cache(get_user_id(instance))
+
+    return customer_changed
+
+
+def register_support_customer_cache_handlers():
+    from thunderbird_accounts.authentication.models import AllowListEntry, User
+    from thunderbird_accounts.legal.models import LegalDocumentResponse
+    from thunderbird_accounts.mail.models import Account, Domain, Email
+    from thunderbird_accounts.subscription.models import Subscription, Transaction
+
+    # Every model that feeds a section of the support summary, and how to find the customer it belongs to.
+    senders = [
+        (User, _user_id_from_user),
+        (AllowListEntry, _user_id_from_owner),
+        (Account, _user_id_from_owner),
+        (Domain, _user_id_from_owner),
+        (LegalDocumentResponse, _user_id_from_owner),
+        (Subscription, _user_id_from_owner),
+        (Email, _user_id_from_account),
+        (Transaction, _user_id_from_subscription),
+    ]
+    for sender, get_user_id in senders:
+        handler = _make_handler(get_user_id)
+        name = sender._meta.label_lower
+        post_save.connect(
+            handler,
+            sender=sender,
+            weak=False,
+            dispatch_uid=f'thunderbird_accounts.support.customer_cache.{name}.saved',
+        )
+        post_delete.connect(
+            handler,
+            sender=sender,
+            weak=False,
+            dispatch_uid=f'thunderbird_accounts.support.customer_cache.{name}.deleted',
+        )
@@ -0,0 +1,29 @@
+import logging
+
+from celery import shared_task
+
+from thunderbird_accounts.core.types import TaskReturnStatus
+from thunderbird_accounts.support.ticket_fields import refresh_contact_fields, release_refresh_lock
+
+
+@shared_task(bind=True)
+def refresh_contact_fields_cache(self):
+    """Re-fetch the Zendesk ticket form schema for the contact form.
+
+    On failure the previously cached schema keeps being served."""
+    try:
+        result = refresh_contact_fields()
+    finally:
+        release_refresh_lock()
+
+    if not result['success']:
+        logging.warning(f'refresh_contact_fields_cache: {result.get("error")} {result.get("details", "")}')
+        return {
+            'task_status': TaskReturnStatus.FAILED,
+            'reason': result.get('error'),
+        }
+
+    return {
+        'task_status': TaskReturnStatus.SUCCESS,
+        'ticket_fields': len(result['data']['ticket_fields']),
+    }
@@ -1,8 +1,10 @@
+import threading
 from datetime import timezone as datetime_timezone
 from unittest.mock import Mock, patch
 
 from django.conf import settings
 from django.contrib.auth.models import Permission
+from django.core.cache import cache
 from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
@@ -230,6 +232,78 @@ class SupportCustomerLookupTestCase(TestCase):
         self.assertEqual(payload['links']['paddle_customer'], 'https://vendors.paddle.com/customers-v2/ctm_123')
         mock_mail_client.get_account.assert_called_once_with(user.username)
 
+    def create_subscribed_user(self, name):
+        user = User.objects.create(username=f'{name}@{settings.PRIMARY_EMAIL_DOMAIN}', email=f'{name}@example.com')
+        account = Account.objects.create(name=user.username, user=user, quota=settings.ONE_GIGABYTE_IN_BYTES)
+        Email.objects.create(address=user.username, type=Email.EmailType.PRIMARY, account=account)
+        subscription = Subscription.objects.create(status=Subscription.StatusValues.ACTIVE, user=user)
+        return user, subscription
+
+    @patch('thunderbird_accounts.support.customer.MailClient')
+    @override_settings(SUPPORT_CUSTOMER_STALWART_TIMEOUT_IN_SECONDS=0.05)
+    def test_slow_stalwart_returns_partial_quota(self, mock_mail_client_cls):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def slow_get_account(primary_email):
+            release.wait(5)
+            return {'quota': 1, 'usedQuota': 1, 'secrets': []}
+
+        mock_mail_client_cls.return_value.get_account.side_effect = slow_get_account
+        user, _subscription = self.create_subscribed_user('slow')
+
+        payload = get_customer_support_data(user.email, self.create_full_viewer())
+
+        self.assertTrue(payload['found'])
+        self.assertEqual(payload['partial'], ['quota'])
+        self.assertEqual(payload['quota'], {'used_bytes': None, 'limit_bytes': settings.ONE_GIGABYTE_IN_BYTES})
+        self.assertFalse(payload['profile']['app_password_set'])
+        self.assertEqual(payload['subscription']['status'], Subscription.StatusValues.ACTIVE)
+
+    @patch('thunderbird_accounts.support.customer.MailClient')
+    @override_settings(SUPPORT_CUSTOMER_CACHE_ENABLED=True)
+    def test_stalwart_error_returns_partial_quota_and_is_not_cached(self, mock_mail_client_cls):
+        self.addCleanup(cache.clear)
+        mock_mail_client_cls.return_value.get_account.side_effect = RuntimeError('Stalwart is down')
+        user, _subscription = self.create_subscribed_user('unreachable')
+        viewer = self.create_full_viewer()
+
+        payload = get_customer_support_data(user.email, viewer)
+
+        self.assertEqual(payload['partial'], ['quota'])
+        self.assertEqual(payload['quota'], {'used_bytes': None, 'limit_bytes': settings.ONE_GIGABYTE_IN_BYTES})
+
+        mock_mail_client_cls.return_value.get_account.side_effect = None
+        mock_mail_client_cls.return_value.get_account.return_value = {'quota': 5, 'usedQuota': 1, 'secrets': []}
+
+        payload = get_customer_support_data(user.email, viewer)
+
+        self.assertEqual(payload['partial'], [])
+        self.assertEqual(payload['quota'], {'used_bytes': 1, 'limit_bytes': 5})
+
+    @patch('thunderbird_accounts.support.customer.MailClient')
+    def test_total_spend_is_summed_per_currency(self, mock_mail_client_cls):
+        mock_mail_client_cls.return_value.get_account.return_value = {}
+        user, subscription = self.create_subscribed_user('spender')
+        for paddle_id, total, currency in [('txn_1', '1200', 'USD'), ('txn_2', '350', 'EUR'), ('txn_3', '50', 'USD')]:
+            Transaction.objects.create(
+                paddle_id=paddle_id,
+                total=total,
+                tax='0',
+                currency=currency,
+                status=Transaction.StatusValues.PAID,
+                transaction_origin=Transaction.OriginValues.WEB,
+                subscription=subscription,
+            )
+
+        payload = get_customer_support_data(user.email, self.create_full_viewer())
+
+        self.assertEqual(payload['partial'], [])
+        self.assertEqual(
+            payload['subscription']['total_spend'],
+            [{'currency': 'EUR', 'amount': '3.50'}, {'currency': 'USD', 'amount': '12.50'}],
+        )
+
     def test_empty_display_name_does_not_fall_back_to_email_address(self):
         user = User.objects.create(
             username=f'nodisplay@{settings.PRIMARY_EMAIL_DOMAIN}',
@@ -466,3 +540,84 @@ class SupportCustomerLookupTestCase(TestCase):
         payload = get_customer_support_data('plan@example.com', viewer)
 
         self.assertEqual(payload['subscription']['plan'], 'Thundermail Plus')
+
+
+@override_settings(SUPPORT_CUSTOMER_CACHE_ENABLED=True)
+class SupportCustomerCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create(username=f'viewer@{settings.PRIMARY_EMAIL_DOMAIN}', is_staff=True)
+        self.viewer.user_permissions.add(
+            *Permission.objects.filter(
+                content_type__app_label__in=['authentication', 'mail', 'legal', 'subscription'],
+                codename__startswith='view_',
+            )
+        )
+        self.user = User.objects.create(
+            username=f'cached@{settings.PRIMARY_EMAIL_DOMAIN}',
+            email='cached@example.com',
+            display_name='Cached User',
+        )
+
+    def get_viewer(self):
+        # Fresh instance so permission checks aren't served from the viewer's own permission cache.
+        return User.objects.get(pk=self.viewer.pk)
+
+    def test_repeat_lookups_are_served_from_cache(self):
+        first = get_customer_support_data('cached@example.com', self.get_viewer())
+        viewer = self.get_viewer()
+        viewer.get_all_permissions()  # Warm the permission cache so only the lookup itself is counted
+
+        with self.assertNumQueries(0):
+            second = get_customer_support_data('cached@example.com', viewer)
+
+        self.assertEqual(first, second)
+        self.assertEqual(second['profile']['display_name'], 'Cached User')
+
+    def test_refresh_bypasses_cache(self):
+        get_customer_support_data('cached@example.com', self.get_viewer())
+        User.objects.filter(pk=self.user.pk).update(display_name='Changed Without Signals')
+
+        cached = get_customer_support_data('cached@example.com', self.get_viewer())
+        refreshed = get_customer_support_data('cached@example.com', self.get_viewer(), refresh=True)
+
+        self.assertEqual(cached['profile']['display_name'], 'Cached User')
+        self.assertEqual(refreshed['profile']['display_name'], 'Changed Without Signals')
+
+    def test_refresh_param_is_accepted_by_api(self):
+        get_customer_support_data('cached@example.com', self.get_viewer())
+        User.objects.filter(pk=self.user.pk).update(display_name='Changed Without Signals')
+        request = APIRequestFactory().post(
+            '/api/v1/support/customer/',
+            {'email': 'cached@example.com', 'refresh': True},
+            format='json',
+        )
+        force_authenticate(request, user=self.get_viewer())
+
+        response = support_customer_api(request)
+
+        self.assertEqual(response.data['profile']['display_name'], 'Changed Without Signals')
+
+    def test_customer_changes_invalidate_cache(self):
+        get_customer_support_data('cached@example.com', self.get_viewer())
+
+        self.user.display_name = 'Renamed'
+        self.user.save()
+        self.assertEqual(
+            get_customer_support_data('cached@example.com', self.get_viewer())['profile']['display_name'], 'Renamed'
+        )
+
+        Subscription.objects.create(status=Subscription.StatusValues.ACTIVE, user=self.user)
+        with patch('thunderbird_accounts.support.customer.MailClient') as mock_mail_client_cls:
+            mock_mail_client_cls.return_value.get_account.return_value = {}
+            payload = get_customer_support_data('cached@example.com', self.get_viewer())
+        self.assertEqual(payload['subscription']['status'], Subscription.StatusValues.ACTIVE)
+
+    def test_cache_is_per_viewer_permission_set(self):
+        get_customer_support_data('cached@example.com', self.get_viewer())
+        limited_viewer = User.objects.create(username=f'limited@{settings.PRIMARY_EMAIL_DOMAIN}', is_staff=True)
+
+        payload = get_customer_support_data('cached@example.com', limited_viewer)
+
+        self.assertFalse(payload['found'])
+        self.assertIsNone(payload['profile'])
@@ -0,0 +1,82 @@
+from unittest.mock import Mock, patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from thunderbird_accounts.support import ticket_fields
+from thunderbird_accounts.support.tasks import refresh_contact_fields_cache
+
+TICKET_FORM_RESPONSE = {
+    'success': True,
+    'data': {
+        'ticket_form': {'id': 123},
+        'ticket_fields': [
+            {
+                'id': 1,
+                'title': 'Subject',
+                'type': 'subject',
+                'active': True,
+                'visible_in_portal': True,
+                'editable_in_portal': True,
+            },
+        ],
+    },
+}
+
+
+@override_settings(ZENDESK_FORM_ID='123', ZENDESK_TICKET_FIELDS_CACHE_ENABLED=True)
+@patch('thunderbird_accounts.support.ticket_fields.ZendeskClient')
+class ContactFieldsCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _mock_zendesk(self, mock_client_cls, result=TICKET_FORM_RESPONSE):
+        instance = Mock()
+        instance.get_ticket_fields.return_value = result
+        mock_client_cls.return_value = instance
+        return instance
+
+    def test_schema_is_served_from_cache(self, mock_client_cls):
+        zendesk = self._mock_zendesk(mock_client_cls)
+
+        first = ticket_fields.get_contact_fields()
+        second = ticket_fields.get_contact_fields()
+
+        self.assertTrue(first['success'])
+        self.assertEqual(first, second)
+        self.assertEqual(first['data']['ticket_form'], {'id': 123})
+        zendesk.get_ticket_fields.assert_called_once()
+
+    def test_stale_schema_is_served_while_a_refresh_is_queued(self, mock_client_cls):
+        zendesk = self._mock_zendesk(mock_client_cls)
+        ticket_fields.get_contact_fields()
+
+        with (
+            patch('thunderbird_accounts.support.ticket_fields.time.time', return_value=10**12),
+            patch.object(refresh_contact_fields_cache, 'delay') as mock_delay,
+        ):
+            result = ticket_fields.get_contact_fields()
+            # A refresh is already in flight, so it isn't queued twice
+            ticket_fields.get_contact_fields()
+
+        self.assertTrue(result['success'])
+        mock_delay.assert_called_once_with()
+        zendesk.get_ticket_fields.assert_called_once()
+
+    def test_failed_refresh_keeps_last_known_good_schema(self, mock_client_cls):
+        zendesk = self._mock_zendesk(mock_client_cls)
+        cached = ticket_fields.get_contact_fields()
+
+        zendesk.get_ticket_fields.return_value = {'success': False, 'error': 'Zendesk is down'}
+        task_result = refresh_contact_fields_cache.run()
+
+        self.assertEqual(task_result['task_status'], 'failed')
+        self.assertEqual(ticket_fields.get_contact_fields(), cached)
+        # The refresh lock is released so the next stale read can try again
+        self.assertTrue(cache.add(ticket_fields._refresh_lock_key(), True))
+
+    def test_cold_cache_failure_is_returned(self, mock_client_cls):
+        self._mock_zendesk(mock_client_cls, {'success': False, 'error': 'Zendesk is down'})
+
+        self.assertEqual(ticket_fields.get_contact_fields(), {'success': False, 'error': 'Zendesk is down'})
+        self.assertIsNone(cache.get(ticket_fields._cache_key()))
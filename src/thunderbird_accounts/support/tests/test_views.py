@@ -1,6 +1,9 @@
 import json
+import threading
 from unittest.mock import Mock, patch
 
+import requests
+
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client as RequestClient, TestCase, override_settings
 from django.urls import reverse
@@ -10,7 +13,7 @@ class ZendeskContactFieldsTestCase(TestCase):
     def setUp(self):
         self.client = RequestClient()
 
-    @patch('thunderbird_accounts.support.views.ZendeskClient')
+    @patch('thunderbird_accounts.support.ticket_fields.ZendeskClient')
     def test_contact_fields_success_filters_and_transforms(self, mock_client_cls):
         instance = Mock()
         mock_client_cls.return_value = instance
@@ -94,7 +97,7 @@ class ZendeskContactFieldsTestCase(TestCase):
         # Ensure client was called once
         instance.get_ticket_fields.assert_called_once()
 
-    @patch('thunderbird_accounts.support.views.ZendeskClient')
+    @patch('thunderbird_accounts.support.ticket_fields.ZendeskClient')
     def test_contact_fields_error_from_backend(self, mock_client_cls):
         instance = Mock()
         mock_client_cls.return_value = instance
@@ -283,6 +286,103 @@ class ZendeskContactSubmitTestCase(TestCase):
         self.assertIn('Failed to upload file test.txt', body['error'])
         instance.create_ticket.assert_not_called()
 
+    @patch('thunderbird_accounts.support.views.ZendeskClient')
+    @patch('thunderbird_accounts.support.views.parse_user_agent_info')
+    @override_settings(
+        ZENDESK_FORM_ID='42',
+        ZENDESK_FORM_BROWSER_FIELD_ID='1001',
+        ZENDESK_FORM_OS_FIELD_ID='1002',
+        ZENDESK_UPLOAD_MAX_WORKERS=3,
+    )
+    def test_contact_submit_uploads_attachments_concurrently_in_order(self, mock_parse_ua, mock_client_cls):
+        mock_parse_ua.return_value = ('Firefox 120', 'macOS 14')
+        instance = Mock()
+        mock_client_cls.return_value = instance
+        all_started = threading.Barrier(3, timeout=5)
+
+        def upload_file(uploaded_file):
+            # Every upload has to be in flight at once to get past the barrier
+            all_started.wait()
+            return {'success': True, 'upload_token': f'tok-{uploaded_file.name}', 'filename': uploaded_file.name}
+
+        instance.upload_file.side_effect = upload_file
+        create_resp = Mock()
+        create_resp.ok = True
+        create_resp.json.return_value = {'request': {'id': 555}}
+        instance.create_ticket.return_value = create_resp
+        instance.update_ticket.return_value = Mock(ok=True)
+
+        url = reverse('contact_submit')
+        payload = {
+            'email': 'user@example.org',
+            'fields': [
+                {'id': 11, 'title': 'Subject', 'type': 'subject', 'value': 'Hello', 'required': True},
+                {'id': 12, 'title': 'Description', 'type': 'description', 'value': 'Body', 'required': True},
+            ],
+        }
+        attachments = [SimpleUploadedFile(f'file-{index}.txt', b'hi', content_type='text/plain') for index in range(3)]
+        response = self.client.post(url, data={'data': json.dumps(payload), 'attachments': attachments})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            instance.create_ticket.call_args.args[0]['attachments'],
+            [{'token': f'tok-file-{index}.txt', 'filename': f'file-{index}.txt'} for index in range(3)],
+        )
+
+    @patch('thunderbird_accounts.support.views.ZendeskClient')
+    @override_settings(ZENDESK_FORM_ID='42', ZENDESK_UPLOAD_MAX_WORKERS=1)
+    def test_contact_submit_skips_remaining_uploads_after_failure(self, mock_client_cls):
+        instance = Mock()
+        mock_client_cls.return_value = instance
+        instance.upload_file.return_value = {'success': False, 'error': 'Zendesk upload failed'}
+
+        url = reverse('contact_submit')
+        payload = {
+            'email': 'user@example.org',
+            'fields': [
+                {'id': 11, 'title': 'Subject', 'type': 'subject', 'value': 'Hello', 'required': True},
+                {'id': 12, 'title': 'Description', 'type': 'description', 'value': 'Body', 'required': True},
+            ],
+        }
+        attachments = [SimpleUploadedFile(f'file-{index}.txt', b'hi', content_type='text/plain') for index in range(3)]
+        response = self.client.post(url, data={'data': json.dumps(payload), 'attachments': attachments})
+
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('Failed to upload file file-0.txt:', response.json()['error'])
+        instance.upload_file.assert_called_once()
+        instance.create_ticket.assert_not_called()
+
+    @patch('thunderbird_accounts.support.views.ZendeskClient')
+    @override_settings(ZENDESK_FORM_ID='42', ZENDESK_UPLOAD_MAX_WORKERS=2)
+    def test_contact_submit_deletes_uploads_made_before_failure(self, mock_client_cls):
+        instance = Mock()
+        mock_client_cls.return_value = instance
+        all_started = threading.Barrier(2, timeout=5)
+
+        def upload_file(uploaded_file):
+            all_started.wait()
+            if uploaded_file.name == 'file-0.txt':
+                raise requests.exceptions.ConnectionError()
+            return {'success': True, 'upload_token': f'tok-{uploaded_file.name}', 'filename': uploaded_file.name}
+
+        instance.upload_file.side_effect = upload_file
+
+        url = reverse('contact_submit')
+        payload = {
+            'email': 'user@example.org',
+            'fields': [
+                {'id': 11, 'title': 'Subject', 'type': 'subject', 'value': 'Hello', 'required': True},
+                {'id': 12, 'title': 'Description', 'type': 'description', 'value': 'Body', 'required': True},
+            ],
+        }
+        attachments = [SimpleUploadedFile(f'file-{index}.txt', b'hi', content_type='text/plain') for index in range(2)]
+        response = self.client.post(url, data={'data': json.dumps(payload), 'attachments': attachments})
+
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('Failed to upload file file-0.txt', response.json()['error'])
+        instance.delete_upload.assert_called_once_with('tok-file-1.txt')
+        instance.create_ticket.assert_not_called()
+
     @patch('thunderbird_accounts.support.views.ZendeskClient')
     @override_settings(ZENDESK_FORM_ID='42')
     def test_contact_submit_create_ticket_failure(self, mock_client_cls):
@@ -0,0 +1,48 @@
+from http.client import HTTPMessage
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import requests
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from requests.cookies import extract_cookies_to_jar
+
+from thunderbird_accounts.support import zendesk
+from thunderbird_accounts.support.zendesk import ZendeskClient, get_session
+
+
+@override_settings(ZENDESK_SUBDOMAIN='example', ZENDESK_USER_EMAIL='agent@example.org', ZENDESK_API_TOKEN='token')
+class ZendeskClientTestCase(TestCase):
+    def test_clients_share_a_pooled_session(self):
+        self.assertIs(ZendeskClient().session, ZendeskClient().session)
+        self.assertIs(ZendeskClient().session, get_session())
+
+    def test_session_does_not_keep_cookies(self):
+        message = HTTPMessage()
+        message['Set-Cookie'] = 'session=abc123; Path=/'
+        response = requests.Response()
+        response._original_response = SimpleNamespace(msg=message)
+        request = requests.Request('GET', 'https://example.zendesk.com/api/v2/requests.json').prepare()
+
+        # A session that accepted cookies would send this one along with every later user's requests
+        extract_cookies_to_jar(get_session().cookies, request, response)
+
+        self.assertEqual(len(get_session().cookies), 0)
+
+    def test_upload_file_streams_the_file_object(self):
+        uploaded = SimpleUploadedFile('screenshot.png', b'not really a png', content_type='image/png')
+        uploaded.read()  # A previous reader left the file at the end
+        response = Mock(status_code=201)
+        response.json.return_value = {'upload': {'token': 'tok123', 'attachment': {'file_name': 'screenshot.png'}}}
+
+        with patch.object(zendesk.get_session(), 'post', return_value=response) as mock_post:
+            result = ZendeskClient().upload_file(uploaded)
+
+        self.assertEqual(result, {'success': True, 'upload_token': 'tok123', 'filename': 'screenshot.png'})
+        self.assertEqual(mock_post.call_args.args[0], 'https://example.zendesk.com/api/v2/uploads.json')
+        # The file object itself is handed to requests rather than its bytes, rewound to the start
+        self.assertIs(mock_post.call_args.kwargs['data'], uploaded)
+        self.assertEqual(uploaded.tell(), 0)
+        self.assertEqual(mock_post.call_args.kwargs['headers'], {'Content-Type': 'image/png'})
+        self.assertEqual(mock_post.call_args.kwargs['params'], {'filename': 'screenshot.png'})
@@ -0,0 +1,119 @@
+"""Cached Zendesk ticket form schema for the contact form.
+
+The contact form needs the ticket form's visible fields, which only change when
+someone edits the form in Zendesk Admin. The transformed schema is cached per
+form id without an expiry and treated as fresh for
+ZENDESK_TICKET_FIELDS_CACHE_TTL_IN_SECONDS. Past that, the cached copy is still
+served immediately while ``refresh_contact_fields_cache`` fetches a new one in
+the background, and a failed refresh leaves the last-known-good copy in place so
+the support page keeps working while Zendesk is unavailable.
+
+The cache is warmed on deploy with ``manage.py warm_contact_fields``.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from thunderbird_accounts.support.zendesk import ZendeskClient
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_key() -> str:
+    return f'{settings.ZENDESK_TICKET_FIELDS_CACHE_KEY}:{settings.ZENDESK_FORM_ID}'
+
+
+def _refresh_lock_key() -> str:
+    return f'{_cache_key()}:refreshing'
+
+
+def build_contact_fields(data: dict) -> dict:
+    """Filter and trim a Zendesk ticket form response down to what the contact form renders."""
+    ticket_form = data['ticket_form']
+    ticket_fields = data['ticket_fields']
+
+    # For now, we only care about the id of the ticket form, since we need to pass it back to ticket creation
+    # Even though we could read this from the env var ZENDESK_FORM_ID directly, we might need more fields in the future
+    ticket_form_data = {'id': ticket_form['id']}
+
+    ticket_fields_data = []
+
+    # Filter ticket fields based on being editable / visible (controlled through Zendesk Admin)
+    for field in ticket_fields:
+        if field.get('active') and field.get('visible_in_portal') and field.get('editable_in_portal'):
+            field_data = {
+                'id': field.get('id'),
+                'title': field.get('title_in_portal') or field.get('title', ''),
+                'description': field.get('description', ''),
+                'required': field.get('required_in_portal') or field.get('required', False),
+                'type': field.get('type', ''),
+            }
+
+            if 'custom_field_options' in field:
+                # Extract the id, name, and custom_field_options with id, name and value
+                field_data['custom_field_options'] = [
+                    {'id': option.get('id'), 'name': option.get('name', ''), 'value': option.get('value', '')}
+                    for option in field['custom_field_options']
+                ]
+
+            ticket_fields_data.append(field_data)
+
+    return {'ticket_form': ticket_form_data, 'ticket_fields': ticket_fields_data}
+
+
+def refresh_contact_fields() -> dict:
+    """Fetch the ticket form schema from Zendesk and, when caching is enabled, store it as the new cached copy.
+
+    A failed fetch leaves any cached copy untouched."""
+    result = ZendeskClient().get_ticket_fields()
+    if not result['success']:
+        return result
+
+    contact_fields = build_contact_fields(result['data'])
+
+    if settings.ZENDESK_TICKET_FIELDS_CACHE_ENABLED:
+        # No timeout: an old copy is still better than an error page if Zendesk is down when it goes stale.
+        cache.set(_cache_key(), {'data': contact_fields, 'fetched_at': time.time()}, None)
+
+    return {'success': True, 'data': contact_fields}
+
+
+def _schedule_refresh():
+    """Queue a background refresh unless one is already in flight."""
+    # Imported here as the task module imports this one.
+    from thunderbird_accounts.support.tasks import refresh_contact_fields_cache
+
+    lock_key = _refresh_lock_key()
+    if not cache.add(lock_key, True, settings.ZENDESK_TICKET_FIELDS_REFRESH_LOCK_TIMEOUT_IN_SECONDS):
+        return
+
+    try:
+        refresh_contact_fields_cache.delay()
+    except Exception as ex:
+        # A broker hiccup shouldn't fail the page, the next request will try again.
+        logger.warning(f'Could not queue contact fields refresh: {ex}')
+        cache.delete(lock_key)
+
+
+def release_refresh_lock():
+    cache.delete(_refresh_lock_key())
+
+
+def get_contact_fields() -> dict:
+    """Return the contact form schema as ``{'success': True, 'data': ...}`` or the Zendesk error result.
+
+    Serves the cached copy when there is one, queueing a background refresh once it is older than the TTL."""
+    if not settings.ZENDESK_TICKET_FIELDS_CACHE_ENABLED:
+        return refresh_contact_fields()
+
+    cached = cache.get(_cache_key())
+    if cached is None:
+        return refresh_contact_fields()
+
+    if time.time() - cached['fetched_at'] >= settings.ZENDESK_TICKET_FIELDS_CACHE_TTL_IN_SECONDS:
+        _schedule_refresh()
+
+    return {'success': True, 'data': cached['data']}
@@ -1,14 +1,16 @@
 from requests import JSONDecodeError
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import sentry_sdk
 from django.conf import settings
 from django.core.validators import EMPTY_VALUES
 from django.http import HttpRequest, JsonResponse
 from django.utils.translation import gettext_lazy as _
-from django.views.decorators.cache import cache_page
 from django.views.decorators.http import require_http_methods
 
+from thunderbird_accounts.support.ticket_fields import get_contact_fields
 from thunderbird_accounts.support.zendesk import ZendeskClient
 
 # Add browser and OS information to hidden custom fields
@@ -16,47 +18,18 @@ from thunderbird_accounts.core.utils import parse_user_agent_info
 
 
 @require_http_methods(['GET'])
-@cache_page(60 * 15)
 def contact_fields(request: HttpRequest):
-    """Get ticket fields from Zendesk API and filter based on Zendesk Admin."""
-    zendesk_client = ZendeskClient()
-    result = zendesk_client.get_ticket_fields()
+    """Get ticket fields from Zendesk API and filter based on Zendesk Admin.
+
+    Served from the ticket form schema cache, see ``thunderbird_accounts.support.ticket_fields``."""
+    result = get_contact_fields()
 
     if not result['success']:
         return JsonResponse(
             {'success': False, 'error': result.get('error', _('Failed to fetch ticket fields'))}, status=500
         )
 
-    ticket_form = result['data']['ticket_form']
-    ticket_fields = result['data']['ticket_fields']
-
-    # For now, we only care about the id of the ticket form, since we need to pass it back to ticket creation
-    # Even though we could read this from the env var ZENDESK_FORM_ID directly, we might need more fields in the future
-    ticket_form_data = {'id': ticket_form['id']}
-
-    ticket_fields_data = []
-
-    # Filter ticket fields based on being editable / visible (controlled through Zendesk Admin)
-    for field in ticket_fields:
-        if field.get('active') and field.get('visible_in_portal') and field.get('editable_in_portal'):
-            field_data = {
-                'id': field.get('id'),
-                'title': field.get('title_in_portal') or field.get('title', ''),
-                'description': field.get('description', ''),
-                'required': field.get('required_in_portal') or field.get('required', False),
-                'type': field.get('type', ''),
-            }
-
-            if 'custom_field_options' in field:
-                # Extract the id, name, and custom_field_options with id, name and value
-                field_data['custom_field_options'] = [
-                    {'id': option.get('id'), 'name': option.get('name', ''), 'value': option.get('value', '')}
-                    for option in field['custom_field_options']
-                ]
-
-            ticket_fields_data.append(field_data)
-
-    return JsonResponse({'success': True, 'ticket_form': ticket_form_data, 'ticket_fields': ticket_fields_data})
+    return JsonResponse({'success': True, **result['data']})
 
 
 @require_http_methods(['POST'])
@@ -126,33 +99,41 @@ def contact_submit(request: HttpRequest):
     if validation_errors:
         return JsonResponse({'success': False, 'error': ', '.join(validation_errors)}, status=400)
 
-    # Upload files to Zendesk and collect tokens
+    # Upload files to Zendesk concurrently and collect tokens in the order they were attached
     attachment_tokens = []
     zendesk_client = ZendeskClient()
+    # Once an upload fails the ticket won't be created, so the uploads that haven't started yet are skipped
+    upload_failed = threading.Event()
+
+    def upload_file(uploaded_file):
+        if upload_failed.is_set():
+            return None
 
-    for uploaded_file in uploaded_files:
         try:
             zendesk_api_response = zendesk_client.upload_file(uploaded_file)
-
-            if not zendesk_api_response['success']:
-                return JsonResponse(
-                    {
-                        'success': False,
-                        'error': _('Failed to upload file {uploaded_file_name}: {zendesk_api_response_error}').format(
-                            uploaded_file_name=uploaded_file.name,
-                            zendesk_api_response_error=zendesk_api_response.get('error', _('Unknown error')),
-                        ),
-                    },
-                    status=500,
-                )
-
-            attachment_tokens.append(
-                {'token': zendesk_api_response['upload_token'], 'filename': zendesk_api_response['filename']}
-            )
-
+        except Exception:
+            upload_failed.set()
+            raise
+
+        if not zendesk_api_response['success']:
+            upload_failed.set()
+        return zendesk_api_response
+
+    upload_results = []
+    if uploaded_files:
+        max_workers = min(len(uploaded_files), settings.ZENDESK_UPLOAD_MAX_WORKERS)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='zendesk-upload') as executor:
+            upload_results = [
+                (uploaded_file, executor.submit(upload_file, uploaded_file)) for uploaded_file in uploaded_files
+            ]
+
+    error_response = None
+    for uploaded_file, upload_future in upload_results:
+        try:
+            zendesk_api_response = upload_future.result()
         except Exception as ex:
             sentry_sdk.capture_exception(ex)
-            return JsonResponse(
+            error_response = error_response or JsonResponse(
                 {
                     'success': False,
                     'error': _('Failed to upload file {uploaded_file_name}. Please try again later.').format(
@@ -161,6 +142,37 @@ def contact_submit(request: HttpRequest):
                 },
                 status=500,
             )
+            continue
+
+        # Skipped after another upload failed
+        if zendesk_api_response is None:
+            continue
+
+        if not zendesk_api_response['success']:
+            error_response = error_response or JsonResponse(
+                {
+                    'success': False,
+                    'error': _('Failed to upload file {uploaded_file_name}: {zendesk_api_response_error}').format(
+                        uploaded_file_name=uploaded_file.name,
+                        zendesk_api_response_error=zendesk_api_response.get('error', _('Unknown error')),
+                    ),
+                },
+                status=500,
+            )
+            continue
+
+        attachment_tokens.append(
+            {'token': zendesk_api_response['upload_token'], 'filename': zendesk_api_response['filename']}
+        )
+
+    if error_response:
+        # Don't leave the uploads that made it behind in Zendesk, no ticket will reference them
+        for attachment_token in attachment_tokens:
+            try:
+                zendesk_client.delete_upload(attachment_token['token'])
+            except Exception as ex:
+                sentry_sdk.capture_exception(ex)
+        return error_response
 
     # Create ticket with attachment tokens
     ticket_fields = {
@@ -3,12 +3,20 @@ import mimetypes
 import requests
 from django.conf import settings
 
+from thunderbird_accounts.infra.http import get_pooled_session
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide Zendesk session so connections are pooled and reused across requests."""
+    return get_pooled_session('zendesk', settings.ZENDESK_HTTP_POOL_MAXSIZE)
+
 
 class ZendeskClient(object):
     """Client to connect to Zendesk API."""
 
     def __init__(self, **kwargs):
         """Initialize Zendesk API client."""
+        self.session = get_session()
         self.email = settings.ZENDESK_USER_EMAIL
         self.token = settings.ZENDESK_API_TOKEN
         self.subdomain = settings.ZENDESK_SUBDOMAIN
@@ -43,7 +51,7 @@ class ZendeskClient(object):
             }
         }
 
-        response = requests.post(
+        response = self.session.post(
             url,
             headers={'Content-Type': 'application/json'},
             # This needs to be the end user's email for the ticket to be tracked correctly
@@ -64,7 +72,7 @@ class ZendeskClient(object):
 
         # This request needs to be made on behalf of the agent (not the end user)
         # so any fields can be updated (including hidden fields)
-        response = requests.put(
+        response = self.session.put(
             url,
             headers={'Content-Type': 'application/json'},
             auth=(f'{settings.ZENDESK_USER_EMAIL}/token', settings.ZENDESK_API_TOKEN),
@@ -81,11 +89,14 @@ class ZendeskClient(object):
         if not content_type:
             content_type = 'application/binary'
 
-        response = requests.post(
+        # Pass the file object itself so requests streams it from memory or disk in blocks instead of
+        # reading the whole attachment into a bytes object first.
+        uploaded_file.seek(0)
+        response = self.session.post(
             url,
             auth=(f'{self.email}/token', self.token),
             headers={'Content-Type': content_type},
-            data=uploaded_file.read(),
+            data=uploaded_file,
             params={'filename': uploaded_file.name},
         )
 
@@ -102,11 +113,19 @@ class ZendeskClient(object):
         else:
             return {'success': False, 'error': 'Zendesk upload failed', 'details': response.text}
 
+    def delete_upload(self, upload_token):
+        """Delete an upload that won't be attached to a ticket after all."""
+        url = f'{self.base_url}/uploads/{upload_token}.json'
+
+        response = self.session.delete(url, auth=(f'{self.email}/token', self.token))
+
+        return response
+
     def get_ticket_fields(self):
         """Get ticket fields from the ZENDESK_FORM_ID through Zendesk API including fields."""
         url = f'{self.base_url}/ticket_forms/{self.form_id}?include=ticket_fields'
 
-        response = requests.get(
+        response = self.session.get(
             url, auth=(f'{self.email}/token', self.token), headers={'Content-Type': 'application/json'}
         )
 
@@ -46,6 +46,11 @@ urlpatterns = [
         auth_views.bulk_import_allow_list,
         name='allow_list_entry_import_submit',
     ),
+    path(
+        'admin/authentication/allowlistentry-custom/import/status/<str:task_id>/',
+        auth_views.AdminAllowListEntryImportStatus.as_view(),
+        name='allow_list_entry_import_status',
+    ),
     path('admin/', admin.site.urls),
     # Django-specific routes (not handled by Vue)
     path('contact/fields', support_views.contact_fields, name='contact_fields'),
@@ -117,6 +122,9 @@ urlpatterns = [
     path('api/v1/telemetry/event', telemetry_api.capture_frontend_event, name='api_capture_frontend_event'),
     # Health check
     path('health', infra_views.health_check),
+    path('health/live', infra_views.health_live, name='health_live'),
+    path('health/ready', infra_views.health_ready, name='health_ready'),
+    path('metrics', infra_views.metrics, name='metrics'),
     # Test routes
     path('api/v1/testing/allow-list/', create_test_allow_list_entry, name='api_create_test_allow_list_entry'),
 ]